@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Time the native copy engine against rsync on a synthetic volume.
+
+Each engine copies the same tree three times, the way consecutive backups
+do: a first generation from nothing, a second with --link-dest and nothing
+changed, and a third after a share of the files was rewritten. rsync is
+left out when it is not installed.
+
+    python scripts/bench_copy_engine.py --files 20000 --size 16384
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from baudolo.backup.copyengine import copy_tree
+
+
+def build(root: Path, files: int, size: int, width: int) -> list[Path]:
+    """Spread *files* files of about *size* bytes over nested directories."""
+    paths = []
+    for n in range(files):
+        directory = root / f"d{n % width}" / f"e{n // width % width}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"f{n}"
+        path.write_bytes(os.urandom(random.randint(size // 2, size * 3 // 2)))  # noqa: S311 - file sizes, not secrets
+        paths.append(path)
+    return paths
+
+
+def rsync(source: Path, dest: Path, link_dest: Path | None) -> None:
+    command = ["rsync", "-a", "--no-D", "--delete", "--delete-excluded"]
+    if link_dest is not None:
+        command.append(f"--link-dest={link_dest}")
+    subprocess.run([*command, f"{source}/", str(dest)], check=True)
+
+
+def native(source: Path, dest: Path, link_dest: Path | None) -> None:
+    copy_tree(
+        str(source), str(dest), link_dest=None if link_dest is None else str(link_dest)
+    )
+
+
+def drop_caches() -> None:
+    """Start each run from a cold page cache, if allowed to."""
+    try:
+        os.sync()
+        Path("/proc/sys/vm/drop_caches").write_text("3\n")
+    except OSError:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=16384, help="Mean file size")
+    parser.add_argument("--width", type=int, default=30, help="Directory fan-out")
+    parser.add_argument("--changed", type=float, default=0.05)
+    parser.add_argument("--dir", default=None, help="Where to build the tree")
+    args = parser.parse_args()
+
+    engines = {"native": native}
+    if shutil.which("rsync"):
+        engines["rsync"] = rsync
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        source = Path(tmp) / "source"
+        paths = build(source, args.files, args.size, args.width)
+        total = sum(path.stat().st_size for path in paths)
+        print(f"{args.files} files, {total / 2**20:.1f} MiB")
+        rewritten = random.sample(paths, int(len(paths) * args.changed))
+        results: dict[str, list[float]] = {}
+        for name, engine in engines.items():
+            gens = [Path(tmp) / f"{name}-{n}" for n in range(3)]
+            times = []
+            for n, gen in enumerate(gens):
+                if n == 2:
+                    for path in rewritten:
+                        path.write_bytes(os.urandom(path.stat().st_size))
+                drop_caches()
+                started = time.perf_counter()
+                engine(source, gen, gens[n - 1] if n else None)
+                times.append(time.perf_counter() - started)
+            results[name] = times
+        print(f"{'engine':8} {'full':>9} {'unchanged':>10} {'changed':>9}")
+        for name, (full, unchanged, changed) in results.items():
+            print(f"{name:8} {full:8.2f}s {unchanged:9.2f}s {changed:8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,37 @@
 
 from __future__ import annotations
 
+import time
 from contextlib import ExitStack
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+from baudolo.generation import CHUNK_DIR, GENERATION_FORMAT
 
 from .cli import parse_args
 from .compose import handle_docker_compose_services
+from .copyengine import reflink_supported
+from .db import DumpOptions
 from .docker import (
     change_containers_status,
-    containers_using_volume,
     docker_volume_names,
     filter_stoppable,
 )
-from .dumps import VolumeOutcome, backup_dumps_for_volume, load_databases_df
+from .dumps import (
+    ENGINE_CACHE_FILE,
+    VolumeOutcome,
+    backup_dumps_for_volume,
+    collect_chunks,
+    load_databases_df,
+    load_engine_cache,
+    previous_dumps,
+    save_engine_cache,
+)
+from .genstore import create_snapshot_generation, discard_carried
+from .hashcache import HASH_CACHE_FILE, HashCache
+from .inventory import take_inventory
 from .layout import (
     create_version_directory,
     create_volume_directory,
@@ -22,9 +40,408 @@ from .layout import (
     stamp_directory,
     write_manifest,
 )
-from .policy import requires_stop, volume_is_fully_ignored
+from .policy import pauses, requires_stop, volume_is_fully_ignored
+from .schedule import DumpLimits, Lookahead, independent_groups, run_pool
 from .snapshot import snapshot_source, volume_snapshot
-from .volume import backup_volume, inspect_backing
+from .volume import (
+    ChangeTracker,
+    CopyStats,
+    Precopy,
+    backup_volume,
+    inspect_backing,
+)
+
+if TYPE_CHECKING:
+    import argparse
+    from collections.abc import Callable
+
+    import pandas as pd
+
+
+@dataclass(frozen=True)
+class Run:
+    """What every volume of one backup run shares."""
+
+    args: argparse.Namespace
+    versions_dir: str
+    version_dir: str
+    databases_df: pd.DataFrame | None
+    resolve_source: Callable[[str], str] | None
+    dump_limits: DumpLimits | None = None
+    dump_options: DumpOptions | None = None
+    reflink: bool = False
+    inplace: bool = False
+    hash_cache: HashCache | None = None
+
+
+@dataclass(frozen=True)
+class Copy:
+    """A volume whose dumps are taken and whose files are still to be copied.
+
+    Args:
+        volume: the volume name.
+        vol_dir: its directory in the generation.
+        source: where the first pass reads - the live mountpoint, or the
+            volume's path inside the snapshot.
+        live_source: the live mountpoint, which a second pass re-reads.
+        snapshotted: the first pass reads a snapshot and is final.
+        stoppable: containers to stop for an authoritative second pass, or
+            None when the volume needs no second pass.
+        tracker: where the live passes record the files' state, for the
+            second pass to re-copy only what changed; None compares the
+            whole volume by checksum instead.
+    """
+
+    volume: str
+    vol_dir: str
+    source: str
+    live_source: str
+    snapshotted: bool = False
+    stoppable: tuple[str, ...] | None = None
+    tracker: ChangeTracker | None = None
+
+
+def dump_volume(
+    run: Run, volume_name: str, containers: list[str]
+) -> tuple[VolumeOutcome, str] | None:
+    """Take one volume's dumps, the part of its backup that can run ahead.
+
+    Returns:
+        What the dump attempt established and the volume's directory in the
+        generation, or None when the volume is skipped.
+    """
+    args = run.args
+    print(f"Start backup routine for volume: {volume_name}", flush=True)
+
+    if volume_is_fully_ignored(containers, args.images_no_backup_required):
+        print(
+            f"Skipping volume '{volume_name}' entirely (all linked containers are ignored).",
+            flush=True,
+        )
+        return None
+
+    vol_dir = create_volume_directory(run.version_dir, volume_name)
+
+    if args.only_files:
+        return VolumeOutcome(database=False, dumped=False), vol_dir
+    outcome = backup_dumps_for_volume(
+        containers=containers,
+        vol_dir=vol_dir,
+        databases_df=run.databases_df,
+        database_containers=args.database_containers,
+        limits=run.dump_limits,
+        options=run.dump_options,
+    )
+    return outcome, vol_dir
+
+
+def prepare_volume(
+    run: Run,
+    volume_name: str,
+    containers: list[str],
+    dumped: Callable[[str], tuple[VolumeOutcome, str] | None] | None = None,
+) -> tuple[VolumeOutcome | None, Copy | None]:
+    """Dump one volume and decide how its files are copied.
+
+    Args:
+        dumped: hands back the volume's finished dumps when they are taken
+            ahead; ``dump_volume`` runs inline otherwise.
+
+    Returns:
+        What the dump attempt established, None when the volume is skipped;
+        and the copy still to make, None when no file copy is wanted.
+    """
+    args = run.args
+    if dumped is None:
+        taken = dump_volume(run, volume_name, containers)
+    else:
+        taken = dumped(volume_name)
+    if taken is None:
+        return None, None
+    outcome, vol_dir = taken
+
+    if args.only_sql and outcome.database:
+        if not outcome.dumped:
+            print(
+                f"WARNING: only-sql requested but no DB dump was produced for DB volume '{volume_name}'. "
+                "Falling back to file backup.",
+                flush=True,
+            )
+        else:
+            return outcome, None
+
+    backing = inspect_backing(volume_name)
+    live_source = backing.source
+
+    if run.resolve_source is not None:
+        source, reason = snapshot_source(
+            run.resolve_source, backing, args.snapshot_subject
+        )
+        if source is not None:
+            return outcome, Copy(
+                volume_name, vol_dir, source, live_source, snapshotted=True
+            )
+        print(
+            f"WARNING: volume '{volume_name}' is not in the snapshot "
+            f"({reason}); copying it live instead.",
+            flush=True,
+        )
+        return outcome, Copy(volume_name, vol_dir, live_source, live_source)
+
+    stoppable = None
+    tracker = None
+    if requires_stop(containers, args.images_no_stop_required):
+        stoppable = tuple(filter_stoppable(containers))
+        if args.authoritative_check == "changes":
+            tracker = ChangeTracker()
+    return outcome, Copy(
+        volume_name, vol_dir, live_source, live_source, False, stoppable, tracker
+    )
+
+
+def converged(run: Run, stats: CopyStats) -> bool:
+    """Whether a live pass left little enough for the stop window."""
+    args = run.args
+    return stats.bytes <= args.precopy_bytes or stats.files <= args.precopy_files
+
+
+def first_pass(run: Run, copy: Copy) -> Precopy | None:
+    """Copy the volume without stopping anything; final for a snapshot.
+
+    A volume that is stopped for afterwards is copied live again, up to
+    ``--precopy-rounds`` times, until a pass transfers no more than the
+    thresholds or stops shrinking - the way a live migration pre-copies
+    memory - so the stop window only has to carry a small remainder.
+
+    Returns:
+        The rounds and the remaining delta, or None for a volume that gets
+        no stop window.
+    """
+
+    def live() -> CopyStats | None:
+        return backup_volume(
+            run.versions_dir,
+            copy.volume,
+            copy.vol_dir,
+            authoritative=copy.snapshotted,
+            source=copy.source,
+            tracker=copy.tracker,
+            engine=run.args.copy_engine,
+            reflink=run.reflink,
+            inplace=run.inplace,
+            hash_cache=run.hash_cache,
+        )
+
+    stats = live()
+    if copy.stoppable is None:
+        return None
+    rounds = 1
+    while (
+        rounds < run.args.precopy_rounds
+        and stats is not None
+        and not converged(run, stats)
+    ):
+        again = live()
+        rounds += 1
+        shrinking = again is not None and (
+            again.bytes < stats.bytes or again.files < stats.files
+        )
+        stats = again
+        if not shrinking:
+            break
+    if rounds > 1:
+        print(
+            f"Pre-copy of '{copy.volume}' stopped after {rounds} live passes; "
+            f"{stats or 'an unknown delta'} left for the stop window.",
+            flush=True,
+        )
+    return Precopy(
+        rounds,
+        None if stats is None else stats.files,
+        None if stats is None else stats.bytes,
+    )
+
+
+def split_freeze(run: Run, containers: list[str]) -> tuple[list[str], list[str]]:
+    """Split *containers* into those to stop and those to pause."""
+    args = run.args
+    if args.shutdown:
+        return containers, []
+    paused = [
+        c
+        for c in containers
+        if pauses(c, args.freeze, args.images_pause, args.images_flush_required)
+    ]
+    return [c for c in containers if c not in paused], paused
+
+
+def authoritative_passes(run: Run, copies: list[Copy], jobs: int = 1) -> None:
+    """Re-copy every volume that needs it inside one stop window.
+
+    The window spans the union of the volumes' stoppable containers, so a
+    container several of them share is stopped and started once instead of
+    once per volume. Containers chosen by ``--freeze``/``--images-pause``
+    are paused instead; the stopped ones go down first, while the paused
+    ones can still take their last writes, and come back last.
+
+    Args:
+        jobs: passes run at the same time inside the window; safe because
+            every container any of them depends on is already stopped.
+    """
+    copies = [copy for copy in copies if copy.stoppable is not None]
+    if not copies:
+        return
+    stoppable = list(dict.fromkeys(c for copy in copies for c in copy.stoppable))
+    stopped, paused = split_freeze(run, stoppable)
+    if stopped:
+        change_containers_status(stopped, "stop")
+    # A failing pass must not leave the window's containers down: with a
+    # group or run window that is every container behind the barrier. A
+    # paused one would stay frozen, which nothing else ever undoes.
+    try:
+        if paused:
+            change_containers_status(paused, "pause")
+        stopped_at = time.monotonic()
+        run_pool(
+            jobs,
+            copies,
+            lambda copy: backup_volume(
+                run.versions_dir,
+                copy.volume,
+                copy.vol_dir,
+                authoritative=True,
+                source=copy.live_source,
+                tracker=copy.tracker,
+                engine=run.args.copy_engine,
+                reflink=run.reflink,
+                inplace=run.inplace,
+                hash_cache=run.hash_cache,
+            ),
+        )
+    finally:
+        try:
+            if paused:
+                change_containers_status(paused, "unpause")
+        finally:
+            if stopped and not run.args.shutdown:
+                change_containers_status(stopped, "start")
+    if not run.args.shutdown:
+        print(
+            f"Stop window: {len(stopped)} container(s) stopped and "
+            f"{len(paused)} paused for {time.monotonic() - stopped_at:.1f}s "
+            f"across {len(copies)} volume(s).",
+            flush=True,
+        )
+
+
+def first_passes(
+    run: Run,
+    group: list[str],
+    volumes: dict[str, list[str]],
+    dumped: Callable[[str], tuple[VolumeOutcome, str] | None] | None = None,
+) -> tuple[dict[str, VolumeOutcome], list[Copy]]:
+    """Dump and live-copy a group, leaving its authoritative passes to the caller.
+
+    With ``--stop-window volume`` each volume's own window follows its live
+    pass right away, and no copy is handed back.
+
+    Args:
+        dumped: see ``prepare_volume``.
+    """
+    outcomes: dict[str, VolumeOutcome] = {}
+    copies: list[Copy] = []
+    for volume_name in group:
+        outcome, copy = prepare_volume(run, volume_name, volumes[volume_name], dumped)
+        if outcome is not None:
+            outcomes[volume_name] = outcome
+        if copy is None:
+            continue
+        precopy = first_pass(run, copy)
+        if outcome is not None and precopy is not None:
+            outcomes[volume_name] = outcome._replace(precopy=precopy)
+        if run.args.stop_window == "volume":
+            authoritative_passes(run, [copy])
+        else:
+            copies.append(copy)
+    return outcomes, copies
+
+
+def back_up_group(
+    run: Run,
+    group: list[str],
+    volumes: dict[str, list[str]],
+    dumped: Callable[[str], tuple[VolumeOutcome, str] | None] | None = None,
+) -> dict[str, VolumeOutcome]:
+    """Back up a group of volumes connected through their containers.
+
+    With ``--stop-window group`` every volume is dumped and copied live
+    first, and the whole group then shares a single stop window.
+    """
+    outcomes, copies = first_passes(run, group, volumes, dumped)
+    authoritative_passes(run, copies)
+    return outcomes
+
+
+def back_up_volumes(
+    run: Run, volumes: dict[str, list[str]]
+) -> dict[str, VolumeOutcome]:
+    """Back up every volume, independent groups side by side.
+
+    ``--stop-window run`` splits the run in two phases instead: every group's
+    dumps and live passes first, then one barrier that stops every container
+    any volume needs stopped, runs all authoritative passes concurrently and
+    starts everything again. The delta each pass has to catch up is then as
+    small as it gets, and there is a single maintenance window to announce.
+
+    ``--dump-ahead N`` takes the dumps of the next N volumes while the current
+    one is copied: the dumps load the database containers, rsync the host's
+    disks. A volume's own dumps still end before its copy starts, and every
+    dump of a group ends before the group's stop window, since each of its
+    volumes waits for its dumps before its live pass.
+    """
+    args = run.args
+    groups = independent_groups(volumes)
+    order = [volume_name for group in groups for volume_name in group]
+    with Lookahead(
+        order,
+        lambda volume_name: dump_volume(run, volume_name, volumes[volume_name]),
+        args.dump_ahead,
+    ) as ahead:
+        outcomes: dict[str, VolumeOutcome] = {}
+        if args.stop_window != "run":
+            for done in run_pool(
+                args.jobs,
+                groups,
+                lambda group: back_up_group(run, group, volumes, ahead.take),
+            ):
+                outcomes.update(done)
+            return outcomes
+
+        copies: list[Copy] = []
+        for done, pending in run_pool(
+            args.jobs,
+            groups,
+            lambda group: first_passes(run, group, volumes, ahead.take),
+        ):
+            outcomes.update(done)
+            copies += pending
+    authoritative_passes(run, copies, jobs=args.jobs)
+    return outcomes
+
+
+def detect_reflink(versions_dir: str) -> bool:
+    """Whether the repository's filesystem can clone files, reported either way."""
+    if reflink_supported(versions_dir):
+        print(
+            "Reflink copies enabled: changed files share unchanged blocks.", flush=True
+        )
+        return True
+    print(
+        f"WARNING: {versions_dir} cannot clone files (not btrfs or XFS); "
+        "changed files are copied in full.",
+        flush=True,
+    )
+    return False
 
 
 def main() -> int:
@@ -33,108 +450,80 @@ def main() -> int:
     machine_id = get_machine_id()
     # Local wall clock on purpose: generations sort by this name, and UTC would
     # order new ones before the existing ones wherever the offset is positive.
-    backup_time = datetime.now().strftime("%Y%m%d%H%M%S")  # noqa: DTZ005
+    backup_time = datetime.now().strftime(GENERATION_FORMAT)  # noqa: DTZ005
 
     versions_dir = str(Path(args.backups_dir) / machine_id / args.repo_name)
-    version_dir = create_version_directory(versions_dir, backup_time)
+    if args.generation_store == "links":
+        version_dir = create_version_directory(versions_dir, backup_time)
+    else:
+        version_dir = create_snapshot_generation(
+            versions_dir, backup_time, args.generation_store
+        )
 
     databases_df = None if args.only_files else load_databases_df(args.databases_csv)
+    engine_cache = str(Path(args.backups_dir) / machine_id / ENGINE_CACHE_FILE)
+    if not args.only_files:
+        load_engine_cache(engine_cache)
 
     print("💾 Start volume backups...", flush=True)
 
-    outcomes: dict[str, VolumeOutcome] = {}
-
     with ExitStack() as stack:
+        hash_cache = HashCache(str(Path(versions_dir) / HASH_CACHE_FILE))
+        stack.callback(hash_cache.close)
         resolve_source = None
         if args.snapshot:
             resolve_source = stack.enter_context(
                 volume_snapshot(args.snapshot, args.snapshot_subject, backup_time)
             )
+        run = Run(
+            args,
+            versions_dir,
+            version_dir,
+            databases_df,
+            resolve_source,
+            DumpLimits(args.dump_jobs, args.dump_jobs_per_container),
+            DumpOptions(
+                compression=args.dump_compression,
+                postgres_directory=frozenset(args.postgres_directory),
+                postgres_jobs=args.postgres_jobs,
+                mariadb_profile=args.mariadb_profile,
+                mariadb_routines=args.mariadb_routines,
+                mariadb_triggers=not args.mariadb_skip_triggers,
+                chunk_pool=(
+                    str(Path(versions_dir) / CHUNK_DIR)
+                    if args.dump_store == "chunks"
+                    else None
+                ),
+                skip_unchanged=args.skip_unchanged,
+                previous=previous_dumps(versions_dir, version_dir),
+                hash_cache=hash_cache,
+            ),
+            reflink=args.reflink == "auto" and detect_reflink(versions_dir),
+            inplace=args.generation_store != "links",
+            hash_cache=hash_cache,
+        )
 
+        inventory = take_inventory()
+        volumes: dict[str, list[str]] = {}
         for volume_name in docker_volume_names():
-            print(f"Start backup routine for volume: {volume_name}", flush=True)
-
             if volume_name in args.volumes_no_backup_required:
                 print(
                     f"Skipping volume '{volume_name}' entirely (declared no-backup).",
                     flush=True,
                 )
                 continue
+            volumes[volume_name] = inventory.containers_using(volume_name)
 
-            containers = containers_using_volume(volume_name)
-
-            if volume_is_fully_ignored(containers, args.images_no_backup_required):
-                print(
-                    f"Skipping volume '{volume_name}' entirely (all linked containers are ignored).",
-                    flush=True,
-                )
-                continue
-
-            vol_dir = create_volume_directory(version_dir, volume_name)
-
-            outcome = VolumeOutcome(database=False, dumped=False)
-            if not args.only_files:
-                outcome = backup_dumps_for_volume(
-                    containers=containers,
-                    vol_dir=vol_dir,
-                    databases_df=databases_df,
-                    database_containers=args.database_containers,
-                )
-            outcomes[volume_name] = outcome
-
-            if args.only_sql and outcome.database:
-                if not outcome.dumped:
-                    print(
-                        f"WARNING: only-sql requested but no DB dump was produced for DB volume '{volume_name}'. "
-                        "Falling back to file backup.",
-                        flush=True,
-                    )
-                else:
-                    continue
-
-            backing = inspect_backing(volume_name)
-            live_source = backing.source
-
-            def copy(
-                *,
-                authoritative: bool,
-                source: str = live_source,
-                volume: str = volume_name,
-                target: str = vol_dir,
-            ) -> None:
-                backup_volume(
-                    versions_dir,
-                    volume,
-                    target,
-                    authoritative=authoritative,
-                    source=source,
-                )
-
-            if resolve_source is not None:
-                source, reason = snapshot_source(
-                    resolve_source, backing, args.snapshot_subject
-                )
-                if source is not None:
-                    copy(authoritative=True, source=source)
-                else:
-                    print(
-                        f"WARNING: volume '{volume_name}' is not in the snapshot "
-                        f"({reason}); copying it live instead.",
-                        flush=True,
-                    )
-                    copy(authoritative=False)
-                continue
-
-            copy(authoritative=False)
-            if requires_stop(containers, args.images_no_stop_required):
-                stoppable = filter_stoppable(containers)
-                change_containers_status(stoppable, "stop")
-                copy(authoritative=True)
-                if not args.shutdown:
-                    change_containers_status(stoppable, "start")
+        outcomes = back_up_volumes(run, volumes)
+        hash_cache.prune()
 
-    write_manifest(version_dir, outcomes)
+    if not args.only_files:
+        save_engine_cache(engine_cache)
+    discard_carried(version_dir)
+    write_manifest(version_dir, outcomes, args.dump_compression, args.dump_store)
     stamp_directory(version_dir)
+    if args.dump_store == "chunks":
+        collect_chunks(versions_dir)
     print("Finished volume backups.", flush=True)
 
     print("Handling Docker Compose services...", flush=True)
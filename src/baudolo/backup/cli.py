@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import argparse
 
+from baudolo.generation import DUMP_STORES
+
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Backup Docker volumes.")
@@ -70,6 +72,146 @@ def parse_args() -> argparse.Namespace:
         help="Exact volume names that are never backed up, whatever containers use them. For derived trees a restore cannot reproduce, above all a nested docker data root",
     )
 
+    p.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Volumes backed up at the same time (default: 1). Volumes that share a container are still taken one after another, so no stop window can take a container away from another volume's dump",
+    )
+
+    p.add_argument(
+        "--dump-jobs",
+        type=int,
+        default=None,
+        help="Database dumps running at once across the whole run (default: no limit beyond --jobs). Also lets the containers of one volume dump side by side",
+    )
+    p.add_argument(
+        "--dump-jobs-per-container",
+        type=int,
+        default=1,
+        help="Database dumps running at once against one container (default: 1)",
+    )
+    p.add_argument(
+        "--dump-compression",
+        choices=["none", "gzip", "zstd"],
+        default="none",
+        help="Compress database dumps while they are written (default: none). zstd uses every core. The codec is recorded in the generation's manifest, and baudolo-restore decompresses transparently",
+    )
+    p.add_argument(
+        "--dump-store",
+        choices=list(DUMP_STORES),
+        default="files",
+        help="How SQL dumps are kept (default: files). 'chunks': cut each dump at content-defined boundaries into chunks stored once in a pool shared by every generation of the repository (<backups-dir>/<machine>/<repo-name>/.chunks), so unchanged tables cost no space again; the generation holds a small recipe per dump, which baudolo-restore streams back. Each chunk is zlib-compressed, so --dump-compression must stay none. After the run, chunks no generation references any more and unused for a day are removed",
+    )
+    p.add_argument(
+        "--postgres-directory",
+        nargs="+",
+        default=[],
+        metavar="INSTANCE",
+        help="Postgres instances dumped with pg_dump's directory format (-Fd) instead of one SQL stream, so --postgres-jobs tables are dumped at once and baudolo-restore can replay them with pg_restore -j. Each database becomes a <database>.backup.dir directory, which --dump-compression does not apply to",
+    )
+    p.add_argument(
+        "--postgres-jobs",
+        type=int,
+        default=4,
+        help="pg_dump workers per directory-format dump (default: 4). Each holds its own connection, and every one counts against the instance's max_connections",
+    )
+    p.add_argument(
+        "--mariadb-profile",
+        choices=["lock", "innodb"],
+        default="lock",
+        help="How MariaDB/MySQL databases are dumped. 'lock' (default): mariadb-dump's own behaviour, which locks each database's tables for the whole dump and blocks its writers. 'innodb': --single-transaction --quick --extended-insert, one consistent snapshot without locks, row by row; only consistent for transactional (InnoDB) tables. Either way the lock waits the server saw during each dump are reported",
+    )
+    p.add_argument(
+        "--mariadb-routines",
+        action="store_true",
+        help="Also dump stored procedures and functions (mariadb-dump --routines)",
+    )
+    p.add_argument(
+        "--mariadb-skip-triggers",
+        action="store_true",
+        help="Leave triggers out of MariaDB/MySQL dumps (mariadb-dump --skip-triggers)",
+    )
+    p.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="Fingerprint each database before its dump and hard-link the previous generation's dump when the fingerprint has not changed since. Postgres: the database's tuple counters in pg_stat_database, which the server publishes up to a second late; a cluster dump: the WAL position. MariaDB/MySQL: CHECKSUM TABLE over every table, which reads them whole and does not cover views, routines or triggers. pg_dump directories are always dumped",
+    )
+    p.add_argument(
+        "--dump-ahead",
+        type=int,
+        default=0,
+        help="Take the database dumps of up to N upcoming volumes while the current one is copied (default: 0, off). A volume's own dumps always end before its copy starts. Not available with --stop-window volume, whose windows stop a group's containers between its volumes",
+    )
+    p.add_argument(
+        "--stop-window",
+        choices=["volume", "group", "run"],
+        default="group",
+        help="How long containers stay stopped for the authoritative pass. 'group' (default): volumes sharing containers are all copied live first, then their containers are stopped and started once for all of them. 'volume': stop and start around each volume's own pass. 'run': copy every volume live first, then stop every container at one barrier, run all authoritative passes concurrently (up to --jobs) and start everything again",
+    )
+
+    p.add_argument(
+        "--authoritative-check",
+        choices=["changes", "checksum"],
+        default="changes",
+        help="How the authoritative pass finds what a live pass may have copied stale. 'changes' (default): each live pass first records every file's inode, size and nanosecond mtime and ctime; the authoritative pass re-copies the files whose record moved, and those whose ctime is later than the last generation's start while their copy there matches by size and mtime (rewritten behind a restored mtime), and compares the rest by size and mtime, so the stop window reads what changed rather than the whole volume. 'checksum': rsync --checksum over the whole volume, reading every byte of source and destination",
+    )
+    p.add_argument(
+        "--copy-engine",
+        choices=["rsync", "native"],
+        default="rsync",
+        help="What copies volume files into the generation. 'rsync' (default): rsync -a --no-D --delete --link-dest. 'native': the same semantics in-process - a threaded os.scandir walk, hard links to the last generation for unchanged files and copy_file_range for changed ones - without rsync's sender/receiver split and single-threaded file list",
+    )
+    p.add_argument(
+        "--reflink",
+        choices=["never", "auto"],
+        default="never",
+        help="With --copy-engine native: 'auto' checks whether --backups-dir can clone files (btrfs, XFS) and, if so, copies a changed file by cloning its previous version with FICLONE and rewriting only the blocks that differ, so large, slowly changing files share their unchanged extents across generations. 'never' (default) writes changed files in full",
+    )
+    p.add_argument(
+        "--generation-store",
+        choices=["links", "btrfs", "zfs"],
+        default="links",
+        help="How a generation shares the unchanged files of the last one. 'links' (default): every file is hard-linked via rsync --link-dest, re-creating every directory and link each run. 'btrfs'/'zfs': the repository directory (<backups-dir>/<machine-id>/<repo-name>) is a btrfs subvolume or the mountpoint of a zfs dataset; each generation starts as a writable snapshot (btrfs) or promoted clone (zfs) of the last finished one and the copy writes only what changed, rsync --inplace block by block. Creating and deleting a generation no longer depends on the number of files",
+    )
+    p.add_argument(
+        "--precopy-rounds",
+        type=int,
+        default=1,
+        help="Live passes at most before a volume's containers are stopped (default: 1). Further passes run while the previous one still transferred more than --precopy-bytes and --precopy-files and the delta keeps shrinking, so the stop window only copies what changed during the last one",
+    )
+    p.add_argument(
+        "--precopy-bytes",
+        type=int,
+        default=0,
+        help="A live pass transferring at most this many bytes ends the pre-copy (default: 0)",
+    )
+    p.add_argument(
+        "--precopy-files",
+        type=int,
+        default=0,
+        help="A live pass transferring at most this many files ends the pre-copy (default: 0)",
+    )
+
+    p.add_argument(
+        "--freeze",
+        choices=["stop", "pause"],
+        default="stop",
+        help="How containers are held still for the authoritative pass. stop (default): docker stop/start. pause: freeze them with the cgroup freezer (docker pause/unpause), keeping processes, caches and connections warm; images listed in --images-flush-required are still stopped",
+    )
+    p.add_argument(
+        "--images-pause",
+        nargs="+",
+        default=[],
+        help="Exact image references whose containers are paused instead of stopped even with --freeze stop",
+    )
+    p.add_argument(
+        "--images-flush-required",
+        nargs="+",
+        default=[],
+        help="Exact image references whose containers are always stopped, because only a real shutdown flushes what they hold in memory",
+    )
+
     p.add_argument(
         "--shutdown",
         action="store_true",
@@ -100,8 +242,33 @@ def parse_args() -> argparse.Namespace:
     args = p.parse_args()
     if not args.only_files and not args.databases_csv:
         p.error("--databases-csv is required unless --only-files is given")
+    if args.jobs < 1:
+        p.error("--jobs must be at least 1")
+    if args.dump_jobs is not None and args.dump_jobs < 1:
+        p.error("--dump-jobs must be at least 1")
+    if args.dump_jobs_per_container < 1:
+        p.error("--dump-jobs-per-container must be at least 1")
+    if args.reflink != "never" and args.copy_engine != "native":
+        p.error("--reflink needs --copy-engine native")
+    if args.dump_store == "chunks" and args.dump_compression != "none":
+        p.error("--dump-store chunks compresses each chunk; drop --dump-compression")
+    if args.postgres_jobs < 1:
+        p.error("--postgres-jobs must be at least 1")
+    if args.dump_ahead < 0:
+        p.error("--dump-ahead must not be negative")
+    if args.dump_ahead and args.stop_window == "volume":
+        p.error(
+            "--dump-ahead needs --stop-window group or run: a volume window "
+            "stops containers the next volume's dump may need"
+        )
+    if args.precopy_rounds < 1:
+        p.error("--precopy-rounds must be at least 1")
+    if args.precopy_bytes < 0 or args.precopy_files < 0:
+        p.error("--precopy-bytes and --precopy-files must not be negative")
     if bool(args.snapshot) != bool(args.snapshot_subject):
         p.error("--snapshot and --snapshot-subject must be given together")
+    if args.freeze == "pause" and args.shutdown:
+        p.error("--freeze pause is meaningless with --shutdown: containers stay down")
     if args.snapshot and args.shutdown:
         p.error(
             "--shutdown is meaningless with --snapshot: containers are never stopped"
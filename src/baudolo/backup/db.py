@@ -1,21 +1,172 @@
 from __future__ import annotations
 
+import filecmp
+import hashlib
 import logging
 import pathlib
 import re
-from typing import TYPE_CHECKING
+import sys
+from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING, NamedTuple
 
 from baudolo.databases import CLUSTER_ROW, validate_database
-from baudolo.generation import CLUSTER_SUFFIX, DUMP_SUFFIX, SQL_DIR
+from baudolo.generation import (
+    CLUSTER_SUFFIX,
+    DIRECTORY_SUFFIX,
+    DUMP_CODECS,
+    DUMP_SUFFIX,
+    RECIPE_SUFFIX,
+    SQL_DIR,
+)
 
+from .copyengine import link_or_clone
 from .docker import docker_exec_argv
-from .shell import BackupError, execute_to_file
+from .schedule import run_pool
+from .shell import (
+    BackupError,
+    Digest,
+    execute_shell_command,
+    execute_to_directory,
+    execute_to_file,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
     import pandas as pd
 
+    from .hashcache import HashCache
+    from .schedule import DumpLimits
+
 log = logging.getLogger(__name__)
 
+# The compressor each codec streams a dump through; zstd on every core.
+COMPRESSORS: dict[str, list[str] | None] = {
+    "none": None,
+    "gzip": ["gzip", "-c"],
+    "zstd": ["zstd", "-q", "-T0", "-c"],
+}
+
+# mariadb-dump flags per --mariadb-profile. 'lock' is the tool's own default,
+# which locks each database's tables for the whole dump and so suits MyISAM.
+# 'innodb' reads one consistent snapshot without locking, and states the
+# streaming flags --opt implies, so an option file in the image cannot turn
+# them off: rows are fetched one by one instead of buffered whole.
+MARIADB_PROFILES: dict[str, tuple[str, ...]] = {
+    "lock": (),
+    "innodb": ("--single-transaction", "--quick", "--extended-insert"),
+}
+# The interactive client shipped next to each dump tool.
+MARIADB_CLIENTS = {"mariadb-dump": "mariadb", "mysqldump": "mysql"}
+# Server-wide counters of the waits writers spend on locks.
+LOCK_COUNTERS = ("Table_locks_waited", "Innodb_row_lock_waits", "Innodb_row_lock_time")
+
+_BASE_TABLES = (
+    "SELECT table_name FROM information_schema.tables "
+    "WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE' "
+    "ORDER BY table_name"
+)
+
+# Runs inside the container: pg_dump's directory format needs a directory, so
+# it writes to a scratch one there and streams it out as tar. The job count,
+# user and database arrive as positional parameters, never spliced into it.
+# The scratch directory holds the whole dump until tar has sent it, and is
+# removed on any exit; a signal is turned into one, which sh would not do.
+_DIRECTORY_DUMP = (
+    "set -e; d=$(mktemp -d); trap 'rm -rf \"$d\"' EXIT; trap 'exit 1' HUP INT TERM; "
+    'pg_dump -Fd -j "$1" -f "$d/dump" -U "$2" -d "$3" -h localhost '
+    "--no-owner --no-privileges; "
+    'tar -C "$d/dump" -cf - .'
+)
+
+
+class DumpRecord(NamedTuple):
+    """A dump file the run holds.
+
+    Args:
+        digest: the hash, size and line count of its SQL stream.
+        fingerprint: what the database looked like just before the dump, from
+            ``postgres_fingerprint`` or ``mariadb_fingerprint``; None when it
+            was not asked or could not be read.
+        reused: the generation the file was hard-linked from, because the
+            fingerprint had not changed since or the new dump came out
+            identical; None for a file of its own.
+    """
+
+    digest: Digest
+    fingerprint: str | None = None
+    reused: str | None = None
+
+
+@dataclass(frozen=True)
+class Previous:
+    """The dumps of the last finished generation, as its manifest lists them.
+
+    Args:
+        generation: that generation's directory.
+        dumps: its manifest's ``dumps``, keyed by ``<volume>/sql/<file>``.
+    """
+
+    generation: str
+    dumps: dict[str, dict] = field(default_factory=dict)
+
+    def unchanged(self, key: str, fingerprint: str | None) -> DumpRecord | None:
+        """The earlier dump at *key*, if it was taken at *fingerprint* too."""
+        entry = self.dumps.get(key) or {}
+        if fingerprint is None or entry.get("fingerprint") != fingerprint:
+            return None
+        digest = Digest(
+            entry["algorithm"], entry["digest"], entry["bytes"], entry["lines"]
+        )
+        return DumpRecord(digest, fingerprint, pathlib.Path(self.generation).name)
+
+
+@dataclass(frozen=True)
+class DumpOptions:
+    """How the run writes its dumps.
+
+    Args:
+        compression: the codec plain dumps are streamed through, a key of
+            ``DUMP_CODECS``; its suffix is appended to the file name.
+        postgres_directory: Postgres instances dumped with ``pg_dump -Fd``
+            into a ``DIRECTORY_SUFFIX`` directory instead of one SQL stream.
+            The format compresses on its own, so the codec does not apply.
+        postgres_jobs: the ``pg_dump -j`` workers of a directory dump.
+        mariadb_profile: a key of ``MARIADB_PROFILES``.
+        mariadb_routines: also dump stored procedures and functions.
+        mariadb_triggers: dump triggers, as mariadb-dump does by default.
+        chunk_pool: keep each SQL dump as a recipe of chunks in this pool
+            instead of one file; *compression* is then "none", since the
+            pool compresses every chunk.
+        skip_unchanged: fingerprint each database before its dump, so this
+            generation or a later one can tell whether it changed.
+        previous: the last generation's dumps. A dump identical to the one
+            there becomes a hard link to it, and with *skip_unchanged* a
+            database whose fingerprint matches is linked without a dump.
+        hash_cache: digests of earlier dumps the manifest has none for.
+    """
+
+    compression: str = "none"
+    postgres_directory: frozenset[str] = frozenset()
+    postgres_jobs: int = 4
+    mariadb_profile: str = "lock"
+    mariadb_routines: bool = False
+    mariadb_triggers: bool = True
+    chunk_pool: str | None = None
+    skip_unchanged: bool = False
+    previous: Previous | None = None
+    hash_cache: HashCache | None = None
+
+    def mariadb_flags(self) -> list[str]:
+        """The mariadb-dump flags these options ask for."""
+        return [
+            *MARIADB_PROFILES[self.mariadb_profile],
+            *(["--routines"] if self.mariadb_routines else []),
+            *([] if self.mariadb_triggers else ["--skip-triggers"]),
+        ]
+
+
 ENGINE_NAMES = ("database", "postgres", "mariadb", "mysql", "db")
 _SUFFIX_RE = re.compile(rf"(_|-)({'|'.join(ENGINE_NAMES)})")
 
@@ -48,12 +199,18 @@ def get_instance(container: str, database_containers: list[str]) -> str | None:
 
 
 def fallback_pg_dumpall(
-    container: str, username: str, password: str, out_file: str
-) -> None:
+    container: str,
+    username: str,
+    password: str,
+    out_file: str,
+    *,
+    compress: list[str] | None = None,
+    chunks: str | None = None,
+) -> Digest:
     """
     Perform a full Postgres cluster dump using pg_dumpall.
     """
-    execute_to_file(
+    return execute_to_file(
         docker_exec_argv(
             container,
             ["pg_dumpall", "-U", username, "-h", "localhost"],
@@ -62,7 +219,404 @@ def fallback_pg_dumpall(
         ),
         out_file,
         env={"PGPASSWORD": password},
+        compress=compress,
+        chunks=chunks,
+    )
+
+
+def dump_mariadb(
+    container: str,
+    dump_tool: str,
+    user: str,
+    password: str,
+    db_name: str,
+    out: str,
+    *,
+    compress: list[str] | None = None,
+    chunks: str | None = None,
+    flags: Sequence[str] = (),
+) -> Digest:
+    """Dump *db_name*, reporting the lock waits the server saw meanwhile.
+
+    Returns the dump's digest.
+
+    Args:
+        flags: further mariadb-dump options, from ``DumpOptions.mariadb_flags``.
+    """
+    client = MARIADB_CLIENTS.get(dump_tool, "mariadb")
+    before = mariadb_lock_counters(container, client, user, password)
+    # Force TCP so auth matches '<user>'@'%' instead of socket -> 'localhost'.
+    digest = execute_to_file(
+        docker_exec_argv(
+            container,
+            [
+                dump_tool,
+                "-h",
+                "127.0.0.1",
+                "--protocol=tcp",
+                "-u",
+                user,
+                f"-p{password}",
+                *flags,
+                db_name,
+            ],
+        ),
+        out,
+        compress=compress,
+        chunks=chunks,
+    )
+    after = mariadb_lock_counters(container, client, user, password)
+    if before is not None and after is not None:
+        waited = {name: after[name] - before[name] for name in LOCK_COUNTERS}
+        print(
+            f"Lock waits while dumping '{db_name}' on {container} (server-wide): "
+            f"{waited['Table_locks_waited']} table lock(s), "
+            f"{waited['Innodb_row_lock_waits']} InnoDB row lock(s) for "
+            f"{waited['Innodb_row_lock_time']} ms",
+            flush=True,
+        )
+    return digest
+
+
+def mariadb_lock_counters(
+    container: str, client: str, user: str, password: str
+) -> dict[str, int] | None:
+    """The server's ``LOCK_COUNTERS``, or None when they cannot be read.
+
+    The report is a diagnostic: a server that refuses the query, or an old one
+    lacking a counter, costs the report and never the dump.
+    """
+    names = ", ".join(f"'{name}'" for name in LOCK_COUNTERS)
+    try:
+        lines = execute_shell_command(
+            docker_exec_argv(
+                container,
+                [
+                    client,
+                    "-h",
+                    "127.0.0.1",
+                    "--protocol=tcp",
+                    "-u",
+                    user,
+                    f"-p{password}",
+                    "-N",
+                    "-B",
+                    "-e",
+                    f"SHOW GLOBAL STATUS WHERE Variable_name IN ({names})",
+                ],
+            )
+        )
+    except (BackupError, OSError) as error:
+        print(
+            f"WARNING: lock counters of {container} are unreadable: {error}",
+            file=sys.stderr,
+            flush=True,
+        )
+        return None
+    found = dict(line.split("\t", 1) for line in lines if "\t" in line)
+    if not all(found.get(name, "").strip().isdigit() for name in LOCK_COUNTERS):
+        return None
+    return {name: int(found[name]) for name in LOCK_COUNTERS}
+
+
+def postgres_fingerprint(
+    container: str, user: str, password: str, db_name: str | None
+) -> str | None:
+    """The write counters of *db_name*, or the WAL position for a cluster dump.
+
+    ``pg_stat_database`` counts every tuple inserted, updated and deleted in
+    the database, catalogs included, so DDL moves it as well; ``stats_reset``
+    and a restart change it too, which only costs a dump. A cluster dump
+    spans every database and the roles, so it is fingerprinted by the
+    cluster's WAL insert position instead.
+
+    Returns None when the server cannot be asked.
+    """
+    query = (
+        "SELECT pg_current_wal_lsn()"
+        if db_name is None
+        else "SELECT tup_inserted, tup_updated, tup_deleted, stats_reset "
+        "FROM pg_stat_database WHERE datname = current_database()"
+    )
+    lines = _ask(
+        container,
+        [
+            "psql",
+            "-U",
+            user,
+            "-d",
+            db_name or "postgres",
+            "-h",
+            "localhost",
+            "-tA",
+            "-c",
+            query,
+        ],
+        env={"PGPASSWORD": password},
     )
+    if not lines:
+        return None
+    return f"postgres:{lines[0].strip()}"
+
+
+def mariadb_fingerprint(
+    container: str, client: str, user: str, password: str, db_name: str
+) -> str | None:
+    """``CHECKSUM TABLE`` over every base table of *db_name*, hashed into one.
+
+    The checksum reads each table whole, which is still far cheaper than
+    dumping and writing it; a table added or dropped changes the list.
+    Views, routines and triggers are not covered.
+
+    Returns None when the server cannot be asked.
+    """
+    connect = [
+        client,
+        "-h",
+        "127.0.0.1",
+        "--protocol=tcp",
+        "-u",
+        user,
+        f"-p{password}",
+        "-N",
+        "-B",
+        db_name,
+        "-e",
+    ]
+    tables = _ask(
+        container,
+        [
+            *connect,
+            _BASE_TABLES,
+        ],
+    )
+    if tables is None:
+        return None
+    sums: list[str] = []
+    if tables:
+        quoted = ", ".join("`" + name.replace("`", "``") + "`" for name in tables)
+        checked = _ask(container, [*connect, f"CHECKSUM TABLE {quoted}"])
+        if checked is None:
+            return None
+        sums = checked
+    content = "\n".join([*tables, *sums]).encode()
+    return f"mariadb:{hashlib.sha256(content).hexdigest()}"
+
+
+def _ask(
+    container: str, argv: list[str], *, env: dict[str, str] | None = None
+) -> list[str] | None:
+    """Run a query client in *container*; None, with a warning, if it fails."""
+    try:
+        return execute_shell_command(
+            docker_exec_argv(
+                container, argv, forward_env=["PGPASSWORD"] if env else ()
+            ),
+            env=env,
+        )
+    except (BackupError, OSError) as error:
+        print(
+            f"WARNING: cannot fingerprint a database on {container}: {error}",
+            file=sys.stderr,
+            flush=True,
+        )
+        return None
+
+
+def reuse_or_dump(
+    dump: Callable[[], Digest | None],
+    out_file: str,
+    key: str,
+    fingerprint: Callable[[], str | None] | None,
+    previous: Previous | None,
+    cache: HashCache | None = None,
+) -> DumpRecord | None:
+    """Take a dump, or hard-link the previous generation's if nothing changed.
+
+    Args:
+        dump: writes *out_file* and returns its digest.
+        out_file: where the dump goes.
+        key: the dump's ``<volume>/sql/<file>`` in a generation.
+        fingerprint: reads the database's fingerprint; None to skip it.
+        previous: the last generation's dumps, None to dump regardless.
+        cache: see ``link_if_identical``.
+
+    Returns:
+        What the generation now holds at *out_file*, or None for a dump that
+        has no digest. A fresh dump identical to the previous one is replaced
+        by a link to it.
+    """
+    seen = fingerprint() if fingerprint is not None else None
+    earlier = previous.unchanged(key, seen) if previous is not None else None
+    if earlier is not None:
+        try:
+            link_or_clone(str(pathlib.Path(previous.generation) / key), out_file)
+        except OSError as error:
+            print(
+                f"WARNING: cannot link {key} from {earlier.reused} ({error}); "
+                "dumping it again.",
+                file=sys.stderr,
+                flush=True,
+            )
+        else:
+            print(f"Unchanged since {earlier.reused}: linked {key}", flush=True)
+            return earlier
+    digest = dump()
+    if digest is None:
+        return None
+    fresh = DumpRecord(digest, seen)
+    if previous is None:
+        return fresh
+    return link_if_identical(fresh, out_file, key, previous, cache)
+
+
+def _cached_twin(
+    digest: Digest, out_file: str, earlier: pathlib.Path, cache: HashCache
+) -> str | None:
+    """*earlier*'s digest if it holds what *out_file* does, else None.
+
+    The fresh file's digest is the one computed while it was written,
+    unless the file is not that stream (a chunk recipe); only the earlier
+    file is ever read, and only once across the generations it is linked
+    into.
+    """
+    size = pathlib.Path(out_file).stat().st_size
+    if not earlier.is_file() or earlier.stat().st_size != size:
+        return None
+    fresh = (
+        digest.hexdigest
+        if digest.bytes == size
+        else cache.digest(out_file, digest.algorithm)
+    )
+    known = cache.digest(str(earlier), digest.algorithm)
+    return known if known == fresh else None
+
+
+def link_if_identical(
+    record: DumpRecord,
+    out_file: str,
+    key: str,
+    previous: Previous,
+    cache: HashCache | None = None,
+) -> DumpRecord:
+    """Replace a fresh dump by a hard link to an identical earlier one.
+
+    An idle database dumps to the same stream every night. The digest just
+    computed is compared with the one the earlier manifest recorded for the
+    same ``<volume>/sql/<file>``, which costs no read; an earlier manifest
+    without digests falls back to comparing the two files byte by byte, or
+    their digests from *cache*, which reads an earlier file that is linked
+    on from generation to generation only once. The link replaces the new
+    file atomically, so the dump is never missing.
+
+    Returns:
+        *record*, naming the earlier generation when the file is now a link.
+    """
+    earlier = pathlib.Path(previous.generation) / key
+    entry = previous.dumps.get(key)
+    known = None
+    if entry is not None:
+        recorded = (entry.get("algorithm"), entry.get("digest"), entry.get("bytes"))
+        digest = record.digest
+        same = recorded == (digest.algorithm, digest.hexdigest, digest.bytes)
+        same = same and earlier.is_file()
+    elif cache is not None:
+        known = _cached_twin(record.digest, out_file, earlier, cache)
+        same = known is not None
+    else:
+        same = earlier.is_file() and filecmp.cmp(earlier, out_file, shallow=False)
+    if not same:
+        return record
+    tmp = pathlib.Path(f"{out_file}.link")
+    try:
+        link_or_clone(str(earlier), str(tmp))
+        tmp.replace(out_file)
+    except OSError as error:
+        tmp.unlink(missing_ok=True)
+        print(
+            f"WARNING: cannot link {key} to its twin in "
+            f"{pathlib.Path(previous.generation).name} ({error}); keeping the copy.",
+            file=sys.stderr,
+            flush=True,
+        )
+        return record
+    if known is not None:
+        cache.remember(out_file, known, record.digest.algorithm)
+    return record._replace(reused=pathlib.Path(previous.generation).name)
+
+
+def dump_postgres(
+    container: str,
+    instance: str,
+    user: str,
+    password: str,
+    db_name: str,
+    out: str,
+    *,
+    compress: list[str] | None = None,
+    chunks: str | None = None,
+) -> Digest:
+    try:
+        return execute_to_file(
+            docker_exec_argv(
+                container,
+                [
+                    "pg_dump",
+                    "-U",
+                    user,
+                    "-d",
+                    db_name,
+                    "-h",
+                    "localhost",
+                    "--no-owner",
+                    "--no-privileges",
+                ],
+                interactive=True,
+                forward_env=["PGPASSWORD"],
+            ),
+            out,
+            env={"PGPASSWORD": password},
+            compress=compress,
+            chunks=chunks,
+        )
+    except BackupError as e:
+        raise BackupError(
+            f"Postgres dump failed for instance '{instance}', "
+            f"database '{db_name}'. This database was explicitly configured "
+            "and therefore must succeed.\n"
+            f"{e}"
+        ) from e
+
+
+def dump_postgres_directory(
+    container: str,
+    instance: str,
+    user: str,
+    password: str,
+    db_name: str,
+    out: str,
+    *,
+    jobs: int,
+) -> None:
+    """Dump *db_name* in pg_dump's directory format, *jobs* tables at a time."""
+    try:
+        execute_to_directory(
+            docker_exec_argv(
+                container,
+                ["sh", "-c", _DIRECTORY_DUMP, "sh", str(jobs), user, db_name],
+                interactive=True,
+                forward_env=["PGPASSWORD"],
+            ),
+            out,
+            env={"PGPASSWORD": password},
+        )
+    except BackupError as e:
+        raise BackupError(
+            f"Postgres dump failed for instance '{instance}', "
+            f"database '{db_name}'. This database was explicitly configured "
+            "and therefore must succeed.\n"
+            f"{e}"
+        ) from e
 
 
 def backup_database(
@@ -73,15 +627,35 @@ def backup_database(
     dump_tool: str,
     databases_df: pd.DataFrame,
     database_containers: list[str],
+    claim: Callable[[str, str], bool] | None = None,
+    record: Callable[[str, DumpRecord], None] | None = None,
+    limits: DumpLimits | None = None,
+    options: DumpOptions | None = None,
 ) -> bool:
     """
     Backup databases for a given DB container.
 
+    Every configured row is checked before the first dump starts; the dumps
+    then run side by side as far as *limits* allow, each still written to a
+    temporary file that only replaces its target once it succeeded.
+
     Args:
         dump_tool: the MariaDB client found in the container, so an image
             that ships only mysqldump is dumped with the tool it has.
+        claim: asked with the instance and the dump's file name before each
+            dump; False means the run already holds that dump elsewhere, and
+            it is counted without being taken again.
+        record: told each dump file's name and record once it is written or
+            linked; a pg_dump directory has none.
+        limits: the run's dump slots; None dumps one database at a time.
+        options: how the dumps are written; None takes plain, uncompressed
+            SQL.
 
     Returns True if at least one dump was produced.
+
+    Raises:
+        BackupError: a dump failed; the first failure is raised once the dumps
+            already running have ended.
     """
     instance_name = get_instance(container, database_containers)
     if instance_name is None:
@@ -97,6 +671,16 @@ def backup_database(
     out_dir.mkdir(parents=True, exist_ok=True)
 
     produced = False
+    # file name -> the dump that writes it
+    dumps: dict[str, Callable[[], Digest | None]] = {}
+    # file name -> how the database is fingerprinted before it is dumped
+    fingerprints: dict[str, Callable[[], str | None]] = {}
+    client = MARIADB_CLIENTS.get(dump_tool, "mariadb")
+    options = options or DumpOptions()
+    codec = RECIPE_SUFFIX if options.chunk_pool else DUMP_CODECS[options.compression]
+    compress = COMPRESSORS[options.compression]
+    chunks = options.chunk_pool
+    directory = db_type == "postgres" and instance_name in options.postgres_directory
 
     for row in entries.itertuples(index=False):
         raw_db = getattr(row, "database", "")
@@ -112,65 +696,98 @@ def backup_database(
                     f"'{CLUSTER_ROW}' is currently only supported for Postgres."
                 )
 
-            cluster_file = str(out_dir / f"{instance_name}{CLUSTER_SUFFIX}")
-            fallback_pg_dumpall(container, user, password, cluster_file)
+            cluster_name = f"{instance_name}{CLUSTER_SUFFIX}{codec}"
+            if claim is None or claim(instance_name, cluster_name):
+                dumps[cluster_name] = partial(
+                    fallback_pg_dumpall,
+                    container,
+                    user,
+                    password,
+                    str(out_dir / cluster_name),
+                    compress=compress,
+                    chunks=chunks,
+                )
+                fingerprints[cluster_name] = partial(
+                    postgres_fingerprint, container, user, password, None
+                )
             produced = True
             continue
 
         db_name = db_value
-        dump_file = str(out_dir / f"{db_name}{DUMP_SUFFIX}")
+        if db_type not in ("mariadb", "postgres"):
+            continue
+        produced = True
+        dump_name = (
+            f"{db_name}{DIRECTORY_SUFFIX}"
+            if directory
+            else f"{db_name}{DUMP_SUFFIX}{codec}"
+        )
+        if claim is not None and not claim(instance_name, dump_name):
+            continue
+        dump_file = str(out_dir / dump_name)
 
         if db_type == "mariadb":
-            # Force TCP so auth matches '<user>'@'%' instead of socket -> 'localhost'.
-            execute_to_file(
-                docker_exec_argv(
-                    container,
-                    [
-                        dump_tool,
-                        "-h",
-                        "127.0.0.1",
-                        "--protocol=tcp",
-                        "-u",
-                        user,
-                        f"-p{password}",
-                        db_name,
-                    ],
-                ),
+            dumps[dump_name] = partial(
+                dump_mariadb,
+                container,
+                dump_tool,
+                user,
+                password,
+                db_name,
                 dump_file,
+                compress=compress,
+                chunks=chunks,
+                flags=options.mariadb_flags(),
+            )
+            fingerprints[dump_name] = partial(
+                mariadb_fingerprint, container, client, user, password, db_name
+            )
+        elif directory:
+            dumps[dump_name] = partial(
+                dump_postgres_directory,
+                container,
+                instance_name,
+                user,
+                password,
+                db_name,
+                dump_file,
+                jobs=options.postgres_jobs,
+            )
+        else:
+            dumps[dump_name] = partial(
+                dump_postgres,
+                container,
+                instance_name,
+                user,
+                password,
+                db_name,
+                dump_file,
+                compress=compress,
+                chunks=chunks,
+            )
+            fingerprints[dump_name] = partial(
+                postgres_fingerprint, container, user, password, db_name
             )
-            produced = True
-            continue
 
-        if db_type == "postgres":
-            try:
-                execute_to_file(
-                    docker_exec_argv(
-                        container,
-                        [
-                            "pg_dump",
-                            "-U",
-                            user,
-                            "-d",
-                            db_name,
-                            "-h",
-                            "localhost",
-                            "--no-owner",
-                            "--no-privileges",
-                        ],
-                        interactive=True,
-                        forward_env=["PGPASSWORD"],
-                    ),
-                    dump_file,
-                    env={"PGPASSWORD": password},
-                )
-                produced = True
-            except BackupError as e:
-                raise BackupError(
-                    f"Postgres dump failed for instance '{instance_name}', "
-                    f"database '{db_name}'. This database was explicitly configured "
-                    "and therefore must succeed.\n"
-                    f"{e}"
-                ) from e
-            continue
+    holder = pathlib.Path(volume_dir).name
+
+    def take(file_name: str) -> DumpRecord | None:
+        work = partial(
+            reuse_or_dump,
+            dumps[file_name],
+            str(out_dir / file_name),
+            f"{holder}/{SQL_DIR}/{file_name}",
+            fingerprints.get(file_name) if options.skip_unchanged else None,
+            options.previous,
+            options.hash_cache,
+        )
+        if limits is None:
+            return work()
+        with limits.slot(container):
+            return work()
 
+    records = run_pool(1 if limits is None else limits.per_container, list(dumps), take)
+    for file_name, dumped in zip(dumps, records):
+        if record is not None and dumped is not None:
+            record(file_name, dumped)
     return produced
@@ -1,11 +1,82 @@
 from __future__ import annotations
 
+import json
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
 from .shell import BackupError, execute_shell_command
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Iterable, Sequence
+
+SWARM_TASK_LABEL = "com.docker.swarm.task.id"
+
+
+@dataclass(frozen=True)
+class ContainerInfo:
+    """What one inspect says about a running container.
+
+    Args:
+        name: the container name, without docker's leading slash.
+        image: the reference it was started from, ``.Config.Image``.
+        image_id: the image ID, identical for every replica of one image.
+        swarm_task: the swarm task ID, empty for a container swarm does not
+            manage.
+        mounts: per mounted named volume, the path it is mounted at.
+    """
+
+    name: str
+    image: str
+    image_id: str
+    swarm_task: str = ""
+    mounts: dict = field(default_factory=dict)
+
+
+def container_info(data: dict) -> ContainerInfo:
+    """Read the fields baudolo uses out of one ``docker inspect`` document."""
+    config = data.get("Config") or {}
+    return ContainerInfo(
+        name=(data.get("Name") or "").lstrip("/"),
+        image=config.get("Image") or "",
+        image_id=data.get("Image") or "",
+        swarm_task=(config.get("Labels") or {}).get(SWARM_TASK_LABEL) or "",
+        mounts={
+            mount["Name"]: mount.get("Destination") or ""
+            for mount in data.get("Mounts") or []
+            if mount.get("Type") == "volume" and mount.get("Name")
+        },
+    )
+
+
+# Everything the run learned about a container, from the inventory or from a
+# single inspect on first use. None marks one that vanished before it could be
+# inspected.
+_KNOWN: dict[str, ContainerInfo | None] = {}
+
+# Per docker subcommand, how often this process asked the daemon.
+DAEMON_CALLS: Counter[str] = Counter()
+_CALLS_LOCK = threading.Lock()
+
+
+def run_docker(argv: Sequence[str]) -> list[str]:
+    """Run a ``docker ...`` argv, counted in :data:`DAEMON_CALLS`."""
+    with _CALLS_LOCK:
+        DAEMON_CALLS[argv[1]] += 1
+    return execute_shell_command(argv)
+
+
+def daemon_calls(subcommand: str | None = None) -> int:
+    """How often the daemon was asked, in total or for one subcommand."""
+    if subcommand is None:
+        return sum(DAEMON_CALLS.values())
+    return DAEMON_CALLS[subcommand]
+
+
+def remember(infos: Iterable[ContainerInfo]) -> None:
+    """Answer later questions about these containers from memory."""
+    _KNOWN.update((info.name, info) for info in infos)
 
 
 def docker_exec_argv(
@@ -40,17 +111,37 @@ def docker_exec_argv(
     ]
 
 
+def container_metadata(container: str) -> ContainerInfo | None:
+    """Everything baudolo asks about a container, inspected at most once.
+
+    The first question costs one inspect that fetches every field; every later
+    one - image, image ID, swarm label, mounts - is served from memory for the
+    rest of the run. A container the inventory already covered costs nothing.
+
+    Returns:
+        The container's metadata, or None when it vanished between listing
+        and inspect. One that still exists re-raises the inspect failure.
+    """
+    if container not in _KNOWN:
+        found = _inspect_unless_vanished(container)
+        _KNOWN[container] = found[0] if found else None
+    return _KNOWN[container]
+
+
+def _existing(container: str) -> ContainerInfo:
+    info = container_metadata(container)
+    if info is None:
+        raise BackupError(f"container '{container}' no longer exists")
+    return info
+
+
 def get_image_info(container: str) -> str:
-    return execute_shell_command(
-        ["docker", "inspect", "--format", "{{.Config.Image}}", container]
-    )[0]
+    return _existing(container).image
 
 
 def image_id(container: str) -> str:
     """The container's image ID, identical for every replica of one image."""
-    return execute_shell_command(
-        ["docker", "inspect", "--format", "{{.Image}}", container]
-    )[0].strip()
+    return _existing(container).image_id
 
 
 def has_tool(container: str, tool: str) -> bool:
@@ -61,27 +152,132 @@ def has_tool(container: str, tool: str) -> bool:
     tool it ships.
     """
     try:
-        execute_shell_command(docker_exec_argv(container, [tool, "--version"]))
+        run_docker(docker_exec_argv(container, [tool, "--version"]))
     except BackupError:
         return False
     return True
 
 
 def docker_volume_names() -> list[str]:
-    return execute_shell_command(["docker", "volume", "ls", "--format", "{{.Name}}"])
+    return run_docker(["docker", "volume", "ls", "--format", "{{.Name}}"])
+
+
+def image_layers(image: str) -> list[str] | None:
+    """The image's overlay2 layer directories, topmost first.
+
+    Returns:
+        ``UpperDir`` followed by every ``LowerDir`` entry, or None when the
+        image is not stored by overlay2 or the daemon does not say where.
+    """
+    try:
+        reported = run_docker(
+            ["docker", "image", "inspect", "--format", "{{json .GraphDriver}}", image]
+        )
+    except BackupError:
+        return None
+    try:
+        driver = json.loads(reported[0]) if reported else {}
+    except ValueError:
+        return None
+    if not isinstance(driver, dict) or driver.get("Name") != "overlay2":
+        return None
+    data = driver.get("Data") or {}
+    layers = [data.get("UpperDir") or "", *(data.get("LowerDir") or "").split(":")]
+    return [layer for layer in layers if layer] or None
 
 
-def containers_using_volume(volume_name: str) -> list[str]:
-    return execute_shell_command(
+def image_path(image: str) -> list[str] | None:
+    """The directories the image's ``PATH`` lists, which ``docker exec`` searches.
+
+    Returns:
+        The entries of the PATH in ``.Config.Env``, an empty list when the
+        image sets none and docker's default applies, or None when the image
+        cannot be inspected.
+    """
+    try:
+        reported = run_docker(
+            ["docker", "image", "inspect", "--format", "{{json .Config.Env}}", image]
+        )
+    except BackupError:
+        return None
+    try:
+        env = json.loads(reported[0]) if reported else None
+    except ValueError:
+        return None
+    if env is None:
+        return []
+    if not isinstance(env, list):
+        return None
+    for entry in env:
+        if isinstance(entry, str) and entry.startswith("PATH="):
+            return [part for part in entry[len("PATH=") :].split(":") if part]
+    return []
+
+
+def local_image_ids() -> set[str]:
+    """The full ID of every image the daemon still holds."""
+    return {
+        line.strip()
+        for line in run_docker(["docker", "image", "ls", "-q", "--no-trunc"])
+        if line.strip()
+    }
+
+
+def running_containers() -> list[str]:
+    return [
+        name
+        for name in run_docker(["docker", "ps", "--format", "{{.Names}}"])
+        if name.strip()
+    ]
+
+
+def _still_listed(container: str) -> bool:
+    listed = run_docker(
         [
             "docker",
             "ps",
+            "-a",
             "--filter",
-            f"volume={volume_name}",
+            f"name=^{container}$",
             "--format",
             "{{.Names}}",
         ]
     )
+    return bool(listed and listed[0].strip())
+
+
+def _inspect(containers: Sequence[str]) -> list[ContainerInfo]:
+    out = run_docker(["docker", "inspect", "--format", "{{json .}}", *containers])
+    return [container_info(json.loads(line)) for line in out if line.strip()]
+
+
+def _inspect_unless_vanished(container: str) -> list[ContainerInfo]:
+    try:
+        return _inspect([container])
+    except BackupError:
+        if _still_listed(container):
+            raise
+        return []
+
+
+def inspect_containers(containers: Sequence[str]) -> list[ContainerInfo]:
+    """Inspect every container in one daemon call.
+
+    A container can vanish between listing and inspect (--rm one-shots,
+    task-history GC), which fails the whole call. The containers are then
+    inspected one by one and the vanished ones dropped: a container that no
+    longer exists mounts nothing. One that still exists re-raises, as in
+    ``is_swarm_task``.
+
+    Returns:
+        The containers in the order given, vanished ones left out.
+    """
+    if not containers:
+        return []
+    try:
+        return _inspect(containers)
+    except BackupError:
+        return [info for c in containers for info in _inspect_unless_vanished(c)]
 
 
 def is_swarm_task(container: str) -> bool:
@@ -92,32 +288,8 @@ def is_swarm_task(container: str) -> bool:
     counts as not stoppable instead of aborting the whole backup run; if the
     container still exists the inspect failure re-raises, so a broken daemon
     keeps failing the run loudly instead of silently skipping the stop."""
-    try:
-        out = execute_shell_command(
-            [
-                "docker",
-                "inspect",
-                "--format",
-                '{{index .Config.Labels "com.docker.swarm.task.id"}}',
-                container,
-            ]
-        )
-    except BackupError:
-        still_listed = execute_shell_command(
-            [
-                "docker",
-                "ps",
-                "-a",
-                "--filter",
-                f"name=^{container}$",
-                "--format",
-                "{{.Names}}",
-            ]
-        )
-        if still_listed and still_listed[0].strip():
-            raise
-        return True
-    return bool(out and out[0].strip())
+    info = container_metadata(container)
+    return info is None or bool(info.swarm_task)
 
 
 def filter_stoppable(containers: list[str]) -> list[str]:
@@ -135,9 +307,9 @@ def filter_stoppable(containers: list[str]) -> list[str]:
 
 
 def change_containers_status(containers: list[str], status: str) -> None:
-    """Stop or start a list of containers."""
+    """Stop, start, pause or unpause a list of containers."""
     if not containers:
         print(f"No containers to {status}.", flush=True)
         return
     print(f"{status.capitalize()} containers: {' '.join(containers)}...", flush=True)
-    execute_shell_command(["docker", status, *containers])
+    run_docker(["docker", status, *containers])
@@ -2,16 +2,38 @@
 
 from __future__ import annotations
 
+import json
+import os
 import sys
-from typing import NamedTuple
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
 
 import pandas as pd
 from pandas.errors import EmptyDataError
 
+from baudolo.chunks import collect_garbage
 from baudolo.databases import COLUMNS, DELIMITER
+from baudolo.generation import DIRECTORY_SUFFIX, MANIFEST_FILE
 
-from .db import backup_database, get_instance
-from .docker import has_tool, image_id
+from .db import Previous, backup_database, get_instance
+from .docker import (
+    container_metadata,
+    has_tool,
+    image_id,
+    image_layers,
+    image_path,
+    local_image_ids,
+)
+from .layers import tools_in_layers
+from .schedule import run_pool
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from .db import DumpOptions, DumpRecord
+    from .schedule import DumpLimits
+    from .volume import Precopy
 
 DUMP_TOOLS: tuple[tuple[str, str], ...] = (
     ("postgres", "pg_dumpall"),
@@ -20,6 +42,21 @@ DUMP_TOOLS: tuple[tuple[str, str], ...] = (
 )
 
 _ENGINE_BY_IMAGE: dict[str, tuple[str, str] | None] = {}
+# Images whose "no engine" only the exec probe established. A transient
+# failure - a restarting container, a daemon hiccup - answers the same, so
+# the verdict holds for this run but is never saved.
+_PROBED_ABSENT: set[str] = set()
+
+ENGINE_CACHE_FILE = "engines.json"
+ENGINE_CACHE_SCHEMA = 1
+
+# Where the engines keep their data inside a container; the volume mounted
+# there owns the instance's dumps.
+DATA_DIRS = ("/var/lib/postgresql", "/var/lib/mysql")
+
+# (instance, dump file name) -> the volume whose sql/ holds it in this run.
+_DUMPED_IN: dict[tuple[str, str], str] = {}
+_DUMPED_LOCK = threading.Lock()
 
 
 class VolumeOutcome(NamedTuple):
@@ -27,26 +64,35 @@ class VolumeOutcome(NamedTuple):
 
     ``database`` says a container serving the volume speaks an engine this
     tool can dump; ``dumped`` says a dump was actually written. ``engine`` is
-    the engine that was detected, or None when none was.
+    the engine that was detected, or None when none was. ``precopy`` is set
+    once the volume's files were copied live ahead of a stop window.
+    ``refs`` maps the dump file names the volume's databases produced, but
+    another volume holds, to that volume. ``formats`` maps the volume's dumps
+    that are not a plain SQL stream to their format. ``dumps`` maps the dump
+    files written or linked while the volume was processed to their record.
     """
 
     database: bool
     dumped: bool
     engine: str | None = None
+    precopy: Precopy | None = None
+    refs: dict[str, str] | None = None
+    formats: dict[str, str] | None = None
+    dumps: dict[str, DumpRecord] | None = None
 
 
 def container_engine(container: str) -> tuple[str, str] | None:
     """The (engine, dump tool) a container can serve, or None for neither.
 
-    Asks the container what it can run instead of reading its image name. A
+    Asks what the container's image ships instead of reading its name. A
     dedicated Postgres is tagged `<app>-database` or `postgis/postgis` and
     carries no engine token at all, while a swarm registry host such as
     `svc-db-mariadb-swarm-mgr-01:5000` carries the wrong one.
 
     Args:
-        container: must be running - `docker exec` is the probe, and a
-            stopped container would be cached as "no engine" for its whole
-            image. The only caller feeds it `docker ps` output.
+        container: must be running - `docker exec` is the fallback probe,
+            and a stopped container would be cached as "no engine" for its
+            whole image. The only caller feeds it `docker ps` output.
 
     Returns:
         The engine and the tool that dumps it, cached per image ID so that
@@ -54,40 +100,233 @@ def container_engine(container: str) -> tuple[str, str] | None:
     """
     image = image_id(container)
     if image not in _ENGINE_BY_IMAGE:
-        _ENGINE_BY_IMAGE[image] = next(
-            (
-                (engine, tool)
-                for engine, tool in DUMP_TOOLS
-                if has_tool(container, tool)
-            ),
-            None,
-        )
+        _ENGINE_BY_IMAGE[image] = detect_engine(container, image)
     return _ENGINE_BY_IMAGE[image]
 
 
+def detect_engine(container: str, image: str) -> tuple[str, str] | None:
+    """Look for the dump tools in the image's layers, or run them if unreadable.
+
+    Reading the layers spawns nothing inside the database container. They are
+    searched along the image's own PATH, so a client installed elsewhere -
+    bitnami's ``/opt/bitnami/*/bin`` - is found like one in ``/usr/bin``. The
+    exec probe stays as the fallback for every image the host does not store
+    as readable overlay2 directories, or whose PATH cannot be read: a layer
+    scan along a guessed PATH cannot rule a tool out.
+    """
+    layers = image_layers(image)
+    shipped = None
+    if layers is not None:
+        path = image_path(image)
+        if path is not None:
+            shipped = tools_in_layers(layers, [tool for _, tool in DUMP_TOOLS], path)
+    found = next(
+        (
+            (engine, tool)
+            for engine, tool in DUMP_TOOLS
+            if (tool in shipped if shipped is not None else has_tool(container, tool))
+        ),
+        None,
+    )
+    if found is None and shipped is None:
+        _PROBED_ABSENT.add(image)
+    return found
+
+
+def load_engine_cache(path: str) -> None:
+    """Seed the per-image probe results with what earlier runs found.
+
+    An image ID names immutable content, so what a probe found for it stays
+    true for as long as the image exists: an unchanged image is never probed
+    again, and no ``docker exec`` reaches its production containers.
+
+    A missing file is a first run. An unreadable one is reported and ignored,
+    since the worst a lost cache costs is the probes it would have saved.
+    """
+    try:
+        with Path(path).open(encoding="utf-8") as handle:
+            document = json.load(handle)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as error:
+        print(
+            f"WARNING: engine cache {path} is unreadable ({error}); probing afresh.",
+            file=sys.stderr,
+            flush=True,
+        )
+        return
+    if not isinstance(document, dict) or document.get("schema") != ENGINE_CACHE_SCHEMA:
+        return
+    for image, found in (document.get("images") or {}).items():
+        engine = tuple(found) if found else None
+        # A pair this version cannot dump with is probed again rather than trusted.
+        if engine is None or engine in DUMP_TOOLS:
+            _ENGINE_BY_IMAGE.setdefault(image, engine)
+
+
+def save_engine_cache(path: str, present: Iterable[str] | None = None) -> None:
+    """Persist the probe results of every image the daemon still holds.
+
+    A "no engine" only the exec probe found is left out: it may stand for a
+    failed exec, and saving it would turn the image's dumps off for good.
+    The next run probes that image again.
+
+    Args:
+        path: the cache file, replaced atomically.
+        present: the image IDs that still exist; asked of the daemon when
+            omitted. Everything else is evicted, so the file cannot grow
+            with every image a host has ever pulled.
+    """
+    keep = local_image_ids() if present is None else set(present)
+    document = {
+        "schema": ENGINE_CACHE_SCHEMA,
+        "images": {
+            image: list(engine) if engine else None
+            for image, engine in sorted(_ENGINE_BY_IMAGE.items())
+            if image in keep and not (engine is None and image in _PROBED_ABSENT)
+        },
+    }
+    target = Path(path)
+    tmp = Path(f"{path}.tmp")
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with tmp.open("w", encoding="utf-8") as handle:
+            json.dump(document, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        tmp.replace(target)
+    except OSError as error:
+        print(
+            f"WARNING: engine cache {path} could not be written: {error}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def _manifest_of(generation: Path) -> dict | None:
+    try:
+        document = json.loads((generation / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return document if isinstance(document, dict) else None
+
+
+def previous_dumps(versions_dir: str, version_dir: str) -> Previous | None:
+    """The dumps of the newest generation before *version_dir* that finished.
+
+    A run writes its manifest last, so a generation without a readable one
+    was interrupted and is passed over.
+    """
+    if not Path(versions_dir).is_dir():
+        return None
+    for version in sorted(os.listdir(versions_dir), reverse=True):
+        generation = Path(versions_dir) / version
+        if str(generation) == version_dir:
+            continue
+        document = _manifest_of(generation)
+        if document is not None:
+            return Previous(str(generation), document.get("dumps") or {})
+    return None
+
+
+def collect_chunks(versions_dir: str) -> None:
+    """Remove the pool's chunks that no generation's recipe lists any more.
+
+    Run once the generation is stamped. A failure is reported and leaves the
+    pool as it is: it only costs space until the next run collects.
+    """
+    try:
+        removed, freed = collect_garbage(versions_dir)
+    except OSError as error:
+        print(
+            f"Warning: chunk collection skipped ({error}).", file=sys.stderr, flush=True
+        )
+        return
+    if removed:
+        print(f"Removed {removed} unreferenced chunk(s), {freed} bytes.", flush=True)
+
+
+def data_volume(container: str) -> str | None:
+    """The volume a container keeps its engine data in, if one is mounted."""
+    info = container_metadata(container)
+    if info is None:
+        return None
+    for volume, destination in info.mounts.items():
+        if any(
+            destination == data_dir or destination.startswith(f"{data_dir}/")
+            for data_dir in DATA_DIRS
+        ):
+            return volume
+    return None
+
+
+def claim_dump(instance: str, file_name: str, volume: str) -> str | None:
+    """Record that *volume* holds a dump unless the run already has it.
+
+    Returns:
+        None when the caller is the first to claim the dump and must take it;
+        otherwise the volume an earlier claim put it in.
+    """
+    with _DUMPED_LOCK:
+        held = _DUMPED_IN.get((instance, file_name))
+        if held is None:
+            _DUMPED_IN[(instance, file_name)] = volume
+        return held
+
+
 def backup_mariadb_or_postgres(
     *,
     container: str,
     volume_dir: str,
     databases_df: pd.DataFrame,
     database_containers: list[str],
+    limits: DumpLimits | None = None,
+    options: DumpOptions | None = None,
 ) -> VolumeOutcome:
-    """What this container contributes to its volume's outcome."""
+    """What this container contributes to its volume's outcome.
+
+    Each (instance, database) is dumped once per run, whichever of the
+    instance's volumes or replicas comes first. The dump goes to the volume
+    the container keeps its data in - a sibling of *volume_dir* when that is
+    another one - and every other volume records a reference to it.
+    """
     engine = container_engine(container)
     if engine is None:
         return VolumeOutcome(database=False, dumped=False)
     if get_instance(container, database_containers) is None:
         return VolumeOutcome(database=False, dumped=False)
     db_type, dump_tool = engine
+    volume = Path(volume_dir).name
+    owner = data_volume(container) or volume
+    held_in: dict[str, str] = {}
+    records: dict[str, DumpRecord] = {}
+
+    def claim(instance: str, file_name: str) -> bool:
+        held = claim_dump(instance, file_name, owner)
+        held_in[file_name] = held or owner
+        return held is None
+
     dumped = backup_database(
         container=container,
-        volume_dir=volume_dir,
+        volume_dir=str(Path(volume_dir).parent / owner),
         db_type=db_type,
         dump_tool=dump_tool,
         databases_df=databases_df,
         database_containers=database_containers,
+        claim=claim,
+        record=records.__setitem__,
+        limits=limits,
+        options=options,
+    )
+    refs = {name: held for name, held in held_in.items() if held != volume}
+    formats = {name: "directory" for name in held_in if name.endswith(DIRECTORY_SUFFIX)}
+    return VolumeOutcome(
+        database=True,
+        dumped=dumped,
+        engine=db_type,
+        refs=refs or None,
+        formats=formats or None,
+        dumps=records or None,
     )
-    return VolumeOutcome(database=True, dumped=dumped, engine=db_type)
 
 
 def _empty_databases_df() -> pd.DataFrame:
@@ -132,24 +371,51 @@ def backup_dumps_for_volume(
     vol_dir: str,
     databases_df: pd.DataFrame,
     database_containers: list[str],
+    limits: DumpLimits | None = None,
+    options: DumpOptions | None = None,
 ) -> VolumeOutcome:
-    """The volume's outcome across every container that mounts it."""
+    """The volume's outcome across every container that mounts it.
+
+    Args:
+        limits: the run's dump slots. With a total, the containers are dumped
+            side by side; without, one after the other.
+        options: how the dumps are written.
+    """
     found_db = False
     dumped_any = False
     engine: str | None = None
+    refs: dict[str, str] = {}
+    formats: dict[str, str] = {}
+    records: dict[str, DumpRecord] = {}
 
-    for c in containers:
-        outcome = backup_mariadb_or_postgres(
+    outcomes = run_pool(
+        limits.total if limits is not None and limits.total else 1,
+        containers,
+        lambda c: backup_mariadb_or_postgres(
             container=c,
             volume_dir=vol_dir,
             databases_df=databases_df,
             database_containers=database_containers,
-        )
+            limits=limits,
+            options=options,
+        ),
+    )
+    for outcome in outcomes:
         if outcome.database:
             found_db = True
         if outcome.dumped:
             dumped_any = True
         if engine is None:
             engine = outcome.engine
+        refs.update(outcome.refs or {})
+        formats.update(outcome.formats or {})
+        records.update(outcome.dumps or {})
 
-    return VolumeOutcome(database=found_db, dumped=dumped_any, engine=engine)
+    return VolumeOutcome(
+        database=found_db,
+        dumped=dumped_any,
+        engine=engine,
+        refs=refs or None,
+        formats=formats or None,
+        dumps=records or None,
+    )
@@ -0,0 +1,173 @@
+"""Generations as writable snapshots of the one before, instead of link trees.
+
+With ``--link-dest`` every run re-creates every directory of every volume and
+hard-links every unchanged file into it: metadata work and inode churn in
+proportion to the file count, each night, and as much again to delete a
+generation. On a repository that is a btrfs subvolume or a zfs dataset, a
+generation can instead start as a writable snapshot (btrfs) or clone (zfs)
+of the last finished one, created in constant time, into which the copy only
+writes what changed: rsync updates files ``--inplace`` and block by block,
+and the native engine keeps what its quick check finds unchanged. Deleting a
+generation is then one ``btrfs subvolume delete`` or ``zfs destroy``.
+
+The snapshot carries the whole previous generation, so before anything is
+copied it is cleared of what belongs to that run alone: the manifest, the
+stamp and every dump directory go, and each volume's file tree is set aside
+under ``CARRIED_DIR``. A volume's tree moves back into place when its copy
+starts (``adopt_carried``); what no copy claimed - a volume that is gone, or
+skipped this time - is discarded before the manifest is written, so a
+generation never holds files its run did not copy.
+
+A repository of plain directories - the first run, or one switching over -
+starts with an empty subvolume or dataset and a full copy. Each zfs clone is
+promoted right away, so the older generation depends on the newer one's
+snapshot rather than the other way round, and the oldest generation is
+always destroyable on its own.
+"""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from baudolo.generation import FILES_DIR
+
+from .dumps import previous_dumps
+from .shell import BackupError, execute_shell_command
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+STORES = ("links", "btrfs", "zfs")
+# Inside a generation being written: the volumes' trees the snapshot carried.
+CARRIED_DIR = ".carried"
+
+
+def _succeeds(run: Callable[[list[str]], list[str]], command: list[str]) -> bool:
+    try:
+        run(command)
+    except BackupError:
+        return False
+    return True
+
+
+def _btrfs(
+    versions_dir: str,
+    previous: str | None,
+    target: str,
+    run: Callable[[list[str]], list[str]],
+) -> bool:
+    if previous is not None and _succeeds(
+        run, ["btrfs", "subvolume", "show", previous]
+    ):
+        run(["btrfs", "subvolume", "snapshot", previous, target])
+        return True
+    run(["btrfs", "subvolume", "create", target])
+    return False
+
+
+def _dataset(path: str, run: Callable[[list[str]], list[str]]) -> str | None:
+    """The zfs dataset mounted exactly at *path*, if any."""
+    try:
+        output = run(["zfs", "list", "-H", "-o", "name,mountpoint", path])
+    except BackupError:
+        return None
+    name, _, mountpoint = (output[0] if output else "").strip().partition("\t")
+    return name if name and mountpoint == str(Path(path)) else None
+
+
+def _zfs(
+    versions_dir: str,
+    previous: str | None,
+    target: str,
+    run: Callable[[list[str]], list[str]],
+) -> bool:
+    parent = _dataset(versions_dir, run)
+    if parent is None:
+        raise BackupError(f"no zfs dataset is mounted at {versions_dir}")
+    name = Path(target).name
+    origin = None if previous is None else _dataset(previous, run)
+    if origin is None:
+        run(["zfs", "create", f"{parent}/{name}"])
+        return False
+    run(["zfs", "snapshot", f"{origin}@{name}"])
+    run(["zfs", "clone", f"{origin}@{name}", f"{parent}/{name}"])
+    run(["zfs", "promote", f"{parent}/{name}"])
+    return True
+
+
+_CREATE = {"btrfs": _btrfs, "zfs": _zfs}
+
+
+def _set_aside(generation: Path) -> None:
+    """Clear a snapshot of what its run alone wrote, keeping the file trees."""
+    carried = generation / CARRIED_DIR
+    entries = [entry for entry in generation.iterdir() if entry.name[0] != "."]
+    carried.mkdir()
+    for entry in entries:
+        if not entry.is_dir() or entry.is_symlink():
+            entry.unlink()
+            continue
+        files = entry / FILES_DIR
+        if files.is_dir():
+            files.rename(carried / entry.name)
+        shutil.rmtree(entry)
+
+
+def create_snapshot_generation(
+    versions_dir: str,
+    backup_time: str,
+    store: str,
+    run: Callable[[list[str]], list[str]] = execute_shell_command,
+) -> str:
+    """Create the generation *backup_time* as a snapshot of the last one.
+
+    Args:
+        store: ``btrfs`` or ``zfs``; the caller states it, nothing is probed.
+        run: shell runner, injected so the mechanics are testable.
+
+    Returns:
+        The generation directory, holding the carried file trees only.
+
+    Raises:
+        BackupError: the generation exists already, *versions_dir* is no
+            subvolume or dataset, or the snapshot cannot be created.
+    """
+    create = _CREATE.get(store)
+    if create is None:
+        raise BackupError(
+            f"unknown generation store {store!r}; expected one of {STORES}"
+        )
+    target = str(Path(versions_dir) / backup_time)
+    if Path(target).exists():
+        raise BackupError(
+            f"generation {backup_time} already exists at {target}; "
+            "another run claimed this second - refusing to write into it"
+        )
+    Path(versions_dir).mkdir(parents=True, exist_ok=True)
+    previous = previous_dumps(versions_dir, target)
+    seeded = create(
+        versions_dir, None if previous is None else previous.generation, target, run
+    )
+    if not Path(target).is_dir():
+        raise BackupError(f"the new {store} generation is not mounted at {target}")
+    if seeded:
+        _set_aside(Path(target))
+    return target
+
+
+def adopt_carried(volume_dir: str) -> None:
+    """Move a volume's carried tree back into place before its copy."""
+    carried = Path(volume_dir).parent / CARRIED_DIR / Path(volume_dir).name
+    files = Path(volume_dir) / FILES_DIR
+    if carried.is_dir() and not files.exists():
+        Path(volume_dir).mkdir(parents=True, exist_ok=True)
+        carried.rename(files)
+
+
+def discard_carried(version_dir: str) -> None:
+    """Delete the carried trees no copy claimed."""
+    carried = Path(version_dir) / CARRIED_DIR
+    if carried.is_dir():
+        shutil.rmtree(carried)
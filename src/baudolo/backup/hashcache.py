@@ -0,0 +1,174 @@
+"""Content digests of files that outlive the run that computed them.
+
+A pass of the native copy engine that compares by content reads every file
+of the volume and its twin in the last generation, run after run, though
+most of both sides were not written since; a dump that does not change is
+hard-linked from one generation into the next and compared again each
+time. The cache remembers each file's digest under what stat says about
+it - device, inode, size, mtime_ns and ctime_ns - so an untouched file is
+read once, not once per run. Any write moves ctime, which no process can set
+back, and the entry no longer matches.
+
+It lives in the repository directory, beside the generations, as one SQLite
+file, opened the first time a digest is asked for. ``prune`` keeps it
+bounded: entries whose file is gone or has changed
+since are dropped, then the least recently used beyond ``CACHE_LIMIT``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import os
+
+HASH_CACHE_FILE = ".hashes.sqlite"
+# A digest per volume file and per twin; ~200 bytes each on disk.
+CACHE_LIMIT = 1_000_000
+_READ_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    algorithm TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    path TEXT NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (device, inode, size, mtime_ns, ctime_ns, algorithm)
+)
+"""
+
+
+def _key(info: os.stat_result) -> tuple[int, int, int, int, int]:
+    return (info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns, info.st_ctime_ns)
+
+
+def _hash_file(path: Path, algorithm: str) -> str:
+    hasher = hashlib.new(algorithm)
+    with path.open("rb") as handle:
+        while chunk := handle.read(_READ_CHUNK):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _stale(path: str, key: tuple[int, int, int, int, int]) -> bool:
+    """Whether *path* is gone or no longer the file state *key* describes."""
+    try:
+        info = Path(path).stat()
+    except OSError:
+        return True
+    return _key(info) != key
+
+
+class HashCache:
+    """The repository's digest cache, safe to share between dump threads.
+
+    Args:
+        path: the SQLite file, created on first use.
+        limit: entries ``prune`` keeps at most.
+    """
+
+    def __init__(self, path: str, *, limit: int = CACHE_LIMIT) -> None:
+        self._path = path
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        """The connection, opened on first use; call with the lock held."""
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self._path, timeout=30, check_same_thread=False
+            )
+            # A lost write only costs a read: no fsync per cached digest.
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            with self._connection:
+                self._connection.execute(_SCHEMA)
+        return self._connection
+
+    def digest(self, path: str, algorithm: str = "sha256") -> str:
+        """The hex digest of *path*'s content, read only if not cached."""
+        key = _key(Path(path).stat())
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest FROM digests WHERE device = ? AND inode = ? "
+                "AND size = ? AND mtime_ns = ? AND ctime_ns = ? AND algorithm = ?",
+                (*key, algorithm),
+            ).fetchone()
+            if row is not None:
+                with self._db:
+                    self._db.execute(
+                        "UPDATE digests SET used = ?, path = ? WHERE device = ? "
+                        "AND inode = ? AND size = ? AND mtime_ns = ? "
+                        "AND ctime_ns = ? AND algorithm = ?",
+                        (time.time_ns(), str(path), *key, algorithm),
+                    )
+                return row[0]
+        digest = _hash_file(Path(path), algorithm)
+        # Written while it was read: the digest may not match any one state.
+        if _key(Path(path).stat()) != key:
+            return digest
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, algorithm, digest, str(path), time.time_ns()),
+            )
+        return digest
+
+    def remember(self, path: str, digest: str, algorithm: str = "sha256") -> None:
+        """Record *digest* for *path* as it is now, without reading it.
+
+        For a file this run just hard-linked from one whose digest it knows:
+        the link moved ctime, and the next run would read it again.
+        """
+        key = _key(Path(path).stat())
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, algorithm, digest, str(path), time.time_ns()),
+            )
+
+    def prune(self) -> int:
+        """Drop the entries of vanished files, then the least recently used.
+
+        A file hard-linked into several generations is kept under the path it
+        was last asked for by, so it survives until its last link is gone.
+
+        Returns:
+            How many entries were dropped; none if there is no cache yet.
+        """
+        if self._connection is None and not Path(self._path).exists():
+            return 0
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT rowid, path, device, inode, size, mtime_ns, ctime_ns "
+                "FROM digests"
+            ).fetchall()
+            gone = [(row[0],) for row in rows if _stale(row[1], tuple(row[2:]))]
+            with self._db:
+                self._db.executemany("DELETE FROM digests WHERE rowid = ?", gone)
+                dropped = (
+                    len(gone)
+                    + self._db.execute(
+                        "DELETE FROM digests WHERE rowid IN (SELECT rowid FROM digests "
+                        "ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                        (self._limit,),
+                    ).rowcount
+                )
+        return dropped
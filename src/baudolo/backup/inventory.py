@@ -0,0 +1,61 @@
+"""Which running containers mount which volume, learned once per run.
+
+Asking the daemon per volume (``docker ps --filter volume=...``) costs one
+round-trip for every volume on the host, and a busy daemon answers each in
+100-300 ms. The run instead lists its running containers once and inspects
+them all in a single call; everything later - which containers use a volume,
+their image, whether swarm manages them - is read from that.
+
+The inventory is a snapshot of the moment the run starts. A container started
+later is not stopped for a copy, exactly as one started after its volume's
+``docker ps`` was not.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from .docker import inspect_containers, remember, running_containers
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from .docker import ContainerInfo
+
+
+@dataclass(frozen=True)
+class Inventory:
+    """The running containers, indexed by the volumes they mount.
+
+    Args:
+        containers: per container name, what its inspect said, in the order
+            ``docker ps`` listed them.
+        by_volume: per volume name, the names of the containers mounting it.
+    """
+
+    containers: dict
+    by_volume: dict
+
+    @classmethod
+    def of(cls, infos: Iterable[ContainerInfo]) -> Inventory:
+        containers = {info.name: info for info in infos}
+        by_volume: dict[str, list[str]] = {}
+        for info in containers.values():
+            for volume in info.mounts:
+                by_volume.setdefault(volume, []).append(info.name)
+        return cls(containers, by_volume)
+
+    def containers_using(self, volume_name: str) -> list[str]:
+        return list(self.by_volume.get(volume_name, []))
+
+
+def take_inventory() -> Inventory:
+    """List and inspect the running containers, two daemon calls in total.
+
+    What it learns also answers ``docker.get_image_info``, ``image_id`` and
+    ``is_swarm_task`` for the rest of the run.
+    """
+    infos = inspect_containers(running_containers())
+    remember(infos)
+    return Inventory.of(infos)
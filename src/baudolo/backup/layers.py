@@ -0,0 +1,109 @@
+"""Find a binary in an image's filesystem layers without running anything.
+
+``has_tool`` learns what a container ships by executing each candidate inside
+it, which spawns a process in a production database during the backup window.
+An overlay2 image already lies unpacked on the host, one directory per layer,
+so the same question can be answered by looking: walk the layers from the top
+down, through the directories the image's PATH searches - docker's default
+when it sets none - the way the overlay mount itself resolves a name.
+
+Whatever cannot be read this way - another storage driver, a containerised
+baudolo without the daemon's data root mounted - yields None, and the caller
+falls back to the exec probe.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+PATH_DIRS = ("usr/local/sbin", "usr/local/bin", "usr/sbin", "usr/bin", "sbin", "bin")
+_OPAQUE_XATTRS = ("trusted.overlay.opaque", "user.overlay.opaque")
+
+
+def _is_whiteout(info: os.stat_result) -> bool:
+    """overlay2 marks a deletion with a 0:0 character device."""
+    return stat.S_ISCHR(info.st_mode) and info.st_rdev == 0
+
+
+def _xattr(path: Path, name: str) -> bytes | None:
+    try:
+        return os.getxattr(path, name)
+    except (OSError, AttributeError):
+        return None
+
+
+def _is_opaque(directory: Path) -> bool:
+    """An opaque directory hides everything lower layers put at its path."""
+    return any(_xattr(directory, name) == b"y" for name in _OPAQUE_XATTRS)
+
+
+def _layer_answer(layer: Path, relative: str, tool: str) -> bool | None:
+    """What one layer says about ``relative/tool``: there, deleted, or silent.
+
+    Silent (None) means a lower layer decides. A merged-usr layer ships
+    ``bin`` as a link to ``usr/bin``, and an absolute link would be followed
+    into the host's own ``/usr/bin``; the target is searched under its own
+    name anyway, so a linked directory leaves the layer silent.
+    """
+    current = layer
+    opaque = False
+    parts = relative.split("/")
+    for index, part in enumerate([*parts, tool]):
+        current = current / part
+        try:
+            info = current.lstat()
+        except FileNotFoundError:
+            return False if opaque else None
+        if _is_whiteout(info):
+            return False
+        if index == len(parts):
+            if stat.S_ISLNK(info.st_mode):
+                return True
+            return stat.S_ISREG(info.st_mode) and bool(info.st_mode & 0o111)
+        if stat.S_ISLNK(info.st_mode):
+            return None
+        if not stat.S_ISDIR(info.st_mode):
+            return False
+        opaque = opaque or _is_opaque(current)
+    return None
+
+
+def _in_path(layers: Sequence[Path], tool: str, search: Sequence[str]) -> bool:
+    for relative in search:
+        for layer in layers:
+            answer = _layer_answer(layer, relative, tool)
+            if answer is not None:
+                if answer:
+                    return True
+                break
+    return False
+
+
+def tools_in_layers(
+    layers: Sequence[str], tools: Iterable[str], path: Sequence[str] = ()
+) -> set[str] | None:
+    """Which of *tools* the image ships, read from its layer directories.
+
+    Args:
+        layers: the layer directories, topmost first - ``UpperDir`` followed
+            by ``LowerDir`` as ``docker image inspect`` reports them.
+        tools: the binary names to look for.
+        path: the image's PATH entries; empty for docker's default,
+            ``PATH_DIRS``. Relative entries are skipped.
+
+    Returns:
+        The tools found in a PATH directory, or None when any layer cannot be
+        read, since a missing layer could hide or supply any of them.
+    """
+    roots = [Path(layer) for layer in layers]
+    if not roots or not all(os.access(root, os.R_OK | os.X_OK) for root in roots):
+        return None
+    search = [entry.strip("/") for entry in path if entry.startswith("/")]
+    search = [entry for entry in search if entry] or list(PATH_DIRS)
+    return {tool for tool in tools if _in_path(roots, tool, search)}
@@ -42,7 +42,12 @@ def create_volume_directory(version_dir: str, volume_name: str) -> str:
     return str(path)
 
 
-def write_manifest(version_dir: str, volumes: dict[str, dict[str, bool]]) -> str:
+def write_manifest(
+    version_dir: str,
+    volumes: dict[str, dict[str, bool]],
+    compression: str = "none",
+    store: str = "files",
+) -> str:
     """Record the generation's layout and per-volume outcome.
 
     Written before the directory is stamped, so the stamp covers it.
@@ -50,12 +55,19 @@ def write_manifest(version_dir: str, volumes: dict[str, dict[str, bool]]) -> str
     Args:
         version_dir: the generation directory.
         volumes: per volume name, ``database`` and ``dumped``.
+        compression: the codec the dumps were written with.
+        store: whether the dumps are files or chunk recipes.
 
     Returns:
         The path written.
     """
     path = pathlib.Path(version_dir) / MANIFEST_FILE
     with path.open("w", encoding="utf-8") as handle:
-        json.dump(manifest_document(volumes), handle, indent=2, sort_keys=True)
+        json.dump(
+            manifest_document(volumes, compression, store),
+            handle,
+            indent=2,
+            sort_keys=True,
+        )
         handle.write("\n")
     return str(path)
@@ -36,3 +36,22 @@ def requires_stop(containers: list[str], images_no_stop_required: list[str]) ->
         if img not in images_no_stop_required:
             return True
     return False
+
+
+def pauses(
+    container: str,
+    freeze: str,
+    images_pause: list[str],
+    images_flush_required: list[str],
+) -> bool:
+    """
+    Whether a container is frozen with docker pause instead of stopped.
+    A paused process keeps whatever it has not written yet in memory, so
+    an image that needs a real flush is stopped whatever was asked for.
+    """
+    if freeze == "stop" and not images_pause:
+        return False
+    img = get_image_info(container)
+    if img in images_flush_required:
+        return False
+    return freeze == "pause" or img in images_pause
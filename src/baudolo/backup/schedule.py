@@ -0,0 +1,256 @@
+"""Running the volumes of one host side by side.
+
+Two volumes are only independent when no container mounts both. A shared
+container is stopped for one volume's authoritative pass, and the other volume
+would lose it in the middle of its own dump - ``docker exec`` into a stopped
+container fails - or have it started again under its own stopped copy. The
+unit handed to a worker is therefore a group of volumes connected through
+their containers, processed in order; only groups run concurrently.
+
+A worker's output is held back and printed as one block when its group ends,
+so the log of a parallel run still reads volume by volume.
+
+Database dumps are scheduled separately, through ``DumpLimits``: they load the
+database container rather than the host's disks, and how many may run against
+one container is a different question from how many volumes are copied.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import sys
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Mapping, Sequence
+    from concurrent.futures import Future
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def independent_groups(volumes: Mapping[str, Sequence[str]]) -> list[list[str]]:
+    """Partition volumes into groups that share no container.
+
+    Args:
+        volumes: per volume name, the containers that mount it, in the order
+            the volumes are to be backed up.
+
+    Returns:
+        The groups, each in that order, ordered by their first volume. A
+        volume no container mounts is a group of its own.
+    """
+    parent: dict[str, str] = {}
+
+    def root(node: str) -> str:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for name, containers in volumes.items():
+        parent.setdefault(f"v:{name}", f"v:{name}")
+        for container in containers:
+            parent.setdefault(f"c:{container}", f"c:{container}")
+            parent[root(f"c:{container}")] = root(f"v:{name}")
+
+    groups: dict[str, list[str]] = {}
+    for name in volumes:
+        groups.setdefault(root(f"v:{name}"), []).append(name)
+    return list(groups.values())
+
+
+class _Router(io.TextIOBase):
+    """A stdout that sends each worker thread's writes to its own buffer."""
+
+    def __init__(self, target) -> None:
+        super().__init__()
+        self.target = target
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            with self.lock:
+                return self.target.write(text)
+        return buffer.write(text)
+
+    def flush(self) -> None:
+        if getattr(self.local, "buffer", None) is None:
+            self.target.flush()
+
+    def captured(self, work: Callable[[T], R], item: T) -> tuple[R, str]:
+        """Run *work* with its output held, and hand that back with the result.
+
+        A failure prints what was held right away, since nobody collects it.
+        """
+        self.local.buffer = io.StringIO()
+        try:
+            result = work(item)
+        except BaseException:
+            block = self.local.buffer.getvalue()
+            self.local.buffer = None
+            with self.lock:
+                self.target.write(block)
+                self.target.flush()
+            raise
+        block = self.local.buffer.getvalue()
+        self.local.buffer = None
+        return result, block
+
+    def held(self, work: Callable[[T], R], item: T) -> R:
+        """Run *work* with its output held, then print that as one block."""
+        self.local.buffer = io.StringIO()
+        try:
+            return work(item)
+        finally:
+            block = self.local.buffer.getvalue()
+            self.local.buffer = None
+            with self.lock:
+                self.target.write(block)
+                self.target.flush()
+
+
+@contextlib.contextmanager
+def _routed() -> Iterator[_Router]:
+    if isinstance(sys.stdout, _Router):
+        # A pool inside a worker shares the router; its workers' blocks are
+        # printed as they end.
+        yield sys.stdout
+        return
+    router = _Router(sys.stdout)
+    sys.stdout = router
+    try:
+        yield router
+    finally:
+        sys.stdout = router.target
+
+
+def run_pool(jobs: int, items: Sequence[T], work: Callable[[T], R]) -> list[R]:
+    """Apply *work* to every item on at most *jobs* threads.
+
+    Args:
+        jobs: the worker count; 1 runs everything inline, output unchanged.
+        items: the units of work, e.g. the result of ``independent_groups``.
+        work: called once per item.
+
+    Returns:
+        The results in the order of *items*.
+
+    Raises:
+        Whatever the first failing item raised. Items not started by then are
+        cancelled; items already running finish first, so no worker is left
+        holding a container stopped.
+    """
+    if jobs <= 1 or len(items) <= 1:
+        return [work(item) for item in items]
+
+    with _routed() as router, ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(router.held, work, item) for item in items]
+        wait(futures, return_when=FIRST_EXCEPTION)
+        for future in futures:
+            future.cancel()
+    for future in futures:
+        if not future.cancelled() and future.exception() is not None:
+            raise future.exception()
+    return [future.result() for future in futures]
+
+
+class Lookahead(Generic[T, R]):
+    """Run *work* on the items after the one being taken, up to *depth* ahead.
+
+    ``take`` hands back an item's result, waiting for it when it is still
+    being computed, and starts the next *depth* items in the background. An
+    item's result is therefore always complete before its caller goes on,
+    while the upcoming ones are already under way. Each item's output is held
+    and printed by the thread that takes it, so the log keeps its order.
+
+    Use as a context manager; leaving it cancels what was never started and
+    waits for what is running.
+    """
+
+    def __init__(
+        self, items: Sequence[T], work: Callable[[T], R], depth: int = 0
+    ) -> None:
+        self.items = list(items)
+        self.work = work
+        self.depth = depth
+        self._index = {item: index for index, item in enumerate(self.items)}
+        self._futures: dict[T, Future[tuple[R, str]]] = {}
+        self._lock = threading.Lock()
+        self._stack: contextlib.ExitStack | None = None
+        self._pool: ThreadPoolExecutor | None = None
+        self._router: _Router | None = None
+
+    def __enter__(self) -> Lookahead[T, R]:
+        if self.depth > 0:
+            self._stack = contextlib.ExitStack()
+            self._router = self._stack.enter_context(_routed())
+            self._pool = ThreadPoolExecutor(max_workers=self.depth)
+            self._stack.callback(self._pool.shutdown, wait=True, cancel_futures=True)
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self._stack is not None:
+            self._stack.close()
+
+    def take(self, item: T) -> R:
+        """The result of *work* on *item*, once the items after it are started."""
+        if self._pool is None:
+            return self.work(item)
+        start = self._index[item]
+        with self._lock:
+            for upcoming in self.items[start : start + self.depth + 1]:
+                if upcoming not in self._futures:
+                    self._futures[upcoming] = self._pool.submit(
+                        self._router.captured, self.work, upcoming
+                    )
+            future = self._futures[item]
+        result, block = future.result()
+        sys.stdout.write(block)
+        sys.stdout.flush()
+        return result
+
+
+class DumpLimits:
+    """How many database dumps may run at once, in total and per container.
+
+    Shared by every worker of a run, so the total holds across volumes backed
+    up side by side. One run backs up one docker host, so the total is the
+    host's limit as well.
+
+    Args:
+        total: dumps running at once across the run; None for no limit beyond
+            the workers that ask.
+        per_container: dumps running at once against one container.
+    """
+
+    def __init__(self, total: int | None = None, per_container: int = 1) -> None:
+        self.total = total
+        self.per_container = per_container
+        self._total = threading.BoundedSemaphore(total) if total else None
+        self._containers: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def slot(self, container: str) -> Iterator[None]:
+        """Hold one dump slot against *container* and one of the total."""
+        with self._lock:
+            own = self._containers.setdefault(
+                container, threading.BoundedSemaphore(self.per_container)
+            )
+        # Always the container's slot first: a thread holding a total slot
+        # never waits for a container, so the two cannot deadlock.
+        with own:
+            if self._total is None:
+                yield
+                return
+            with self._total:
+                yield
@@ -7,19 +7,49 @@ string handed to ``shell=True`` allowed.
 
 from __future__ import annotations
 
+import contextlib
+import hashlib
 import os
+import re
+import shutil
 import subprocess
+import tempfile
+from collections import deque
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
+
+from baudolo.chunks import ChunkWriter
 
 if TYPE_CHECKING:
-    from collections.abc import Mapping, Sequence
+    from collections.abc import Callable, Mapping, Sequence
+    from io import BufferedReader
+    from typing import IO
+
+# Lines kept from a streamed command, for its result and for an error message.
+TAIL_LINES = 64
+# A line longer than this is cut, so output without line breaks stays bounded.
+MAX_LINE = 64 * 1024
+_CHUNK = 64 * 1024
+_COPY_CHUNK = 1024 * 1024
+# What a dump is hashed with while it is written; any name hashlib.new takes.
+DIGEST_ALGORITHM = "blake2b"
+# Progress meters redraw their line with a carriage return.
+_LINE_BREAK = re.compile(rb"\r\n?|\n")
 
 
 class BackupError(Exception):
     """Generic exception for backup errors."""
 
 
+class Digest(NamedTuple):
+    """What ``execute_to_file`` saw go by: a hash, the bytes and the lines."""
+
+    algorithm: str
+    hexdigest: str
+    bytes: int
+    lines: int
+
+
 def _child_env(env: Mapping[str, str] | None) -> dict[str, str] | None:
     return None if env is None else {**os.environ, **env}
 
@@ -54,22 +84,237 @@ def execute_shell_command(
 
 
 def execute_to_file(
-    command: Sequence[str], out_file: str, *, env: Mapping[str, str] | None = None
-) -> None:
+    command: Sequence[str],
+    out_file: str,
+    *,
+    env: Mapping[str, str] | None = None,
+    compress: Sequence[str] | None = None,
+    chunks: str | None = None,
+) -> Digest:
     """Run *command*, writing its stdout to *out_file* only once it succeeded.
 
     The output goes to a sibling temporary file first, so a partial or empty
-    stream from a failing dump never takes the place of a valid backup.
+    stream from a failing dump never takes the place of a valid backup. On
+    its way there it is hashed and counted, in the same pass that writes it.
+
+    Args:
+        compress: argv of a compressor reading stdin and writing stdout, which
+            the output streams through on its way to the file. A failure of
+            either process fails the whole.
+        chunks: a chunk pool. The output is cut into chunks stored there, and
+            *out_file* becomes the recipe listing them. Not combined with
+            *compress*: the pool compresses each chunk itself.
+
+    Returns:
+        The digest of the command's own output, before any compression: the
+        stream a restore feeds into the engine.
     """
     command = list(command)
     print(" ".join(command), flush=True)
     tmp = Path(f"{out_file}.tmp")
-    with tmp.open("wb") as handle:
+    try:
+        with tmp.open("wb") as handle:
+            sink = handle if chunks is None else ChunkWriter(chunks, handle)
+            digest = _digested(command, compress, sink, env)
+            if chunks is not None:
+                _closed(command, sink)
+    except BaseException:
+        # Whatever failed, the partial file must not stay on the backup disk.
+        tmp.unlink(missing_ok=True)
+        raise
+    tmp.replace(out_file)
+    return digest
+
+
+def _closed(command: list[str], sink: ChunkWriter) -> None:
+    """Store the chunk pool's last chunk, a write failure failing *command*."""
+    try:
+        sink.close()
+    except OSError as error:
+        _fail(command, 0, b"", f"cannot write the output: {error}".encode())
+
+
+def _digested(
+    command: list[str],
+    compress: Sequence[str] | None,
+    handle: IO[bytes] | ChunkWriter,
+    env: Mapping[str, str] | None,
+) -> Digest:
+    """Copy *command*'s stdout into *handle*, through *compress* if given."""
+    with (
+        tempfile.TemporaryFile() as command_err,
+        tempfile.TemporaryFile() as codec_err,
+    ):
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=command_err, env=_child_env(env)
+        )
+        codec = None
+        sink = handle
+        if compress is not None:
+            codec = subprocess.Popen(
+                list(compress), stdin=subprocess.PIPE, stdout=handle, stderr=codec_err
+            )
+            sink = codec.stdin
+        digest = None
+        try:
+            digest = _copy(process.stdout, sink)
+        except BrokenPipeError:
+            # The compressor is gone; its exit status below says why.
+            process.kill()
+        except BaseException as error:
+            # The sink failed - a full disk, a chunk store - or the run was
+            # interrupted: nothing will read the dump any further.
+            for child in (process, codec):
+                if child is not None:
+                    child.kill()
+                    child.wait()
+            if isinstance(error, OSError):
+                _fail(
+                    command,
+                    process.returncode,
+                    b"",
+                    f"cannot write the output: {error}".encode(),
+                )
+            raise
+        finally:
+            process.stdout.close()
+            if codec is not None:
+                with contextlib.suppress(BrokenPipeError):
+                    codec.stdin.close()
+        process.wait()
+        checks = [(process, command, command_err)]
+        if codec is not None:
+            codec.wait()
+            checks.append((codec, list(compress), codec_err))
+        if digest is None:
+            # The compressor broke the pipe and the dump was killed for it.
+            checks.reverse()
+        for failed, argv, err in checks:
+            if failed.returncode != 0 or digest is None:
+                err.seek(0)
+                _fail(argv, failed.returncode, b"", err.read())
+    return digest
+
+
+def _copy(source: BufferedReader, sink: IO[bytes] | ChunkWriter) -> Digest:
+    hasher = hashlib.new(DIGEST_ALGORITHM)
+    size = lines = 0
+    while chunk := source.read1(_COPY_CHUNK):
+        hasher.update(chunk)
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+        sink.write(chunk)
+    return Digest(DIGEST_ALGORITHM, hasher.hexdigest(), size, lines)
+
+
+def execute_to_directory(
+    command: Sequence[str],
+    out_dir: str,
+    *,
+    env: Mapping[str, str] | None = None,
+) -> None:
+    """Run *command*, unpacking the tar stream it writes into *out_dir*.
+
+    Like ``execute_to_file``, the stream lands in a sibling temporary
+    directory first, which only takes *out_dir*'s name once both the command
+    and tar succeeded.
+    """
+    command = list(command)
+    print(" ".join(command), flush=True)
+    tmp = Path(f"{out_dir}.tmp")
+    tmp.mkdir()
+    try:
+        _pipe(command, ["tar", "-xf", "-", "-C", str(tmp)], subprocess.DEVNULL, env)
+    except BackupError:
+        shutil.rmtree(tmp)
+        raise
+    tmp.replace(out_dir)
+
+
+def _pipe(
+    command: list[str],
+    consumer: list[str],
+    stdout: IO[bytes] | int,
+    env: Mapping[str, str] | None,
+) -> None:
+    """Run ``command | consumer``; a failure of either process fails the whole."""
+    with (
+        tempfile.TemporaryFile() as command_err,
+        tempfile.TemporaryFile() as consumer_err,
+    ):
         process = subprocess.Popen(
-            command, stdout=handle, stderr=subprocess.PIPE, env=_child_env(env)
+            command, stdout=subprocess.PIPE, stderr=command_err, env=_child_env(env)
+        )
+        reader = subprocess.Popen(
+            consumer, stdin=process.stdout, stdout=stdout, stderr=consumer_err
         )
-        _, err = process.communicate()
+        # Only the consumer holds the pipe now, so it sees the end of it.
+        process.stdout.close()
+        reader.wait()
+        process.wait()
+        for failed, argv, err in (
+            (process, command, command_err),
+            (reader, consumer, consumer_err),
+        ):
+            if failed.returncode != 0:
+                err.seek(0)
+                _fail(argv, failed.returncode, b"", err.read())
+
+
+def _lines(stream: BufferedReader, on_line: Callable[[str], None]) -> None:
+    pending = b""
+    while chunk := stream.read1(_CHUNK):
+        *complete, pending = _LINE_BREAK.split(pending + chunk)
+        for line in complete:
+            on_line(line[:MAX_LINE].decode("utf-8", "replace"))
+        pending = pending[:MAX_LINE]
+    if pending:
+        on_line(pending.decode("utf-8", "replace"))
+
+
+def stream_shell_command(
+    command: Sequence[str],
+    *,
+    env: Mapping[str, str] | None = None,
+    on_line: Callable[[str], None] | None = None,
+    tail: int = TAIL_LINES,
+) -> list[str]:
+    """Run a long or chatty *command* without holding its output in memory.
+
+    ``execute_shell_command`` keeps all of stdout and stderr until the
+    command exits, which for ``rsync -P`` over millions of files is gigabytes
+    nobody reads. Here both streams are merged and read as they come, one
+    line at a time, and only the last *tail* lines are kept.
+
+    Args:
+        command: argv, the program first.
+        env: variables added to the child's environment.
+        on_line: called with every line of stdout and stderr, in order; a
+            carriage return ends a line too, so each progress update is one.
+        tail: how many of the last lines to keep.
+
+    Returns:
+        The last *tail* lines.
+
+    Raises:
+        BackupError: the command failed; the message carries the tail.
+    """
+    command = list(command)
+    print(" ".join(command), flush=True)
+    kept: deque[str] = deque(maxlen=tail)
+
+    def take(line: str) -> None:
+        kept.append(line)
+        if on_line is not None:
+            on_line(line)
+
+    with subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=_child_env(env),
+    ) as process:
+        _lines(process.stdout, take)
     if process.returncode != 0:
-        tmp.unlink()
-        _fail(command, process.returncode, b"", err)
-    tmp.replace(out_file)
+        _fail(command, process.returncode, "\n".join(kept).encode("utf-8"), b"")
+    return list(kept)
@@ -3,11 +3,219 @@ from __future__ import annotations
 import json
 import os
 import pathlib
+import re
+import sqlite3
+import tempfile
 from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, NamedTuple
 
-from baudolo.generation import FILES_DIR
+from baudolo.generation import FILES_DIR, GENERATION_FORMAT
 
-from .shell import BackupError, execute_shell_command
+from .copyengine import copy_tree
+from .docker import run_docker
+from .genstore import adopt_carried
+from .shell import BackupError, stream_shell_command
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from .hashcache import HashCache
+
+# What a file's lstat is compared by: inode, size, mtime_ns and ctime_ns. A
+# write moves ctime, which no process can set back, so an unchanged tuple
+# means unchanged content.
+FileState = tuple[int, int, int, int]
+
+# Into a snapshot of the last generation: rewrite only the blocks that differ
+# (a local rsync would send whole files), so the rest stays shared with it.
+_INPLACE = ("--inplace", "--no-whole-file")
+
+# How much earlier than its name a generation may have started: a daylight
+# saving shift between the local time it was named in and now.
+_CLOCK_SLACK = 3600
+
+# rsync >= 3.1 says "regular files"; older ones count every file.
+_STATS = {
+    "files": re.compile(r"^Number of (?:regular )?files transferred:\s*([\d,.]+)"),
+    "bytes": re.compile(r"^Total transferred file size:\s*([\d,.]+)"),
+}
+
+
+class CopyStats(NamedTuple):
+    """What one rsync pass had to transfer."""
+
+    files: int
+    bytes: int
+
+
+class Precopy(NamedTuple):
+    """How the live passes ahead of a stop window converged.
+
+    ``files`` and ``bytes`` are what the last live pass still transferred -
+    the delta the authoritative pass starts from - or None when rsync
+    reported no stats for it.
+    """
+
+    rounds: int
+    files: int | None
+    bytes: int | None
+
+
+def parse_stats(lines: Iterable[str]) -> CopyStats | None:
+    """Read the transfer counts out of rsync's ``--stats`` block.
+
+    Returns:
+        The counts, or None when the output carries no stats block.
+    """
+    found: dict[str, int] = {}
+    for line in lines:
+        for key, pattern in _STATS.items():
+            match = pattern.match(line.strip())
+            if match:
+                # Thousands separators follow the locale: "1,234" or "1.234".
+                found[key] = int(re.sub(r"\D", "", match.group(1)))
+    if len(found) != len(_STATS):
+        return None
+    return CopyStats(**found)
+
+
+def _entries(directory: str) -> list[os.DirEntry]:
+    """The entries of *directory*; none if it vanished meanwhile."""
+    try:
+        with os.scandir(directory) as entries:
+            return list(entries)
+    except FileNotFoundError:
+        return []
+
+
+def _state(entry: os.DirEntry) -> FileState | None:
+    try:
+        info = entry.stat(follow_symlinks=False)
+    except FileNotFoundError:
+        return None
+    return (info.st_ino, info.st_size, info.st_mtime_ns, info.st_ctime_ns)
+
+
+def file_states(source: str) -> Iterator[tuple[str, FileState]]:
+    """The state of every file and symlink under *source*, by relative path.
+
+    Directories are left out, since every pass brings their metadata along
+    anyway, and so are the device nodes, sockets and pipes ``--no-D`` skips.
+    """
+    pending = [("", source)]
+    while pending:
+        prefix, directory = pending.pop()
+        for entry in _entries(directory):
+            relative = f"{prefix}{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                pending.append((f"{relative}/", entry.path))
+            elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                state = _state(entry)
+                if state is not None:
+                    yield relative, state
+
+
+def _store(db: sqlite3.Connection, table: str, source: str) -> None:
+    db.execute(f"DROP TABLE IF EXISTS {table}")
+    db.execute(
+        f"CREATE TABLE {table} (path BLOB PRIMARY KEY, ino INTEGER, size INTEGER,"
+        " mtime_ns INTEGER, ctime_ns INTEGER) WITHOUT ROWID"
+    )
+    db.executemany(
+        f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?)",  # noqa: S608 - fixed names
+        ((os.fsencode(path), *state) for path, state in file_states(source)),
+    )
+
+
+def _quick_check_passes(previous: str, path: bytes, size: int, mtime_ns: int) -> bool:
+    """Whether rsync's quick check takes *path* for its copy in *previous*.
+
+    Seconds only, as an rsync that cannot compare nanoseconds does.
+    """
+    try:
+        info = (pathlib.Path(previous) / os.fsdecode(path)).lstat()
+    except OSError:
+        return False
+    return info.st_size == size and info.st_mtime_ns // 10**9 == mtime_ns // 10**9
+
+
+class ChangeTracker:
+    """What a volume's files looked like when its last live pass started.
+
+    Recorded before the pass reads anything, so a file written while the
+    pass copies it, or after, no longer matches its record. The
+    authoritative pass then only has to force those files across, instead
+    of comparing every byte of the volume with ``--checksum``.
+
+    A live pass never reads a file that looks unchanged since the last
+    generation by size and mtime: it links or keeps that copy. Content
+    rewritten behind a restored mtime (``cp -p``, ``tar -x``, ``touch -r``)
+    still moved the file's ctime, which no process can set back, so
+    ``changed`` also forces every such file whose ctime is later than the
+    start of that generation.
+
+    The record is kept in a private temporary SQLite database, which spills
+    to disk past its page cache: a volume of millions of files does not hold
+    their states in memory until the barrier.
+    """
+
+    def __init__(self) -> None:
+        self.db: sqlite3.Connection | None = None
+
+    def record(self, source: str) -> None:
+        # "" opens a temporary on-disk database, deleted when it is closed.
+        db = sqlite3.connect("", check_same_thread=False)
+        with db:
+            _store(db, "recorded", source)
+        if self.db is not None:
+            self.db.close()
+        self.db = db
+
+    def changed(
+        self, source: str, *, previous: str | None = None, since_ns: int = 0
+    ) -> list[str] | None:
+        """Files new or changed since the record; None if there is none.
+
+        Args:
+            previous: the volume's files in the last generation, if any.
+            since_ns: when that generation started; a file whose ctime is
+                later and whose copy there passes the quick check is forced.
+        """
+        if self.db is None:
+            return None
+        # Without a last generation nothing was linked or kept from one.
+        limit = since_ns if previous is not None else 2**63 - 1
+        with self.db as db:
+            _store(db, "current", source)
+            rows = db.execute(
+                "SELECT path, moved, size, mtime_ns FROM (SELECT c.*,"
+                " r.path IS NULL OR r.ino != c.ino OR r.size != c.size"
+                " OR r.mtime_ns != c.mtime_ns OR r.ctime_ns != c.ctime_ns AS moved"
+                " FROM current AS c LEFT JOIN recorded AS r USING (path))"
+                " WHERE moved OR ctime_ns > ? ORDER BY path",
+                (limit,),
+            ).fetchall()
+            db.execute("DROP TABLE current")
+        return [
+            os.fsdecode(path)
+            for path, moved, size, mtime_ns in rows
+            if moved or _quick_check_passes(previous, path, size, mtime_ns)
+        ]
+
+
+def generation_started_ns(files_dir: str) -> int | None:
+    """When the generation holding *files_dir* started, from its name.
+
+    The name is the run's local start time to the second; a daylight saving
+    shift is allowed for. None for a directory not named that way.
+    """
+    name = pathlib.Path(files_dir).parents[1].name
+    try:
+        started = datetime.strptime(name, GENERATION_FORMAT)  # noqa: DTZ007 - named in local time
+    except ValueError:
+        return None
+    return (int(started.timestamp()) - _CLOCK_SLACK) * 10**9
 
 
 @dataclass(frozen=True)
@@ -31,7 +239,7 @@ class Backing:
 
 
 def inspect_backing(volume_name: str) -> Backing:
-    reported = execute_shell_command(
+    reported = run_docker(
         ["docker", "volume", "inspect", "--format", "{{json .}}", volume_name]
     )[0]
     data = json.loads(reported)
@@ -60,7 +268,12 @@ def backup_volume(
     *,
     authoritative: bool,
     source: str,
-) -> None:
+    tracker: ChangeTracker | None = None,
+    engine: str = "rsync",
+    reflink: bool = False,
+    inplace: bool = False,
+    hash_cache: HashCache | None = None,
+) -> CopyStats | None:
     """Perform incremental file backup of a Docker volume.
 
     Args:
@@ -70,24 +283,120 @@ def backup_volume(
             both attributes still agree.
         source: directory to read from - the volume's mountpoint, or its path
             inside a snapshot.
+        tracker: a live pass records the files' state in it first. An
+            authoritative pass then re-copies the files whose state moved
+            since, and those the quick check would take for their copy in
+            the last generation though their ctime is later than its start,
+            unconditionally, and compares the rest by size and mtime only;
+            without a record it falls back to ``--checksum``.
+        engine: ``rsync``, or ``native`` for ``copyengine.copy_tree``, which
+            keeps the same semantics in-process.
+        reflink: with the native engine, clone a changed file's previous
+            version and rewrite only the blocks that differ.
+        inplace: the generation is a snapshot of the last one (see
+            ``genstore``). The volume's carried tree is the starting point:
+            no ``--link-dest``, and rsync updates changed files in place,
+            writing only the blocks that differ.
+        hash_cache: with the native engine, where a pass compares by
+            content: the repository's digests, so files untouched since the
+            last run are not read again.
+
+    Returns:
+        What the pass transferred, or None when rsync reported no stats.
     """
+    if inplace:
+        adopt_carried(volume_dir)
     dest = f"{pathlib.Path(volume_dir) / FILES_DIR}/"
     pathlib.Path(dest).mkdir(parents=True, exist_ok=True)
 
-    last = get_last_backup_dir(versions_dir, volume_name, dest)
-    cmd = ["rsync", "-aP", "--no-D", "--delete", "--delete-excluded"]
-    if authoritative:
+    # The volume's files in the last generation: what --link-dest links
+    # from, or what the carried tree of a snapshot generation holds.
+    previous = get_last_backup_dir(versions_dir, volume_name, dest)
+    changed = None
+    if tracker is not None and authoritative:
+        changed = tracker.changed(
+            source,
+            previous=previous,
+            since_ns=0 if previous is None else generation_started_ns(previous) or 0,
+        )
+    elif tracker is not None:
+        tracker.record(source)
+    if changed:
+        print(
+            f"Authoritative pass of '{volume_name}': {len(changed)} file(s) "
+            "changed since the live pass or rewritten since the last generation.",
+            flush=True,
+        )
+
+    last = None if inplace else previous
+    if engine == "native":
+        return CopyStats(
+            *copy_tree(
+                source,
+                dest,
+                link_dest=last,
+                checksum=authoritative and changed is None,
+                forced=changed or (),
+                reflink=reflink,
+                hash_cache=hash_cache,
+            )
+        )
+    if changed:
+        _force(changed, source, dest, inplace=inplace)
+    cmd = ["rsync", "-aP", "--no-D", "--delete", "--delete-excluded", "--stats"]
+    if inplace:
+        cmd += _INPLACE
+    if authoritative and changed is None:
         cmd.append("--checksum")
     if last:
         cmd.append(f"--link-dest={last}")
     cmd += [source, dest]
 
+    # -P reports progress for every file; it is streamed and only watched
+    # for vanished files, and the --stats block arrives in the kept tail.
+    lines = _rsync(cmd)
+    return None if lines is None else parse_stats(lines)
+
+
+def _rsync(cmd: list[str]) -> list[str] | None:
+    """Run *cmd*; None when it only failed on files that vanished meanwhile."""
+    vanished = False
+
+    def watch(line: str) -> None:
+        nonlocal vanished
+        vanished = vanished or "file has vanished" in line
+
     try:
-        execute_shell_command(cmd)
-    except BackupError as e:
-        if "file has vanished" in str(e):
+        return stream_shell_command(cmd, on_line=watch)
+    except BackupError:
+        if vanished:
             print(
                 "Warning: Some files vanished before transfer. Continuing.", flush=True
             )
-        else:
-            raise
+            return None
+        raise
+
+
+def _force(paths: list[str], source: str, dest: str, *, inplace: bool) -> None:
+    """Copy *paths* from *source* whatever their size and mtime say.
+
+    A listed file deleted since the record is skipped, not an error: the
+    main pass deletes it from *dest* right after.
+    """
+    with tempfile.NamedTemporaryFile("wb") as listing:
+        listing.write(b"".join(os.fsencode(path) + b"\0" for path in paths))
+        listing.flush()
+        _rsync(
+            [
+                "rsync",
+                "-a",
+                "--no-D",
+                "--ignore-times",
+                "--ignore-missing-args",
+                *(_INPLACE if inplace else ()),
+                "--from0",
+                f"--files-from={listing.name}",
+                source,
+                dest,
+            ]
+        )
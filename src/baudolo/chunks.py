@@ -0,0 +1,274 @@
+"""A content-addressed pool of dump chunks, shared by every generation.
+
+With ``--dump-store chunks`` a dump is not written as one file. Its stream is
+cut into chunks at boundaries its own content picks, each chunk is stored
+once under its hash in the repository's ``CHUNK_DIR``, and the generation
+keeps a recipe in the dump's place: one ``<hash> <size>`` line per chunk, in
+stream order. Tables that did not change between two runs yield the same
+chunks, so each generation only adds what is new.
+
+A boundary falls where a rolling hash of the last ``WINDOW`` bytes hits a
+value that occurs about once per ``TARGET_CHUNK`` bytes; it depends on those
+bytes alone, not on where a line ends or how the stream was read, so a row
+inserted early in a dump moves no later boundary even inside one long
+extended INSERT, and only the chunk holding it changes. A chunk never ends
+before ``MIN_CHUNK`` bytes and is cut at ``MAX_CHUNK`` when no boundary came.
+The hash is a sum of per-byte random values over the window, which numpy
+computes for a whole write at once with a cumulative sum.
+
+Chunks are zlib-compressed on disk and verified against their hash when read
+back. ``collect_garbage`` removes those no recipe in any generation lists
+anymore; a chunk written or reused within its grace period is always kept,
+because the recipe of a dump still being written does not exist yet. The
+collection holds the pool's lock exclusively and every store holds it
+shared, so a chunk cannot be reused between the check of its age and its
+removal.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import io
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, TYPE_CHECKING
+
+import numpy as np
+
+from baudolo.generation import CHUNK_DIR, RECIPE_SUFFIX, SQL_DIR
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+CHUNK_HASH = "sha256"
+# Chunks average about TARGET_CHUNK bytes beyond the minimum; a power of two.
+TARGET_CHUNK = 1024 * 1024
+MIN_CHUNK = 256 * 1024
+MAX_CHUNK = 8 * 1024 * 1024
+# Bytes the rolling hash covers; less than MIN_CHUNK, so a boundary only
+# ever depends on the chunk it ends.
+WINDOW = 64
+# A fixed random value per byte, the same on every host and numpy version.
+_GEAR = np.frombuffer(
+    b"".join(hashlib.sha256(bytes([n])).digest()[:4] for n in range(256)), "<u4"
+)
+LOCK_FILE = ".lock"
+COMPRESS_LEVEL = 3
+# How long an unreferenced chunk survives, for a run still writing its recipe.
+GC_GRACE = 24 * 3600
+
+
+class ChunkError(Exception):
+    """A chunk a recipe lists is missing, or not the data stored under it."""
+
+
+def is_recipe(path: str) -> bool:
+    return path.endswith(RECIPE_SUFFIX)
+
+
+def pool_of(recipe: str) -> Path:
+    """The pool a recipe's chunks live in: ``<repo>/<generation>/<volume>/sql``
+    keeps them in ``<repo>/CHUNK_DIR``."""
+    return Path(recipe).resolve().parents[3] / CHUNK_DIR
+
+
+def _chunk_path(pool: Path, digest: str) -> Path:
+    return pool / digest[:2] / digest
+
+
+@contextmanager
+def _locked(pool: Path, operation: int) -> Iterator[None]:
+    """Hold the pool's lock for the block; released when the file closes."""
+    pool.mkdir(parents=True, exist_ok=True)
+    with (pool / LOCK_FILE).open("a") as handle:
+        fcntl.flock(handle, operation)
+        yield
+
+
+def _boundary(data: bytes) -> int | None:
+    """Where in *data* the first window ending a chunk closes, if anywhere.
+
+    The first ``WINDOW`` bytes only prime the hash; the result counts from
+    the end of the first window, so 0 means right after it.
+    """
+    sums = np.zeros(len(data) + 1, np.uint32)
+    np.cumsum(_GEAR[np.frombuffer(data, np.uint8)], dtype=np.uint32, out=sums[1:])
+    hashes = sums[WINDOW:] - sums[: len(sums) - WINDOW]
+    hits = np.flatnonzero((hashes & np.uint32(TARGET_CHUNK - 1)) == 0)
+    return int(hits[0]) if len(hits) else None
+
+
+def _refresh(path: Path) -> bool:
+    """Mark an existing chunk as just used; False if there is none."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class ChunkWriter:
+    """A sink that cuts what is written into chunks and lists them in *recipe*.
+
+    Args:
+        pool: the chunk pool, created on first use.
+        recipe: the open recipe file; ``close`` writes its last line.
+    """
+
+    def __init__(self, pool: str, recipe: IO[bytes]) -> None:
+        self._pool = Path(pool)
+        self._recipe = recipe
+        self._buffer = bytearray()
+        self._scanned = 0
+
+    def write(self, data: bytes) -> int:
+        buffer = self._buffer
+        buffer += data
+        while True:
+            end = min(len(buffer), MAX_CHUNK)
+            first = max(self._scanned, MIN_CHUNK)
+            found = None
+            if end >= first:
+                found = _boundary(bytes(buffer[first - WINDOW : end]))
+            cut = None if found is None else first + found
+            if cut is None and end == MAX_CHUNK:
+                cut = MAX_CHUNK
+            if cut is None:
+                # Every length up to here was tried; the next write goes on.
+                self._scanned = end + 1
+                return len(data)
+            self._store(bytes(buffer[:cut]))
+            del buffer[:cut]
+            self._scanned = 0
+
+    def close(self) -> None:
+        """Store what is left; the recipe is complete afterwards."""
+        if self._buffer:
+            self._store(bytes(self._buffer))
+            self._buffer.clear()
+        self._scanned = 0
+
+    def _store(self, chunk: bytes) -> None:
+        digest = hashlib.new(CHUNK_HASH, chunk).hexdigest()
+        path = _chunk_path(self._pool, digest)
+        with _locked(self._pool, fcntl.LOCK_SH):
+            if not _refresh(path):
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # Writers of the same chunk race harmlessly: each renames its own.
+                tmp = path.with_name(
+                    f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp"
+                )
+                tmp.write_bytes(zlib.compress(chunk, COMPRESS_LEVEL))
+                tmp.replace(path)
+        self._recipe.write(f"{digest} {len(chunk)}\n".encode())
+
+
+class _Reassembling(io.RawIOBase):
+    """The stream a recipe describes, read chunk by chunk from *pool*."""
+
+    def __init__(self, recipe: IO[bytes], pool: Path, source: str) -> None:
+        super().__init__()
+        self._recipe = recipe
+        self._pool = pool
+        self._source = source
+        self._chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        if not self._chunk:
+            line = self._recipe.readline()
+            if not line:
+                return 0
+            self._chunk = memoryview(self._load(line))
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def _load(self, line: bytes) -> bytes:
+        digest, size = line.decode("ascii").split()
+        path = _chunk_path(self._pool, digest)
+        try:
+            chunk = zlib.decompress(path.read_bytes())
+        except (OSError, zlib.error) as error:
+            raise ChunkError(
+                f"{self._source}: cannot read chunk {digest} ({error})"
+            ) from error
+        if len(chunk) != int(size) or hashlib.new(CHUNK_HASH, chunk).hexdigest() != (
+            digest
+        ):
+            raise ChunkError(f"{self._source}: chunk {digest} is corrupt")
+        return chunk
+
+
+@contextmanager
+def open_recipe(recipe: str) -> Iterator[IO[bytes]]:
+    """Open the dump *recipe* stands for, as one binary stream.
+
+    Raises:
+        ChunkError: while reading, when a chunk is missing or corrupt.
+    """
+    with Path(recipe).open("rb") as handle:
+        yield io.BufferedReader(
+            _Reassembling(handle, pool_of(recipe), recipe), TARGET_CHUNK
+        )
+
+
+def _referenced(repo: Path) -> set[str]:
+    """Every chunk a recipe of any generation under *repo* lists."""
+    names: set[str] = set()
+    for recipe in repo.glob(f"*/*/{SQL_DIR}/*{RECIPE_SUFFIX}"):
+        with recipe.open("rb") as handle:
+            names.update(line.split(b" ", 1)[0].decode("ascii") for line in handle)
+    return names
+
+
+def _remove_stale(path: Path, cutoff: float) -> int:
+    """Delete *path* unless it was used after *cutoff*; the bytes freed."""
+    try:
+        info = path.stat()
+        if info.st_mtime > cutoff:
+            return 0
+        path.unlink()
+    except FileNotFoundError:
+        return 0
+    return info.st_size
+
+
+def collect_garbage(repo: str, *, grace: float = GC_GRACE) -> tuple[int, int]:
+    """Remove the chunks under *repo* that no recipe references.
+
+    A recipe that cannot be read stops the collection before anything is
+    removed, since the chunks it lists would otherwise look unreferenced.
+
+    Args:
+        repo: the repository directory, holding the generations and the pool.
+        grace: seconds since its last write or reuse a chunk is kept anyway.
+
+    Returns:
+        How many chunks were removed, and the bytes that freed.
+
+    Raises:
+        OSError: a recipe could not be read.
+    """
+    pool = Path(repo) / CHUNK_DIR
+    if not pool.is_dir():
+        return 0, 0
+    removed = freed = 0
+    with _locked(pool, fcntl.LOCK_EX):
+        keep = _referenced(Path(repo))
+        cutoff = time.time() - grace
+        for path in pool.glob("*/*"):
+            if path.name in keep:
+                continue
+            size = _remove_stale(path, cutoff)
+            removed += 1 if size else 0
+            freed += size
+    return removed, freed
@@ -8,7 +8,40 @@ what the run that produced the tree recorded.
 The manifest also carries what only the run itself can know: per volume,
 ``database`` (it held one), ``dumped`` (a dump was produced for it) and
 ``engine`` (which one was detected). Both flags true is a replayable dump;
-``database`` without ``dumped`` is a raw copy of live engine files.
+``database`` without ``dumped`` is a raw copy of live engine files. A volume
+copied live ahead of a stop window also carries ``precopy``: how many live
+passes ran, and the files and bytes the last one still transferred.
+
+Each database is dumped once per run, into the volume its engine keeps its
+data in. Every other volume of that instance lists the dump under
+``dump_refs``: its file name, mapped to the volume whose sql directory holds
+it.
+
+Dumps are compressed as the run chose: ``compression`` names the codec and
+``compression_suffix`` what it appends to each dump's name, so a reader finds
+``<database>.backup.sql.zst`` without guessing.
+
+A Postgres instance dumped in pg_dump's directory format holds one
+``<database>.backup.dir`` directory per database instead, named by
+``directory_suffix`` and restored with ``pg_restore``. The volumes it belongs
+to list it under ``dump_formats``, so a reader knows the format without
+looking at the tree.
+
+Every dump file written to a stream is hashed and counted on its way to
+disk. ``dumps`` maps its path inside the generation, ``<volume>/sql/<file>``,
+to the ``algorithm``, hex ``digest``, ``bytes`` and ``lines`` of the SQL
+stream - before compression, since that is what a restore replays. A pg_dump
+directory carries no entry. A run with ``--skip-unchanged`` adds the
+database's ``fingerprint`` taken before the dump, and ``linked_from`` names
+the earlier generation a dump was hard-linked from because that fingerprint
+had not changed.
+
+With ``dump_store`` set to ``chunks``, each SQL dump is a recipe named
+``<database>.backup.sql.chunks`` (``recipe_suffix``): one line per chunk of
+the stream, ``<sha256> <size>``, in order. The chunks lie zlib-compressed at
+``<chunk_dir>/<first two hex digits>/<sha256>``, where ``chunk_dir`` sits
+beside the generations and is shared by all of them. ``dumps`` still
+describes the reassembled stream.
 
 Kept import-free: consumers read the manifest with nothing but ``json``, on
 hosts that do not have this package installed.
@@ -16,25 +49,48 @@ hosts that do not have this package installed.
 
 from __future__ import annotations
 
+# A generation's name: the local time its run started, to the second.
+GENERATION_FORMAT = "%Y%m%d%H%M%S"
 FILES_DIR = "files"
 SQL_DIR = "sql"
 DUMP_SUFFIX = ".backup.sql"
 CLUSTER_SUFFIX = ".cluster.backup.sql"
+DIRECTORY_SUFFIX = ".backup.dir"
+# With the chunk store: what a dump's recipe appends to its name, and the pool
+# beside the generations that holds the chunks.
+RECIPE_SUFFIX = ".chunks"
+CHUNK_DIR = ".chunks"
+DUMP_STORES = ("files", "chunks")
+
+# What a dump is compressed with, and the suffix that adds to its name.
+DUMP_CODECS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
 
 MANIFEST_FILE = "manifest.json"
 MANIFEST_SCHEMA = 1
 
 
-def manifest_document(volumes: dict[str, object]) -> dict[str, object]:
+def manifest_document(
+    volumes: dict[str, object], compression: str = "none", store: str = "files"
+) -> dict[str, object]:
     """The manifest a finished run writes.
 
     Args:
-        volumes: per volume name, an object carrying ``database``, ``dumped``
-            and ``engine`` -- a ``baudolo.backup.dumps.VolumeOutcome``.
+        volumes: per volume name, an object carrying ``database``, ``dumped``,
+            ``engine`` and optionally ``precopy``, ``refs``, ``formats`` and
+            ``dumps`` -- a ``baudolo.backup.dumps.VolumeOutcome``.
+        compression: the codec the run's dumps are written with, a key of
+            ``DUMP_CODECS``. Its suffix follows the dump and cluster suffixes.
+        store: how the dumps are kept, one of ``DUMP_STORES``.
 
     Returns:
         The document, ready for ``json.dump``.
     """
+    dumps: dict[str, dict[str, object]] = {}
+    for name, outcome in volumes.items():
+        refs = getattr(outcome, "refs", None) or {}
+        for file_name, record in (getattr(outcome, "dumps", None) or {}).items():
+            holder = refs.get(file_name, name)
+            dumps[f"{holder}/{SQL_DIR}/{file_name}"] = _dump_entry(record)
     return {
         "schema": MANIFEST_SCHEMA,
         "layout": {
@@ -42,13 +98,52 @@ def manifest_document(volumes: dict[str, object]) -> dict[str, object]:
             "sql_dir": SQL_DIR,
             "dump_suffix": DUMP_SUFFIX,
             "cluster_suffix": CLUSTER_SUFFIX,
+            "directory_suffix": DIRECTORY_SUFFIX,
+            "compression": compression,
+            "compression_suffix": DUMP_CODECS[compression],
+            "dump_store": store,
+            "recipe_suffix": RECIPE_SUFFIX,
+            "chunk_dir": CHUNK_DIR,
         },
         "volumes": {
-            name: {
-                "database": bool(outcome.database),
-                "dumped": bool(outcome.dumped),
-                "engine": outcome.engine,
-            }
-            for name, outcome in sorted(volumes.items())
+            name: _volume_entry(outcome) for name, outcome in sorted(volumes.items())
         },
+        "dumps": dict(sorted(dumps.items())),
+    }
+
+
+def _volume_entry(outcome: object) -> dict[str, object]:
+    entry: dict[str, object] = {
+        "database": bool(outcome.database),
+        "dumped": bool(outcome.dumped),
+        "engine": outcome.engine,
+    }
+    precopy = getattr(outcome, "precopy", None)
+    if precopy is not None:
+        entry["precopy"] = {
+            "rounds": precopy.rounds,
+            "files": precopy.files,
+            "bytes": precopy.bytes,
+        }
+    refs = getattr(outcome, "refs", None)
+    if refs:
+        entry["dump_refs"] = dict(sorted(refs.items()))
+    formats = getattr(outcome, "formats", None)
+    if formats:
+        entry["dump_formats"] = dict(sorted(formats.items()))
+    return entry
+
+
+def _dump_entry(record: object) -> dict[str, object]:
+    digest = record.digest
+    entry: dict[str, object] = {
+        "algorithm": digest.algorithm,
+        "digest": digest.hexdigest,
+        "bytes": digest.bytes,
+        "lines": digest.lines,
     }
+    if record.fingerprint is not None:
+        entry["fingerprint"] = record.fingerprint
+    if record.reused is not None:
+        entry["linked_from"] = record.reused
+    return entry
@@ -31,6 +31,14 @@ def _add_common_engine_args(p: argparse.ArgumentParser) -> None:
     p.add_argument("--container", required=True)
     p.add_argument("--db-password", required=True)
     p.add_argument("--empty", action="store_true")
+    p.add_argument(
+        "--no-checksum",
+        action="store_true",
+        help=(
+            "Replay without checking the dump against the digest its "
+            "generation's manifest records."
+        ),
+    )
     p.add_argument(
         "--no-version-check",
         action="store_true",
@@ -41,6 +49,22 @@ def _add_common_engine_args(p: argparse.ArgumentParser) -> None:
     )
 
 
+def _paths(args: argparse.Namespace) -> BackupPaths:
+    return BackupPaths(
+        args.volume_name,
+        args.backup_hash,
+        args.version,
+        repo_name=args.repo_name,
+        backups_dir=args.backups_dir,
+    )
+
+
+def _checksum(
+    args: argparse.Namespace, paths: BackupPaths, sql_path: str
+) -> dict | None:
+    return None if args.no_checksum else paths.checksum(sql_path)
+
+
 def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
         prog="baudolo-restore",
@@ -65,6 +89,15 @@ def main(argv: list[str] | None = None) -> int:
     _add_common_engine_args(p_pg)
     p_pg.add_argument("--db-name", required=True)
     p_pg.add_argument("--db-user", default=None, help="Defaults to db-name if omitted")
+    p_pg.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help=(
+            "pg_restore workers for a directory-format dump (default: 4). "
+            "A plain SQL dump replays in one psql session."
+        ),
+    )
 
     p_cluster = sub.add_parser(
         "cluster", help="Restore a full PostgreSQL cluster dump (pg_dumpall)"
@@ -91,6 +124,8 @@ def main(argv: list[str] | None = None) -> int:
     p_mdb.add_argument("--db-user", default=None, help="Defaults to db-name if omitted")
 
     args = parser.parse_args(argv)
+    if args.cmd == "postgres" and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
 
     try:
         if args.cmd == "files":
@@ -111,56 +146,48 @@ def main(argv: list[str] | None = None) -> int:
 
         if args.cmd == "postgres":
             user = args.db_user or args.db_name
+            paths = _paths(args)
+            sql_path = paths.sql_file(args.db_name)
             restore_postgres_sql(
                 container=args.container,
                 db_name=args.db_name,
                 user=user,
                 password=args.db_password,
-                sql_path=BackupPaths(
-                    args.volume_name,
-                    args.backup_hash,
-                    args.version,
-                    repo_name=args.repo_name,
-                    backups_dir=args.backups_dir,
-                ).sql_file(args.db_name),
+                sql_path=sql_path,
                 empty=args.empty,
                 check_version=not args.no_version_check,
+                jobs=args.jobs,
+                checksum=_checksum(args, paths, sql_path),
             )
             return 0
 
         if args.cmd == "cluster":
+            paths = _paths(args)
+            sql_path = paths.cluster_file(args.instance)
             restore_cluster_sql(
                 container=args.container,
                 user=args.db_user,
                 password=args.db_password,
-                sql_path=BackupPaths(
-                    args.volume_name,
-                    args.backup_hash,
-                    args.version,
-                    repo_name=args.repo_name,
-                    backups_dir=args.backups_dir,
-                ).cluster_file(args.instance),
+                sql_path=sql_path,
                 empty=args.empty,
                 check_version=not args.no_version_check,
+                checksum=_checksum(args, paths, sql_path),
             )
             return 0
 
         if args.cmd == "mariadb":
             user = args.db_user or args.db_name
+            paths = _paths(args)
+            sql_path = paths.sql_file(args.db_name)
             restore_mariadb_sql(
                 container=args.container,
                 db_name=args.db_name,
                 user=user,
                 password=args.db_password,
-                sql_path=BackupPaths(
-                    args.volume_name,
-                    args.backup_hash,
-                    args.version,
-                    repo_name=args.repo_name,
-                    backups_dir=args.backups_dir,
-                ).sql_file(args.db_name),
+                sql_path=sql_path,
                 empty=args.empty,
                 check_version=not args.no_version_check,
+                checksum=_checksum(args, paths, sql_path),
             )
             return 0
 
@@ -26,6 +26,7 @@ from typing import TYPE_CHECKING
 
 from baudolo.restore.run import docker_exec
 
+from .codec import open_dump
 from .version import guard
 
 if TYPE_CHECKING:
@@ -96,7 +97,7 @@ def dump_inventory(sql_path: str) -> tuple[list[str], list[str]]:
     """
     databases: list[str] = []
     roles: list[str] = []
-    with Path(sql_path).open("rb") as handle:
+    with open_dump(sql_path) as handle:
         for raw in handle:
             line = raw.decode("utf-8", "replace")
             for pattern, sink, read in (
@@ -204,6 +205,7 @@ def restore_cluster_sql(
     sql_path: str,
     empty: bool,
     check_version: bool = True,
+    checksum: dict | None = None,
 ) -> None:
     """Replay a pg_dumpall stream into a running instance.
 
@@ -219,6 +221,8 @@ def restore_cluster_sql(
             decision, not a default.
         check_version: refuse a dump from a newer major version than the
             running engine before anything is dropped.
+        checksum: the dump's entry in the manifest. The dump is read, and
+            checked against it, before anything is dropped.
     """
     if not Path(sql_path).is_file():
         raise FileNotFoundError(sql_path)
@@ -234,19 +238,21 @@ def restore_cluster_sql(
 
     docker_env = {"PGPASSWORD": password}
 
-    if empty:
-        assert_instance_matches_dump(container, user, sql_path, docker_env)
-        docker_exec(
-            container,
-            _psql(user),
-            stdin=preclean_sql().encode(),
-            docker_env=docker_env,
-        )
-
-    with Path(sql_path).open("rb") as src, tempfile.TemporaryFile() as filtered:
-        for line in filter_own_role_creation(src, user):
-            filtered.write(line)
+    with tempfile.TemporaryFile() as filtered:
+        with open_dump(sql_path, checksum) as src:
+            for line in filter_own_role_creation(src, user):
+                filtered.write(line)
         filtered.seek(0)
+
+        if empty:
+            assert_instance_matches_dump(container, user, sql_path, docker_env)
+            docker_exec(
+                container,
+                _psql(user),
+                stdin=preclean_sql().encode(),
+                docker_env=docker_env,
+            )
+
         docker_exec(container, _psql(user), stdin=filtered, docker_env=docker_env)
 
     print(f"PostgreSQL cluster restore complete from '{Path(sql_path).name}'.")
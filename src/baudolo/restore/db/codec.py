@@ -0,0 +1,139 @@
+"""Reading a dump back, whatever codec the backup run wrote it with.
+
+A run started with ``--dump-compression`` streams every dump through gzip or
+zstd, and the file name carries the codec's suffix. The restore paths stream
+the dump into the engine's client and never hold it whole, so decompression
+streams too: a child process decompresses into a pipe the caller reads, or
+hands to ``docker exec`` as its stdin.
+
+The manifest records the digest of each dump's SQL stream. Given it, the
+stream is hashed as it is read, and reading the last byte raises when the
+digest, size or line count differ. The callers read a dump to its end before
+the first destructive step, so a corrupt dump is refused while the database
+is still untouched.
+
+A dump kept in the chunk store is a recipe; it is read back by reassembling
+its chunks in order, each checked against its own hash on the way.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, TYPE_CHECKING
+
+from baudolo.chunks import is_recipe, open_recipe
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+DECOMPRESSORS = {".gz": ["gzip", "-dc"], ".zst": ["zstd", "-dcq"]}
+_CHUNK = 1024 * 1024
+
+
+class ChecksumMismatchError(Exception):
+    """The dump is not the stream the backup run wrote."""
+
+
+class _Verifying(io.RawIOBase):
+    """Hashes what is read through it and compares at the end of the stream."""
+
+    def __init__(self, stream: IO[bytes], checksum: dict, source: str) -> None:
+        super().__init__()
+        self._stream = stream
+        self._checksum = checksum
+        self._source = source
+        self._hash = hashlib.new(checksum["algorithm"])
+        self._bytes = 0
+        self._lines = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        data = self._stream.read1(len(buffer))
+        if not data:
+            self._verify()
+            return 0
+        buffer[: len(data)] = data
+        self._hash.update(data)
+        self._bytes += len(data)
+        self._lines += data.count(b"\n")
+        return len(data)
+
+    def _verify(self) -> None:
+        found = (self._hash.hexdigest(), self._bytes, self._lines)
+        expected = (
+            self._checksum["digest"],
+            self._checksum["bytes"],
+            self._checksum["lines"],
+        )
+        if found != expected:
+            raise ChecksumMismatchError(
+                f"{self._source} does not match its manifest: expected "
+                f"{expected[1]} bytes in {expected[2]} lines with "
+                f"{self._checksum['algorithm']} {expected[0]}, read {found[1]} "
+                f"bytes in {found[2]} lines with {found[0]}"
+            )
+
+
+def decompressor(sql_path: str) -> list[str] | None:
+    """The argv that decompresses *sql_path* to stdout, None for plain SQL."""
+    for suffix, argv in DECOMPRESSORS.items():
+        if sql_path.endswith(suffix):
+            return [*argv, sql_path]
+    return None
+
+
+def _checked(stream: IO[bytes], checksum: dict | None, sql_path: str) -> IO[bytes]:
+    if checksum is None:
+        return stream
+    return io.BufferedReader(_Verifying(stream, checksum, sql_path), _CHUNK)
+
+
+@contextmanager
+def open_dump(sql_path: str, checksum: dict | None = None) -> Iterator[IO[bytes]]:
+    """Open a dump as a binary stream of its SQL.
+
+    A caller may stop reading early, as the version check does; the
+    decompressor is then stopped. One that read to the end learns about a
+    corrupt or truncated file from the decompressor's exit status.
+
+    Args:
+        checksum: the dump's entry in the manifest's ``dumps``; reading to
+            the end then also verifies the stream against it. The stream has
+            no file descriptor in that case, nor for a chunk recipe, so it
+            cannot be handed to a child process directly.
+
+    Raises:
+        subprocess.CalledProcessError: the decompressor failed.
+        baudolo.chunks.ChunkError: a chunk of a recipe is missing or corrupt.
+        ChecksumMismatchError: the stream read to its end differs from
+            *checksum*.
+    """
+    if is_recipe(sql_path):
+        with open_recipe(sql_path) as stream:
+            yield _checked(stream, checksum, sql_path)
+        return
+    argv = decompressor(sql_path)
+    if argv is None:
+        with Path(sql_path).open("rb") as handle:
+            yield _checked(handle, checksum, sql_path)
+        return
+    process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        yield _checked(process.stdout, checksum, sql_path)
+    except BaseException:
+        process.kill()
+        process.communicate()
+        raise
+    if process.stdout.read(1):
+        process.kill()
+        process.communicate()
+        return
+    _, err = process.communicate()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, argv, stderr=err)
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import shutil
 import sys
+import tempfile
+from contextlib import ExitStack
 from pathlib import Path
 
+from baudolo.chunks import is_recipe
 from baudolo.restore.run import docker_exec, docker_exec_sh
 
+from .codec import open_dump
 from .version import guard
 
+_CHUNK = 1024 * 1024
 _NO_CLIENT = "ERROR: neither 'mariadb' nor 'mysql' found in container."
 
 
@@ -41,7 +47,15 @@ def restore_mariadb_sql(
     sql_path: str,
     empty: bool,
     check_version: bool = True,
+    checksum: dict | None = None,
 ) -> None:
+    """Replay a dump of *db_name* through the container's client.
+
+    With the dump's *checksum* from the manifest, the dump is first copied to
+    a spooled temporary file and checked on the way, so a mismatch is
+    refused before any table is dropped; without one it streams straight in.
+    A chunk recipe is always spooled, since the client needs a file to read.
+    """
     client = _pick_client(container)
 
     if not Path(sql_path).is_file():
@@ -57,48 +71,58 @@ def restore_mariadb_sql(
             client=client,
         )
 
-    if empty:
-        # Do not hardcode 'mysql': MariaDB 11 images may not ship that binary.
-        result = docker_exec(
-            container,
-            [
-                client,
-                "-u",
-                user,
-                f"--password={password}",
-                "-N",
-                "-e",
-                f"SELECT table_name FROM information_schema.tables WHERE table_schema = '{db_name}';",  # noqa: S608 - validate_database() constrains the name to ^[a-zA-Z0-9_][a-zA-Z0-9_-]*$
-            ],
-            capture=True,
-        )
-        tables = result.stdout.decode().split()
-
-        if tables:
-            # SET FOREIGN_KEY_CHECKS is session-scoped, so it must share one
-            # client session with the DROPs or FK constraints still fire.
-            drop_sql = (
-                "SET FOREIGN_KEY_CHECKS=0; "
-                + " ".join(
-                    f"DROP TABLE IF EXISTS `{db_name}`.`{tbl}`;" for tbl in tables
-                )
-                + " SET FOREIGN_KEY_CHECKS=1;"
-            )
-            docker_exec(
+    with ExitStack() as stack:
+        if checksum is None and not is_recipe(sql_path):
+            src = stack.enter_context(open_dump(sql_path))
+        else:
+            src = stack.enter_context(tempfile.TemporaryFile())
+            with open_dump(sql_path, checksum) as verified:
+                shutil.copyfileobj(verified, src, _CHUNK)
+            src.seek(0)
+
+        if empty:
+            # Do not hardcode 'mysql': MariaDB 11 images may not ship that binary.
+            result = docker_exec(
                 container,
                 [
                     client,
                     "-u",
                     user,
                     f"--password={password}",
+                    "-N",
                     "-e",
-                    drop_sql,
+                    f"SELECT table_name FROM information_schema.tables WHERE table_schema = '{db_name}';",  # noqa: S608 - validate_database() constrains the name to ^[a-zA-Z0-9_][a-zA-Z0-9_-]*$
                 ],
+                capture=True,
             )
+            tables = result.stdout.decode().split()
+
+            if tables:
+                # SET FOREIGN_KEY_CHECKS is session-scoped, so it must share one
+                # client session with the DROPs or FK constraints still fire.
+                drop_sql = (
+                    "SET FOREIGN_KEY_CHECKS=0; "
+                    + " ".join(
+                        f"DROP TABLE IF EXISTS `{db_name}`.`{tbl}`;" for tbl in tables
+                    )
+                    + " SET FOREIGN_KEY_CHECKS=1;"
+                )
+                docker_exec(
+                    container,
+                    [
+                        client,
+                        "-u",
+                        user,
+                        f"--password={password}",
+                        "-e",
+                        drop_sql,
+                    ],
+                )
 
-    with Path(sql_path).open("rb") as f:
         docker_exec(
-            container, [client, "-u", user, f"--password={password}", db_name], stdin=f
+            container,
+            [client, "-u", user, f"--password={password}", db_name],
+            stdin=src,
         )
 
     print(f"MariaDB/MySQL restore complete for db '{db_name}'.")
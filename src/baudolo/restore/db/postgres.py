@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import subprocess
 import tempfile
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 from baudolo.restore.run import docker_exec
 
+from .codec import open_dump
 from .version import guard
 
 if TYPE_CHECKING:
@@ -14,6 +16,20 @@ if TYPE_CHECKING:
 _SUPERUSER_ONLY_PREFIXES = (b"COMMENT ON EXTENSION", b"ALTER DEFAULT PRIVILEGES")
 _EMPTY_PRECLEAN_SQL = Path(__file__).parent / "empty_preclean.sql"
 
+# Runs inside the container, fed a pg_dump directory as tar on stdin. The TOC
+# entries matching the superuser-only statements the SQL path filters are
+# left out of the restore list. Jobs, user and database are positional
+# parameters, never spliced into the script. The unpacked dump stays in a
+# scratch directory until pg_restore is done, removed on any exit or signal.
+_DIRECTORY_RESTORE = (
+    "set -e; d=$(mktemp -d); trap 'rm -rf \"$d\"' EXIT; trap 'exit 1' HUP INT TERM; "
+    'mkdir "$d/dump"; tar -xf - -C "$d/dump"; '
+    'pg_restore -l "$d/dump" '
+    "| grep -v -e ' COMMENT - EXTENSION ' -e ' DEFAULT ACL ' > \"$d/list\"; "
+    'pg_restore -j "$1" -L "$d/list" --exit-on-error --no-owner '
+    '--no-privileges -U "$2" -d "$3" "$d/dump"'
+)
+
 
 def filter_superuser_only_lines(lines: Iterable[bytes]) -> Iterator[bytes]:
     """Drop superuser-only statements an app-level psql replay cannot run.
@@ -52,8 +68,21 @@ def restore_postgres_sql(
     sql_path: str,
     empty: bool,
     check_version: bool = True,
+    jobs: int = 4,
+    checksum: dict | None = None,
 ) -> None:
-    if not Path(sql_path).is_file():
+    """Replay a dump of *db_name*: plain SQL through psql, a directory dump
+    through ``pg_restore -j jobs``.
+
+    A plain dump replays in one transaction. ``pg_restore`` cannot combine
+    that with parallel jobs, so a directory dump stops at its first error
+    instead, and a failed restore leaves the tables it already loaded.
+
+    *checksum* is the dump's entry in the manifest; a plain dump that does
+    not match it is refused before anything is dropped.
+    """
+    directory = Path(sql_path).is_dir()
+    if not directory and not Path(sql_path).is_file():
         raise FileNotFoundError(sql_path)
 
     if check_version:
@@ -67,37 +96,69 @@ def restore_postgres_sql(
 
     docker_env = {"PGPASSWORD": password}
 
-    if empty:
-        with _EMPTY_PRECLEAN_SQL.open(encoding="utf-8") as preclean:
-            drop_sql = preclean.read()
-        docker_exec(
-            container,
-            ["psql", "-v", "ON_ERROR_STOP=1", "-U", user, "-d", db_name],
-            stdin=drop_sql.encode(),
-            docker_env=docker_env,
-        )
-
     # Filter into a spooled temp file instead of building the whole dump in
     # memory: production dumps reach many GB and the previous read/splitlines/
-    # join needed roughly three times the dump size in RSS.
-    with Path(sql_path).open("rb") as src, tempfile.TemporaryFile() as filtered:
-        for line in filter_superuser_only_lines(src):
-            filtered.write(line)
-        filtered.seek(0)
+    # join needed roughly three times the dump size in RSS. The dump is read,
+    # and checked against its digest, before the pre-clean drops anything.
+    with tempfile.TemporaryFile() as filtered:
+        if not directory:
+            with open_dump(sql_path, checksum) as src:
+                for line in filter_superuser_only_lines(src):
+                    filtered.write(line)
+            filtered.seek(0)
+
+        if empty:
+            with _EMPTY_PRECLEAN_SQL.open(encoding="utf-8") as preclean:
+                drop_sql = preclean.read()
+            docker_exec(
+                container,
+                ["psql", "-v", "ON_ERROR_STOP=1", "-U", user, "-d", db_name],
+                stdin=drop_sql.encode(),
+                docker_env=docker_env,
+            )
+
+        if directory:
+            _restore_directory(container, db_name, user, sql_path, jobs, docker_env)
+        else:
+            docker_exec(
+                container,
+                [
+                    "psql",
+                    "--single-transaction",
+                    "-v",
+                    "ON_ERROR_STOP=1",
+                    "-U",
+                    user,
+                    "-d",
+                    db_name,
+                ],
+                stdin=filtered,
+                docker_env=docker_env,
+            )
+
+    print(f"PostgreSQL restore complete for db '{db_name}'.")
+
+
+def _restore_directory(
+    container: str,
+    db_name: str,
+    user: str,
+    dump_dir: str,
+    jobs: int,
+    docker_env: dict[str, str],
+) -> None:
+    """Stream *dump_dir* into the container as tar and pg_restore it there."""
+    archive = ["tar", "-C", dump_dir, "-cf", "-", "."]
+    tar = subprocess.Popen(archive, stdout=subprocess.PIPE)
+    try:
         docker_exec(
             container,
-            [
-                "psql",
-                "--single-transaction",
-                "-v",
-                "ON_ERROR_STOP=1",
-                "-U",
-                user,
-                "-d",
-                db_name,
-            ],
-            stdin=filtered,
+            ["sh", "-c", _DIRECTORY_RESTORE, "sh", str(jobs), user, db_name],
+            stdin=tar.stdout,
             docker_env=docker_env,
         )
-
-    print(f"PostgreSQL restore complete for db '{db_name}'.")
+    finally:
+        tar.stdout.close()
+        returncode = tar.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, archive)
@@ -19,6 +19,15 @@ with the cluster banner and the roles section, and the first
 ``-- Dumped from database version`` belongs to the first database's embedded
 ``pg_dump`` output, arbitrarily far down. Hence the scan runs to
 ``SCAN_LINES`` rather than to a header-sized handful.
+
+A compressed dump is read through its decompressor, which is stopped as soon
+as the version line is found.
+
+A dump in pg_dump's directory format carries no SQL header at all. Its
+``toc.dat`` opens with the archive header instead, which records the server
+version the dump was taken from as a length-prefixed string after the
+archive's own version, its integer width, its creation time and the database
+name; ``archive_version`` walks those fields.
 """
 
 from __future__ import annotations
@@ -28,6 +37,8 @@ from pathlib import Path
 
 from baudolo.restore.run import docker_exec, stdout_of
 
+from .codec import open_dump
+
 SCAN_LINES = 2000
 DUMP_VERSION = {
     "postgres": re.compile(r"^-- Dumped from database version (\S+)"),
@@ -35,10 +46,50 @@ DUMP_VERSION = {
 }
 
 
+TOC_FILE = "toc.dat"
+_ARCHIVE_MAGIC = b"PGDMP"
+# Archive versions 1.10 and later record the server version; 1.15 stores the
+# compression as a single byte where earlier ones wrote an integer.
+_REMOTE_VERSION_SINCE = (1, 10)
+_BYTE_COMPRESSION_SINCE = (1, 15)
+
+
 class VersionMismatchError(Exception):
     """The dump cannot be replayed into this engine."""
 
 
+class _ArchiveReader:
+    """pg_dump's archive primitives, read off the front of a ``toc.dat``."""
+
+    def __init__(self, data: bytes, source: str) -> None:
+        self.data = data
+        self.source = source
+        self.offset = 0
+        self.int_size = 4
+
+    def take(self, count: int) -> bytes:
+        if self.offset + count > len(self.data):
+            raise VersionMismatchError(f"{self.source} ends inside its header")
+        chunk = self.data[self.offset : self.offset + count]
+        self.offset += count
+        return chunk
+
+    def byte(self) -> int:
+        return self.take(1)[0]
+
+    def integer(self) -> int:
+        """A sign byte, then ``int_size`` bytes of magnitude, low byte first."""
+        negative = self.byte()
+        value = int.from_bytes(self.take(self.int_size), "little")
+        return -value if negative else value
+
+    def string(self) -> str | None:
+        length = self.integer()
+        if length < 0:
+            return None
+        return self.take(length).decode("utf-8", "replace")
+
+
 def major_of(version: str) -> int:
     """The major number of an engine version string.
 
@@ -55,11 +106,55 @@ def major_of(version: str) -> int:
     return int(leading.group(1))
 
 
+def archive_version(dump_dir: str) -> str:
+    """Read the server version a directory-format dump was taken from.
+
+    Args:
+        dump_dir: the pg_dump directory, holding ``toc.dat``.
+
+    Returns:
+        The version string as the server spelled it, e.g. ``17.2 (Debian ...)``.
+
+    Raises:
+        VersionMismatchError: the TOC is no pg_dump archive, or one too old to
+            record the version.
+    """
+    toc = Path(dump_dir) / TOC_FILE
+    # The fields ahead of the version are a few dozen bytes; names are short.
+    with toc.open("rb") as handle:
+        reader = _ArchiveReader(handle.read(64 * 1024), str(toc))
+    if reader.take(len(_ARCHIVE_MAGIC)) != _ARCHIVE_MAGIC:
+        raise VersionMismatchError(f"{toc} is no pg_dump archive")
+    version = (reader.byte(), reader.byte())
+    if version > (1, 0):
+        version = (*version, reader.byte())
+    if version[:2] < _REMOTE_VERSION_SINCE:
+        raise VersionMismatchError(
+            f"{toc} is archive version {'.'.join(map(str, version))}, "
+            "which does not record the server version"
+        )
+    reader.int_size = reader.byte()
+    reader.byte()  # offset size
+    reader.byte()  # archive format
+    if version[:2] >= _BYTE_COMPRESSION_SINCE:
+        reader.byte()
+    else:
+        reader.integer()
+    for _ in range(7):  # creation time: sec, min, hour, mday, mon, year, isdst
+        reader.integer()
+    reader.string()  # database name
+    dumped = reader.string()
+    if not dumped:
+        raise VersionMismatchError(f"{toc} records no server version")
+    return dumped
+
+
 def dump_version(sql_path: str, engine: str) -> str:
     """Read the engine version a dump was taken from, out of its own header.
 
     Args:
-        sql_path: the dump to read.
+        sql_path: the dump to read; a Postgres directory dump is read through
+            ``archive_version``.
         engine: ``postgres`` or ``mariadb``.
 
     Returns:
@@ -68,13 +163,15 @@ def dump_version(sql_path: str, engine: str) -> str:
     Raises:
         VersionMismatchError: no version line within the first ``SCAN_LINES``.
     """
+    if engine == "postgres" and Path(sql_path).is_dir():
+        return archive_version(sql_path)
     pattern = DUMP_VERSION[engine]
-    with Path(sql_path).open(encoding="utf-8", errors="replace") as handle:
+    with open_dump(sql_path) as handle:
         for _ in range(SCAN_LINES):
-            line = handle.readline()
-            if not line:
+            raw = handle.readline()
+            if not raw:
                 break
-            found = pattern.search(line)
+            found = pattern.search(raw.decode("utf-8", "replace"))
             if found:
                 return found.group(1)
     raise VersionMismatchError(
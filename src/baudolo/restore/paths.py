@@ -1,9 +1,18 @@
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass
 from pathlib import Path
 
-from baudolo.generation import CLUSTER_SUFFIX, DUMP_SUFFIX, FILES_DIR, SQL_DIR
+from baudolo.generation import (
+    CLUSTER_SUFFIX,
+    DIRECTORY_SUFFIX,
+    DUMP_SUFFIX,
+    FILES_DIR,
+    MANIFEST_FILE,
+    RECIPE_SUFFIX,
+    SQL_DIR,
+)
 
 
 @dataclass(frozen=True)
@@ -27,9 +36,57 @@ class BackupPaths:
     def files_dir(self) -> str:
         return str(Path(self.root()) / FILES_DIR)
 
+    def manifest(self) -> dict:
+        """The generation's manifest, empty for one written before manifests."""
+        path = Path(self.root()).parent / MANIFEST_FILE
+        try:
+            document = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return document if isinstance(document, dict) else {}
+
+    def dump_file(self, file_name: str, *, compressed: bool = True) -> str:
+        """Where the generation keeps *file_name* for this volume.
+
+        Unless *compressed* is False, the run's codec suffix, as its manifest
+        records it, is appended - or the recipe suffix, if the run kept its
+        dumps in the chunk store. A database is dumped once per run, into the
+        volume its engine keeps its data in; the instance's other volumes
+        only reference it in the manifest. A dump missing here is therefore
+        looked up there.
+        """
+        manifest = self.manifest()
+        layout = manifest.get("layout") or {}
+        if compressed and layout.get("dump_store") == "chunks":
+            file_name += layout.get("recipe_suffix", RECIPE_SUFFIX)
+        elif compressed:
+            file_name += layout.get("compression_suffix", "")
+        root = Path(self.root())
+        local = root / SQL_DIR / file_name
+        if local.exists():
+            return str(local)
+        volume = (manifest.get("volumes") or {}).get(self.volume_name) or {}
+        held_in = (volume.get("dump_refs") or {}).get(file_name)
+        if not held_in:
+            return str(local)
+        return str(root.parent / held_in / SQL_DIR / file_name)
+
+    def checksum(self, dump_path: str) -> dict | None:
+        """The manifest's digest of the dump at *dump_path*, if it has one."""
+        generation = Path(self.root()).parent
+        try:
+            key = Path(dump_path).relative_to(generation).as_posix()
+        except ValueError:
+            return None
+        return (self.manifest().get("dumps") or {}).get(key)
+
     def sql_file(self, db_name: str) -> str:
-        return str(Path(self.root()) / SQL_DIR / f"{db_name}{DUMP_SUFFIX}")
+        """The database's dump: a pg_dump directory if one was taken, else SQL."""
+        directory = self.dump_file(f"{db_name}{DIRECTORY_SUFFIX}", compressed=False)
+        if Path(directory).is_dir():
+            return directory
+        return self.dump_file(f"{db_name}{DUMP_SUFFIX}")
 
     def cluster_file(self, instance: str) -> str:
         """The pg_dumpall stream a `database = '*'` row produces."""
-        return str(Path(self.root()) / SQL_DIR / f"{instance}{CLUSTER_SUFFIX}")
+        return self.dump_file(f"{instance}{CLUSTER_SUFFIX}")
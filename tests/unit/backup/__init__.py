@@ -1,4 +1,8 @@
-"""The smallest argv the backup CLI accepts, shared by every test that drives it."""
+"""What every test that drives the backup CLI shares: the smallest argv it
+accepts, and an inventory standing in for the daemon."""
+
+from baudolo.backup.docker import ContainerInfo
+from baudolo.backup.inventory import Inventory
 
 REQUIRED_PAIRS = [
     ("--compose-dir", "/compose"),
@@ -8,3 +12,15 @@ REQUIRED_PAIRS = [
 ]
 REQUIRED = [arg for pair in REQUIRED_PAIRS for arg in pair]
 BASE_ARGV = ["baudolo", *REQUIRED]
+
+
+def inventory(volumes: dict[str, list[str]]) -> Inventory:
+    """An inventory in which each volume is mounted by the named containers."""
+    mounts: dict[str, dict[str, str]] = {}
+    for volume, containers in volumes.items():
+        for container in containers:
+            mounts.setdefault(container, {})[volume] = f"/mnt/{volume}"
+    return Inventory.of(
+        ContainerInfo(name, f"{name}:latest", f"sha256:{name}", mounts=paths)
+        for name, paths in mounts.items()
+    )
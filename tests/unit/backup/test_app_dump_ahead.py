@@ -0,0 +1,104 @@
+"""Contract of --dump-ahead: the next volumes' dumps overlap the current copy."""
+
+from __future__ import annotations
+
+import threading
+import unittest
+from unittest import mock
+
+from baudolo.backup import app
+from baudolo.backup.dumps import VolumeOutcome
+from baudolo.backup.volume import Backing
+
+from . import BASE_ARGV, inventory
+
+
+def drive(*extra: str) -> tuple[list[tuple[str, str]], bool]:
+    """Back up two independent volumes; "data" is copied while "conf" dumps.
+
+    Returns:
+        The events in order, and whether the dump of "conf" started while
+        "data" was being copied.
+    """
+    events: list[tuple[str, str]] = []
+    lock = threading.Lock()
+    conf_dumping = threading.Event()
+
+    def dump(*, containers, vol_dir, **_):
+        volume = vol_dir.rsplit("/", 1)[-1]
+        with lock:
+            events.append(("dump", volume))
+        if volume == "conf":
+            conf_dumping.set()
+        return VolumeOutcome(database=False, dumped=False)
+
+    overlapped = []
+
+    def copy(
+        versions_dir,
+        volume_name,
+        volume_dir,
+        *,
+        authoritative,
+        source,
+        **_options,
+    ):
+        if volume_name == "data" and not authoritative:
+            overlapped.append(conf_dumping.wait(0.5))
+        with lock:
+            events.append(("auth" if authoritative else "live", volume_name))
+
+    with (
+        mock.patch("sys.argv", [*BASE_ARGV, *extra]),
+        mock.patch.object(app, "get_machine_id", return_value="machine"),
+        mock.patch.object(app, "create_version_directory", return_value="/gen"),
+        mock.patch.object(
+            app, "create_volume_directory", side_effect=lambda _, v: f"/gen/{v}"
+        ),
+        mock.patch.object(app, "load_databases_df", return_value=None),
+        mock.patch.object(app, "load_engine_cache"),
+        mock.patch.object(app, "save_engine_cache"),
+        mock.patch.object(app, "docker_volume_names", return_value=["data", "conf"]),
+        mock.patch.object(
+            app,
+            "take_inventory",
+            return_value=inventory({"data": ["db"], "conf": ["web"]}),
+        ),
+        mock.patch.object(app, "volume_is_fully_ignored", return_value=False),
+        mock.patch.object(app, "backup_dumps_for_volume", side_effect=dump),
+        mock.patch.object(app, "inspect_backing", return_value=Backing("/data")),
+        mock.patch.object(app, "write_manifest"),
+        mock.patch.object(app, "stamp_directory"),
+        mock.patch.object(app, "handle_docker_compose_services"),
+        mock.patch.object(app, "backup_volume", side_effect=copy),
+        mock.patch.object(app, "filter_stoppable", side_effect=list),
+        mock.patch.object(app, "requires_stop", return_value=True),
+        mock.patch.object(app, "change_containers_status"),
+    ):
+        app.main()
+    return events, overlapped[0]
+
+
+class TestDumpAhead(unittest.TestCase):
+    def test_by_default_the_next_dump_waits_for_the_copy(self) -> None:
+        events, overlapped = drive()
+        self.assertFalse(overlapped)
+        self.assertLess(events.index(("auth", "data")), events.index(("dump", "conf")))
+
+    def test_the_next_volume_is_dumped_during_the_current_copy(self) -> None:
+        _, overlapped = drive("--dump-ahead", "1")
+        self.assertTrue(overlapped)
+
+    def test_every_volume_is_dumped_before_it_is_copied(self) -> None:
+        for window in ("group", "run"):
+            with self.subTest(window=window):
+                events, _ = drive("--dump-ahead", "2", "--stop-window", window)
+                for volume in ("data", "conf"):
+                    self.assertLess(
+                        events.index(("dump", volume)),
+                        events.index(("live", volume)),
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,7 +9,7 @@ from baudolo.backup import app
 from baudolo.backup.dumps import VolumeOutcome
 from baudolo.backup.volume import Backing
 
-from . import REQUIRED_PAIRS
+from . import REQUIRED_PAIRS, inventory
 
 ARGV = ["baudolo", *[arg for pair in REQUIRED_PAIRS for arg in pair]]
 
@@ -27,8 +27,12 @@ def drive(argv: list[str], dump_result: VolumeOutcome) -> dict:
         mock.patch.object(app, "create_version_directory", return_value="/gen"),
         mock.patch.object(app, "create_volume_directory", return_value="/gen/vol"),
         mock.patch.object(app, "load_databases_df", return_value=None),
+        mock.patch.object(app, "load_engine_cache"),
+        mock.patch.object(app, "save_engine_cache"),
         mock.patch.object(app, "docker_volume_names", return_value=["pgdata"]),
-        mock.patch.object(app, "containers_using_volume", return_value=["db"]),
+        mock.patch.object(
+            app, "take_inventory", return_value=inventory({"pgdata": ["db"]})
+        ),
         mock.patch.object(app, "volume_is_fully_ignored", return_value=False),
         mock.patch.object(app, "backup_dumps_for_volume", return_value=dump_result),
         mock.patch.object(app, "inspect_backing", return_value=Backing("/data")),
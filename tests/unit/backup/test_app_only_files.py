@@ -8,7 +8,7 @@ from unittest import mock
 from baudolo.backup import app
 from baudolo.backup.volume import Backing
 
-from . import REQUIRED_PAIRS
+from . import REQUIRED_PAIRS, inventory
 
 ARGV_WITHOUT_CSV = [
     "baudolo",
@@ -20,7 +20,15 @@ ARGV_WITHOUT_CSV = [
 def drive(argv: list[str]) -> tuple[list[str], list, list]:
     backed_up: list[str] = []
 
-    def record_backup(versions_dir, volume_name, volume_dir, *, authoritative, source):
+    def record_backup(
+        versions_dir,
+        volume_name,
+        volume_dir,
+        *,
+        authoritative,
+        source,
+        **_options,
+    ):
         backed_up.append(volume_name)
 
     with (
@@ -29,8 +37,12 @@ def drive(argv: list[str]) -> tuple[list[str], list, list]:
         mock.patch.object(app, "create_version_directory", return_value="/gen"),
         mock.patch.object(app, "create_volume_directory", return_value="/gen/vol"),
         mock.patch.object(app, "load_databases_df") as load_csv,
+        mock.patch.object(app, "load_engine_cache"),
+        mock.patch.object(app, "save_engine_cache"),
         mock.patch.object(app, "docker_volume_names", return_value=["pgdata"]),
-        mock.patch.object(app, "containers_using_volume", return_value=["db"]),
+        mock.patch.object(
+            app, "take_inventory", return_value=inventory({"pgdata": ["db"]})
+        ),
         mock.patch.object(app, "volume_is_fully_ignored", return_value=False),
         mock.patch.object(app, "backup_dumps_for_volume") as dumps,
         mock.patch.object(app, "inspect_backing", return_value=Backing("/data")),
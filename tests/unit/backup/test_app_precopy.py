@@ -0,0 +1,127 @@
+"""Contract of --precopy-rounds: live passes until the delta converges."""
+
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+from baudolo.backup import app
+from baudolo.backup.dumps import VolumeOutcome
+from baudolo.backup.volume import Backing, CopyStats, Precopy
+
+from . import BASE_ARGV, inventory
+
+
+def drive(deltas: list[CopyStats | None], *extra: str, stop: bool = True):
+    """Back up one volume whose live passes transfer *deltas* in turn.
+
+    Returns:
+        The passes in order ("live"/"auth") and the outcomes handed to the
+        manifest.
+    """
+    passes: list[str] = []
+    remaining = iter(deltas)
+
+    def copy(
+        versions_dir,
+        volume_name,
+        volume_dir,
+        *,
+        authoritative,
+        source,
+        **_options,
+    ):
+        passes.append("auth" if authoritative else "live")
+        return None if authoritative else next(remaining)
+
+    with (
+        mock.patch("sys.argv", [*BASE_ARGV, *extra]),
+        mock.patch.object(app, "get_machine_id", return_value="machine"),
+        mock.patch.object(app, "create_version_directory", return_value="/gen"),
+        mock.patch.object(app, "create_volume_directory", return_value="/gen/vol"),
+        mock.patch.object(app, "load_databases_df", return_value=None),
+        mock.patch.object(app, "load_engine_cache"),
+        mock.patch.object(app, "save_engine_cache"),
+        mock.patch.object(app, "docker_volume_names", return_value=["data"]),
+        mock.patch.object(
+            app, "take_inventory", return_value=inventory({"data": ["db"]})
+        ),
+        mock.patch.object(app, "volume_is_fully_ignored", return_value=False),
+        mock.patch.object(
+            app,
+            "backup_dumps_for_volume",
+            return_value=VolumeOutcome(database=False, dumped=False),
+        ),
+        mock.patch.object(app, "inspect_backing", return_value=Backing("/data")),
+        mock.patch.object(app, "write_manifest") as manifest,
+        mock.patch.object(app, "stamp_directory"),
+        mock.patch.object(app, "handle_docker_compose_services"),
+        mock.patch.object(app, "backup_volume", side_effect=copy),
+        mock.patch.object(app, "filter_stoppable", side_effect=list),
+        mock.patch.object(app, "requires_stop", return_value=stop),
+        mock.patch.object(app, "change_containers_status"),
+    ):
+        app.main()
+    return passes, manifest.call_args[0][1]
+
+
+class TestPrecopy(unittest.TestCase):
+    def test_one_live_pass_is_the_default(self) -> None:
+        passes, outcomes = drive([CopyStats(40, 4000)])
+        self.assertEqual(passes, ["live", "auth"])
+        self.assertEqual(outcomes["data"].precopy, Precopy(1, 40, 4000))
+
+    def test_it_repeats_while_the_delta_shrinks(self) -> None:
+        passes, outcomes = drive(
+            [CopyStats(40, 4000), CopyStats(5, 500), CopyStats(1, 10), CopyStats(0, 0)],
+            "--precopy-rounds",
+            "5",
+        )
+        self.assertEqual(passes, ["live", "live", "live", "live", "auth"])
+        self.assertEqual(outcomes["data"].precopy.rounds, 4)
+
+    def test_it_stops_once_the_delta_is_under_a_threshold(self) -> None:
+        passes, outcomes = drive(
+            [CopyStats(40, 4000), CopyStats(5, 500), CopyStats(1, 10)],
+            "--precopy-rounds",
+            "5",
+            "--precopy-bytes",
+            "600",
+        )
+        self.assertEqual(passes, ["live", "live", "auth"])
+        self.assertEqual(outcomes["data"].precopy, Precopy(2, 5, 500))
+
+    def test_an_empty_pass_has_converged(self) -> None:
+        passes, _ = drive(
+            [CopyStats(40, 4000), CopyStats(0, 0)], "--precopy-rounds", "5"
+        )
+        self.assertEqual(passes, ["live", "live", "auth"])
+
+    def test_a_delta_that_stops_shrinking_ends_the_pre_copy(self) -> None:
+        passes, outcomes = drive(
+            [CopyStats(3, 900), CopyStats(3, 950)], "--precopy-rounds", "5"
+        )
+        self.assertEqual(passes, ["live", "live", "auth"])
+        self.assertEqual(outcomes["data"].precopy, Precopy(2, 3, 950))
+
+    def test_it_stops_at_the_round_limit(self) -> None:
+        passes, _ = drive(
+            [CopyStats(n, n * 100) for n in range(50, 0, -1)], "--precopy-rounds", "3"
+        )
+        self.assertEqual(passes, ["live", "live", "live", "auth"])
+
+    def test_a_pass_without_stats_ends_the_pre_copy(self) -> None:
+        passes, outcomes = drive([None], "--precopy-rounds", "5")
+        self.assertEqual(passes, ["live", "auth"])
+        self.assertEqual(outcomes["data"].precopy, Precopy(1, None, None))
+
+    def test_a_volume_copied_without_a_stop_is_copied_once(self) -> None:
+        passes, outcomes = drive(
+            [CopyStats(40, 4000)], "--precopy-rounds", "5", stop=False
+        )
+        self.assertEqual(passes, ["live"])
+        self.assertIsNone(outcomes["data"].precopy)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,7 +10,7 @@ from baudolo.backup import snapshot as snapshot_mod
 from baudolo.backup.snapshot import volume_snapshot
 from baudolo.backup.volume import Backing
 
-from . import BASE_ARGV
+from . import BASE_ARGV, inventory
 
 
 def stubbed_snapshot(kind: str, subject: str, tag: str):
@@ -29,7 +29,15 @@ ARGV = [
 def drive(*, present: bool = True, reason: str | None = None) -> list[dict]:
     calls: list[dict] = []
 
-    def record(versions_dir, volume_name, volume_dir, *, authoritative, source):
+    def record(
+        versions_dir,
+        volume_name,
+        volume_dir,
+        *,
+        authoritative,
+        source,
+        **_options,
+    ):
         calls.append(
             {"volume": volume_name, "authoritative": authoritative, "source": source}
         )
@@ -40,8 +48,10 @@ def drive(*, present: bool = True, reason: str | None = None) -> list[dict]:
         mock.patch.object(app, "create_version_directory", return_value="/gen"),
         mock.patch.object(app, "create_volume_directory", return_value="/gen/vol"),
         mock.patch.object(app, "load_databases_df", return_value=None),
+        mock.patch.object(app, "load_engine_cache"),
+        mock.patch.object(app, "save_engine_cache"),
         mock.patch.object(app, "docker_volume_names", return_value=["vol"]),
-        mock.patch.object(app, "containers_using_volume", return_value=[]),
+        mock.patch.object(app, "take_inventory", return_value=inventory({"vol": []})),
         mock.patch.object(app, "volume_is_fully_ignored", return_value=False),
         mock.patch.object(app, "backup_dumps_for_volume", return_value=(False, False)),
         mock.patch.object(
@@ -0,0 +1,227 @@
+"""Contract of --stop-window: how often a shared container is cycled."""
+
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+from baudolo.backup import app, policy
+from baudolo.backup.dumps import VolumeOutcome
+from baudolo.backup.shell import BackupError
+from baudolo.backup.volume import Backing
+
+from . import BASE_ARGV, inventory
+
+
+def drive(*extra: str, shared: bool = True, fail: str | None = None) -> list[tuple]:
+    """Back up two volumes and return what happened, in order.
+
+    Args:
+        shared: both volumes belong to one container, else one each.
+        fail: the volume whose authoritative pass raises; the run's failure
+            is then the last event.
+    """
+    events: list[tuple] = []
+
+    def record_copy(
+        versions_dir,
+        volume_name,
+        volume_dir,
+        *,
+        authoritative,
+        source,
+        **_options,
+    ):
+        events.append(("auth" if authoritative else "live", volume_name))
+        if authoritative and volume_name == fail:
+            raise BackupError("Exit code: 23")
+
+    def record_status(containers, status):
+        events.append((status, *containers))
+
+    with (
+        mock.patch("sys.argv", [*BASE_ARGV, *extra]),
+        mock.patch.object(app, "get_machine_id", return_value="machine"),
+        mock.patch.object(app, "create_version_directory", return_value="/gen"),
+        mock.patch.object(app, "create_volume_directory", return_value="/gen/vol"),
+        mock.patch.object(app, "load_databases_df", return_value=None),
+        mock.patch.object(app, "load_engine_cache"),
+        mock.patch.object(app, "save_engine_cache"),
+        mock.patch.object(app, "docker_volume_names", return_value=["data", "conf"]),
+        mock.patch.object(
+            app,
+            "take_inventory",
+            return_value=inventory(
+                {"data": ["app"], "conf": ["app"]}
+                if shared
+                else {"data": ["db"], "conf": ["web"]}
+            ),
+        ),
+        mock.patch.object(app, "volume_is_fully_ignored", return_value=False),
+        mock.patch.object(
+            app,
+            "backup_dumps_for_volume",
+            return_value=VolumeOutcome(database=False, dumped=False),
+        ),
+        mock.patch.object(app, "inspect_backing", return_value=Backing("/data")),
+        mock.patch.object(app, "write_manifest"),
+        mock.patch.object(app, "stamp_directory"),
+        mock.patch.object(app, "handle_docker_compose_services"),
+        mock.patch.object(app, "backup_volume", side_effect=record_copy),
+        mock.patch.object(app, "filter_stoppable", side_effect=list),
+        mock.patch.object(app, "requires_stop", return_value=True),
+        mock.patch.object(app, "change_containers_status", side_effect=record_status),
+    ):
+        main(events, expect_failure=fail is not None)
+    return events
+
+
+def main(events: list[tuple], *, expect_failure: bool) -> None:
+    try:
+        app.main()
+    except BackupError:
+        if not expect_failure:
+            raise
+        events.append(("failed",))
+
+
+class TestStopWindow(unittest.TestCase):
+    def test_a_shared_container_is_cycled_once_per_group(self) -> None:
+        self.assertEqual(
+            drive(),
+            [
+                ("live", "data"),
+                ("live", "conf"),
+                ("stop", "app"),
+                ("auth", "data"),
+                ("auth", "conf"),
+                ("start", "app"),
+            ],
+        )
+
+    def test_the_volume_window_cycles_it_per_volume(self) -> None:
+        self.assertEqual(
+            drive("--stop-window", "volume"),
+            [
+                ("live", "data"),
+                ("stop", "app"),
+                ("auth", "data"),
+                ("start", "app"),
+                ("live", "conf"),
+                ("stop", "app"),
+                ("auth", "conf"),
+                ("start", "app"),
+            ],
+        )
+
+    def test_independent_groups_get_a_window_each(self) -> None:
+        events = drive(shared=False)
+        self.assertEqual(
+            [event for event in events if event[0] in ("stop", "start")],
+            [("stop", "db"), ("start", "db"), ("stop", "web"), ("start", "web")],
+        )
+
+    def test_the_run_window_stops_everything_at_one_barrier(self) -> None:
+        self.assertEqual(
+            drive("--stop-window", "run", shared=False),
+            [
+                ("live", "data"),
+                ("live", "conf"),
+                ("stop", "db", "web"),
+                ("auth", "data"),
+                ("auth", "conf"),
+                ("start", "db", "web"),
+            ],
+        )
+
+    def test_parallel_authoritative_passes_stay_inside_the_barrier(self) -> None:
+        events = drive("--stop-window", "run", "--jobs", "2", shared=False)
+        self.assertEqual(events[2], ("stop", "db", "web"))
+        self.assertCountEqual(events[3:5], [("auth", "data"), ("auth", "conf")])
+        self.assertEqual(events[5], ("start", "db", "web"))
+
+    def test_a_failing_pass_still_starts_everything_behind_the_barrier(self) -> None:
+        events = drive("--stop-window", "run", shared=False, fail="data")
+        self.assertEqual(events[-2:], [("start", "db", "web"), ("failed",)])
+
+    def test_shutdown_leaves_the_group_stopped(self) -> None:
+        self.assertNotIn(("start", "app"), drive("--shutdown"))
+
+
+class TestFreeze(unittest.TestCase):
+    def images(self):
+        return mock.patch.object(
+            policy, "get_image_info", side_effect=lambda c: f"{c}:latest"
+        )
+
+    def test_the_pause_mode_freezes_instead_of_stopping(self) -> None:
+        with self.images():
+            events = drive("--freeze", "pause")
+        self.assertEqual(
+            events,
+            [
+                ("live", "data"),
+                ("live", "conf"),
+                ("pause", "app"),
+                ("auth", "data"),
+                ("auth", "conf"),
+                ("unpause", "app"),
+            ],
+        )
+
+    def test_an_image_needing_a_flush_is_stopped_first_and_started_last(self) -> None:
+        with self.images():
+            events = drive(
+                "--stop-window",
+                "run",
+                "--freeze",
+                "pause",
+                "--images-flush-required",
+                "db:latest",
+                shared=False,
+            )
+        self.assertEqual(
+            events[2:],
+            [
+                ("stop", "db"),
+                ("pause", "web"),
+                ("auth", "data"),
+                ("auth", "conf"),
+                ("unpause", "web"),
+                ("start", "db"),
+            ],
+        )
+
+    def test_a_failing_pass_unpauses_and_starts_everything(self) -> None:
+        with self.images():
+            events = drive(
+                "--stop-window",
+                "run",
+                "--freeze",
+                "pause",
+                "--images-flush-required",
+                "db:latest",
+                shared=False,
+                fail="data",
+            )
+        self.assertEqual(
+            events[-3:], [("unpause", "web"), ("start", "db"), ("failed",)]
+        )
+
+    def test_a_listed_image_is_paused_in_the_stop_mode(self) -> None:
+        with self.images():
+            events = drive(
+                "--stop-window", "run", "--images-pause", "web:latest", shared=False
+            )
+        self.assertIn(("pause", "web"), events)
+        self.assertIn(("stop", "db"), events)
+
+    def test_shutdown_stops_even_a_listed_image(self) -> None:
+        with self.images():
+            events = drive("--images-pause", "app:latest", "--shutdown")
+        self.assertIn(("stop", "app"), events)
+        self.assertNotIn(("pause", "app"), events)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -23,7 +23,15 @@ def drive() -> tuple[list[str], list[str], list[str]]:
     created: list[str] = []
     inspected: list[str] = []
 
-    def record_backup(versions_dir, volume_name, volume_dir, *, authoritative, source):
+    def record_backup(
+        versions_dir,
+        volume_name,
+        volume_dir,
+        *,
+        authoritative,
+        source,
+        **_options,
+    ):
         backed_up.append(volume_name)
 
     with (
@@ -36,13 +44,17 @@ def drive() -> tuple[list[str], list[str], list[str]]:
             side_effect=lambda _version_dir, name: created.append(name) or "/gen/vol",
         ),
         mock.patch.object(app, "load_databases_df", return_value=None),
+        mock.patch.object(app, "load_engine_cache"),
+        mock.patch.object(app, "save_engine_cache"),
         mock.patch.object(
             app, "docker_volume_names", return_value=["derived", "state"]
         ),
         mock.patch.object(
             app,
-            "containers_using_volume",
-            side_effect=lambda name: inspected.append(name) or ["app"],
+            "take_inventory",
+            return_value=mock.Mock(
+                containers_using=lambda name: inspected.append(name) or ["app"]
+            ),
         ),
         mock.patch.object(app, "volume_is_fully_ignored", return_value=False),
         mock.patch.object(app, "backup_dumps_for_volume", return_value=(False, False)),
@@ -73,7 +85,7 @@ class TestVolumesNoBackupRequired(unittest.TestCase):
         _backed_up, created, _inspected = drive()
         self.assertEqual(created, ["state"])
 
-    def test_the_skip_precedes_the_container_inspection(self) -> None:
+    def test_the_skip_precedes_the_container_lookup(self) -> None:
         _backed_up, _created, inspected = drive()
         self.assertEqual(inspected, ["state"])
 
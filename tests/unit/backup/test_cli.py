@@ -79,6 +79,139 @@ class TestRequiredFlags(unittest.TestCase):
                 parse_args()
 
 
+class TestJobs(unittest.TestCase):
+    def test_one_volume_at_a_time_by_default(self) -> None:
+        self.assertEqual(parse().jobs, 1)
+
+    def test_a_pool_size_is_accepted(self) -> None:
+        self.assertEqual(parse("--jobs", "8").jobs, 8)
+
+    def test_zero_workers_are_rejected(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--jobs", "0")
+
+
+class TestDumpJobs(unittest.TestCase):
+    def test_dumps_are_not_capped_and_one_per_container_by_default(self) -> None:
+        args = parse()
+        self.assertEqual((args.dump_jobs, args.dump_jobs_per_container), (None, 1))
+
+    def test_limits_are_accepted(self) -> None:
+        args = parse("--dump-jobs", "6", "--dump-jobs-per-container", "2")
+        self.assertEqual((args.dump_jobs, args.dump_jobs_per_container), (6, 2))
+
+    def test_zero_slots_are_rejected(self) -> None:
+        for flag in ("--dump-jobs", "--dump-jobs-per-container"):
+            with self.subTest(flag=flag), self.assertRaises(SystemExit):
+                parse(flag, "0")
+
+
+class TestPostgresDirectory(unittest.TestCase):
+    def test_no_instance_and_four_jobs_by_default(self) -> None:
+        args = parse()
+        self.assertEqual((args.postgres_directory, args.postgres_jobs), ([], 4))
+
+    def test_instances_are_listed(self) -> None:
+        args = parse("--postgres-directory", "app", "wiki", "--postgres-jobs", "16")
+        self.assertEqual(
+            (args.postgres_directory, args.postgres_jobs), (["app", "wiki"], 16)
+        )
+
+    def test_zero_jobs_are_rejected(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--postgres-jobs", "0")
+
+
+class TestDumpStore(unittest.TestCase):
+    def test_dumps_are_files_by_default(self) -> None:
+        self.assertEqual(parse().dump_store, "files")
+
+    def test_the_chunk_store_cannot_be_compressed_twice(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--dump-store", "chunks", "--dump-compression", "zstd")
+
+
+class TestMariaDBProfile(unittest.TestCase):
+    def test_the_locking_default_keeps_triggers_without_routines(self) -> None:
+        args = parse()
+        self.assertEqual(
+            (args.mariadb_profile, args.mariadb_routines, args.mariadb_skip_triggers),
+            ("lock", False, False),
+        )
+
+    def test_an_unknown_profile_is_rejected(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--mariadb-profile", "myisam")
+
+
+class TestDumpAhead(unittest.TestCase):
+    def test_off_by_default(self) -> None:
+        self.assertEqual(parse().dump_ahead, 0)
+
+    def test_it_is_rejected_with_volume_windows(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--dump-ahead", "2", "--stop-window", "volume")
+
+
+class TestPrecopy(unittest.TestCase):
+    def test_a_single_live_pass_by_default(self) -> None:
+        args = parse()
+        self.assertEqual(
+            (args.precopy_rounds, args.precopy_bytes, args.precopy_files), (1, 0, 0)
+        )
+
+    def test_rounds_and_thresholds_are_accepted(self) -> None:
+        args = parse("--precopy-rounds", "4", "--precopy-bytes", "1048576")
+        self.assertEqual((args.precopy_rounds, args.precopy_bytes), (4, 1048576))
+
+    def test_zero_rounds_are_rejected(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--precopy-rounds", "0")
+
+    def test_a_negative_threshold_is_rejected(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--precopy-files", "-1")
+
+
+class TestAuthoritativeCheck(unittest.TestCase):
+    def test_changes_are_tracked_by_default(self) -> None:
+        self.assertEqual(parse().authoritative_check, "changes")
+
+    def test_the_whole_volume_checksum_stays_available(self) -> None:
+        args = parse("--authoritative-check", "checksum")
+        self.assertEqual(args.authoritative_check, "checksum")
+
+
+class TestCopyEngine(unittest.TestCase):
+    def test_rsync_is_the_default(self) -> None:
+        self.assertEqual(parse().copy_engine, "rsync")
+
+    def test_the_native_engine_can_be_chosen(self) -> None:
+        self.assertEqual(parse("--copy-engine", "native").copy_engine, "native")
+
+    def test_reflink_copies_are_off_by_default(self) -> None:
+        self.assertEqual(parse().reflink, "never")
+
+    def test_reflink_copies_need_the_native_engine(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--reflink", "auto")
+        args = parse("--copy-engine", "native", "--reflink", "auto")
+        self.assertEqual(args.reflink, "auto")
+
+    def test_generations_are_link_trees_by_default(self) -> None:
+        self.assertEqual(parse().generation_store, "links")
+        self.assertEqual(parse("--generation-store", "zfs").generation_store, "zfs")
+
+
+class TestFreeze(unittest.TestCase):
+    def test_containers_are_stopped_by_default(self) -> None:
+        self.assertEqual(parse().freeze, "stop")
+
+    def test_pause_cannot_outlast_a_shutdown(self) -> None:
+        with self.assertRaises(SystemExit):
+            parse("--freeze", "pause", "--shutdown")
+
+
 class TestBackupScope(unittest.TestCase):
     """--only-sql and --only-files name the two halves a generation can hold."""
 
@@ -0,0 +1,258 @@
+"""Contract of the native copy engine: what rsync -a --no-D --delete
+--link-dest would have left in a generation."""
+
+from __future__ import annotations
+
+import errno
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from baudolo.backup import copyengine as mod
+from baudolo.backup import hashcache
+from baudolo.backup.copyengine import copy_tree, link_or_clone, reflink_supported
+from baudolo.backup.shell import BackupError
+
+
+class CopyEngineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        root = Path(tempfile.mkdtemp())
+        self.source = root / "source"
+        self.last = root / "g1"
+        self.dest = root / "g2"
+        self.source.mkdir()
+
+    def put(self, relative: str, data: bytes, *, mtime: int = 1_000_000_000) -> Path:
+        path = self.source / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        os.utime(path, ns=(mtime, mtime))
+        return path
+
+    def copy(self, dest: Path | None = None, **kwargs) -> tuple[int, int]:
+        return copy_tree(str(self.source), str(dest or self.dest), **kwargs)
+
+
+class TestCopy(CopyEngineTest):
+    def test_content_mode_and_mtime_are_kept(self) -> None:
+        path = self.put("a/b/file", b"data", mtime=1_234_567_891_234_567_891)
+        path.chmod(0o640)
+        self.copy()
+        copied = self.dest / "a" / "b" / "file"
+        self.assertEqual(copied.read_bytes(), b"data")
+        self.assertEqual(copied.stat().st_mode & 0o777, 0o640)
+        self.assertEqual(copied.stat().st_mtime_ns, 1_234_567_891_234_567_891)
+
+    def test_directory_metadata_survives_the_files_written_into_it(self) -> None:
+        self.put("dir/file", b"x")
+        (self.source / "dir").chmod(0o750)
+        os.utime(self.source / "dir", ns=(5, 5))
+        self.copy()
+        info = (self.dest / "dir").stat()
+        self.assertEqual((info.st_mode & 0o777, info.st_mtime_ns), (0o750, 5))
+
+    def test_symlinks_are_kept_as_links(self) -> None:
+        (self.source / "link").symlink_to("../elsewhere")
+        self.copy()
+        self.assertEqual((self.dest / "link").readlink(), Path("../elsewhere"))
+
+    def test_kernel_objects_are_skipped(self) -> None:
+        os.mkfifo(self.source / "pipe")
+        self.copy()
+        self.assertFalse((self.dest / "pipe").exists())
+
+    def test_what_the_source_no_longer_has_is_deleted(self) -> None:
+        self.put("kept", b"k")
+        self.dest.mkdir()
+        (self.dest / "stale").write_bytes(b"s")
+        (self.dest / "gone" / "deep").mkdir(parents=True)
+        self.copy()
+        self.assertEqual(sorted(p.name for p in self.dest.iterdir()), ["kept"])
+
+    def test_an_entry_that_changed_type_is_replaced(self) -> None:
+        self.put("entry/inner", b"i")
+        self.dest.mkdir()
+        (self.dest / "entry").write_bytes(b"was a file")
+        self.copy()
+        self.assertEqual((self.dest / "entry" / "inner").read_bytes(), b"i")
+
+    def test_it_counts_what_it_copied(self) -> None:
+        self.put("a", b"123")
+        self.put("b/c", b"4567")
+        self.assertEqual(self.copy(), (2, 7))
+
+    def test_a_vanished_file_is_reported_with_the_run_output(self) -> None:
+        self.put("a", b"1")
+        with (
+            mock.patch.object(mod._Copy, "file", side_effect=FileNotFoundError),
+            mock.patch("sys.stdout", new_callable=io.StringIO) as out,
+            mock.patch("sys.stderr", new_callable=io.StringIO) as err,
+        ):
+            self.copy()
+        self.assertIn("1 file(s) vanished", out.getvalue())
+        self.assertEqual(err.getvalue(), "")
+
+    def test_an_unreadable_directory_fails_the_copy(self) -> None:
+        if os.geteuid() == 0:
+            self.skipTest("root reads every directory")
+        self.put("closed/file", b"x")
+        (self.source / "closed").chmod(0)
+        self.addCleanup((self.source / "closed").chmod, 0o700)
+        with self.assertRaisesRegex(BackupError, "closed"):
+            self.copy()
+
+
+class TestIncremental(CopyEngineTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.put("same", b"unchanged")
+        self.put("edited", b"before")
+        self.copy(self.last)
+
+    def test_an_unchanged_file_is_linked_from_the_last_generation(self) -> None:
+        self.assertEqual(self.copy(link_dest=str(self.last)), (0, 0))
+        self.assertTrue((self.dest / "same").samefile(self.last / "same"))
+
+    def test_a_changed_file_is_copied_and_the_earlier_one_left_alone(self) -> None:
+        self.put("edited", b"after!", mtime=2_000_000_000)
+        self.assertEqual(self.copy(link_dest=str(self.last)), (1, 6))
+        self.assertFalse((self.dest / "edited").samefile(self.last / "edited"))
+        self.assertEqual((self.last / "edited").read_bytes(), b"before")
+
+    def test_a_mode_change_is_not_linked(self) -> None:
+        (self.source / "same").chmod(0o600)
+        self.copy(link_dest=str(self.last))
+        self.assertFalse((self.dest / "same").samefile(self.last / "same"))
+        self.assertNotEqual((self.last / "same").stat().st_mode & 0o777, 0o600)
+
+    def test_another_owner_is_linked_when_no_copy_could_take_it_over(
+        self,
+    ) -> None:
+        info = (self.source / "same").stat()
+        other = os.stat_result(
+            (info.st_mode, 0, 0, 1, info.st_uid + 1, info.st_gid + 1, 0, 0, 0, 0)
+        )
+        with mock.patch.object(mod.os, "geteuid", return_value=1000):
+            self.assertTrue(mod._same_attributes(info, other))
+        with mock.patch.object(mod.os, "geteuid", return_value=0):
+            self.assertFalse(mod._same_attributes(info, other))
+
+    def test_a_rewrite_in_place_is_copied_over_a_shared_inode(self) -> None:
+        self.copy(link_dest=str(self.last))
+        self.put("same", b"rewritten", mtime=3_000_000_000)
+        self.copy(link_dest=str(self.last))
+        self.assertEqual((self.dest / "same").read_bytes(), b"rewritten")
+        self.assertEqual((self.last / "same").read_bytes(), b"unchanged")
+
+    def test_the_quick_check_misses_what_checksum_catches(self) -> None:
+        self.put("edited", b"BEFORE")
+        self.copy(link_dest=str(self.last))
+        self.assertEqual((self.dest / "edited").read_bytes(), b"before")
+        self.copy(link_dest=str(self.last), checksum=True)
+        self.assertEqual((self.dest / "edited").read_bytes(), b"BEFORE")
+
+    def test_cached_digests_spare_the_next_content_comparison(self) -> None:
+        cache = hashcache.HashCache(str(self.last.parent / "cache.sqlite"))
+        self.addCleanup(cache.close)
+        self.copy(link_dest=str(self.last), checksum=True, hash_cache=cache)
+        with mock.patch.object(hashcache, "_hash_file") as read:
+            linked = self.copy(
+                self.last.parent / "g3",
+                link_dest=str(self.dest),
+                checksum=True,
+                hash_cache=cache,
+            )
+        read.assert_not_called()
+        self.assertEqual(linked, (0, 0))
+
+    def test_cached_digests_still_catch_a_rewrite(self) -> None:
+        cache = hashcache.HashCache(str(self.last.parent / "cache.sqlite"))
+        self.addCleanup(cache.close)
+        self.put("edited", b"BEFORE")
+        self.copy(link_dest=str(self.last), checksum=True, hash_cache=cache)
+        self.assertEqual((self.dest / "edited").read_bytes(), b"BEFORE")
+
+    def test_a_forced_path_is_copied_whatever_stat_says(self) -> None:
+        self.put("edited", b"BEFORE")
+        self.copy(link_dest=str(self.last), forced={"edited"})
+        self.assertEqual((self.dest / "edited").read_bytes(), b"BEFORE")
+
+
+def fake_clone(base: Path, target: int) -> bool:
+    """A clone as the content sees it, where the filesystem cannot make one."""
+    os.pwrite(target, base.read_bytes(), 0)
+    return True
+
+
+class TestReflink(CopyEngineTest):
+    BLOCK = mod._REFLINK_BLOCK
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.data = bytearray(os.urandom(self.BLOCK * 16))
+        self.put("db.sqlite", bytes(self.data))
+        self.copy(self.last)
+        self.data[self.BLOCK * 5 + 7] ^= 0xFF
+        self.put("db.sqlite", bytes(self.data), mtime=2_000_000_000)
+
+    def copy_reflinked(self) -> list[int]:
+        """Copy with clones; the sizes of the blocks written into a clone."""
+        with (
+            mock.patch.object(mod, "_clone", fake_clone),
+            mock.patch.object(mod.os, "pwrite", wraps=os.pwrite) as pwrite,
+        ):
+            self.copy(link_dest=str(self.last), reflink=True)
+        return [len(c[0][1]) for c in pwrite.call_args_list[1:]]
+
+    def test_only_the_changed_block_is_rewritten(self) -> None:
+        self.assertEqual(self.copy_reflinked(), [self.BLOCK])
+        self.assertEqual((self.dest / "db.sqlite").read_bytes(), bytes(self.data))
+        self.assertNotEqual((self.last / "db.sqlite").read_bytes(), bytes(self.data))
+
+    def test_a_shrunken_file_is_cut_to_its_new_size(self) -> None:
+        self.put("db.sqlite", bytes(self.data[:1000]), mtime=3_000_000_000)
+        self.copy_reflinked()
+        self.assertEqual((self.dest / "db.sqlite").read_bytes(), self.data[:1000])
+
+    def test_without_clones_the_file_is_copied_in_full(self) -> None:
+        with mock.patch.object(mod.fcntl, "ioctl", side_effect=OSError(95, "no")):
+            self.copy(link_dest=str(self.last), reflink=True)
+        self.assertEqual((self.dest / "db.sqlite").read_bytes(), bytes(self.data))
+
+    def test_support_is_probed_in_the_repository(self) -> None:
+        with mock.patch.object(mod.fcntl, "ioctl") as ioctl:
+            self.assertTrue(reflink_supported(str(self.source)))
+        self.assertEqual(ioctl.call_args[0][1], mod.FICLONE)
+        with mock.patch.object(mod.fcntl, "ioctl", side_effect=OSError(18, "xdev")):
+            self.assertFalse(reflink_supported(str(self.source)))
+        self.assertEqual(sorted(self.source.iterdir()), [self.source / "db.sqlite"])
+
+
+class TestLinkOrClone(CopyEngineTest):
+    def test_a_link_across_subvolumes_becomes_a_clone(self) -> None:
+        source = self.put("dump.sql", b"dump")
+        target = self.source / "later.sql"
+        with (
+            mock.patch.object(mod.os, "link", side_effect=OSError(errno.EXDEV, "")),
+            mock.patch.object(mod, "_clone", fake_clone),
+        ):
+            link_or_clone(str(source), str(target))
+        self.assertEqual(target.read_bytes(), b"dump")
+
+    def test_without_clones_the_link_error_stands(self) -> None:
+        source = self.put("dump.sql", b"dump")
+        target = self.source / "later.sql"
+        with (
+            mock.patch.object(mod.os, "link", side_effect=OSError(errno.EXDEV, "")),
+            mock.patch.object(mod, "_clone", return_value=False),
+            self.assertRaises(OSError),
+        ):
+            link_or_clone(str(source), str(target))
+        self.assertFalse(target.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
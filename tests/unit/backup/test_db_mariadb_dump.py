@@ -1,3 +1,4 @@
+import io
 import tempfile
 import unittest
 from unittest.mock import patch
@@ -11,16 +12,17 @@ def _df(rows):
     return pd.DataFrame(rows, columns=["instance", "database", "username", "password"])
 
 
-def _capture_dumps(*, db_type, rows, container, dump_tool="mariadb-dump"):
+def _capture_dumps(*, db_type, rows, container, dump_tool="mariadb-dump", options=None):
     """Every (argv, env) the dump path would have run."""
     captured = []
 
-    def _capture(command, out_file, *, env=None):
+    def _capture(command, out_file, *, env=None, compress=None, chunks=None):
         captured.append((list(command), env))
 
     with (
         tempfile.TemporaryDirectory() as td,
         patch.object(db_mod, "execute_to_file", side_effect=_capture),
+        patch.object(db_mod, "mariadb_lock_counters", return_value=None),
     ):
         db_mod.backup_database(
             container=container,
@@ -29,6 +31,7 @@ def _capture_dumps(*, db_type, rows, container, dump_tool="mariadb-dump"):
             dump_tool=dump_tool,
             databases_df=_df(rows),
             database_containers=[container],
+            options=options,
         )
     return captured
 
@@ -88,6 +91,82 @@ class TestMariaDBDumpUsesTCP(unittest.TestCase):
         self.assertNotIn("s3cret", argv)
 
 
+class TestMariaDBProfile(unittest.TestCase):
+    def argv(self, **options) -> list[str]:
+        [(argv, _env)] = _capture_dumps(
+            db_type="mariadb",
+            rows=[("mariadb", "appdb", "appuser", "s3cret")],
+            container="mariadb",
+            options=db_mod.DumpOptions(**options),
+        )
+        return argv
+
+    def test_the_default_profile_adds_nothing(self):
+        argv = self.argv()
+        self.assertEqual(argv[argv.index("-ps3cret") + 1 :], ["appdb"])
+
+    def test_the_innodb_profile_reads_one_snapshot_row_by_row(self):
+        argv = self.argv(mariadb_profile="innodb")
+        for flag in ("--single-transaction", "--quick", "--extended-insert"):
+            self.assertIn(flag, argv)
+        self.assertEqual(argv[-1], "appdb")
+
+    def test_routines_and_triggers_are_optional(self):
+        argv = self.argv(mariadb_routines=True, mariadb_triggers=False)
+        self.assertIn("--routines", argv)
+        self.assertIn("--skip-triggers", argv)
+
+
+class TestLockReport(unittest.TestCase):
+    def test_the_waits_during_the_dump_are_reported(self):
+        counters = [
+            {
+                "Table_locks_waited": 2,
+                "Innodb_row_lock_waits": 5,
+                "Innodb_row_lock_time": 40,
+            },
+            {
+                "Table_locks_waited": 2,
+                "Innodb_row_lock_waits": 8,
+                "Innodb_row_lock_time": 95,
+            },
+        ]
+        with (
+            patch.object(db_mod, "execute_to_file"),
+            patch.object(db_mod, "mariadb_lock_counters", side_effect=counters) as ask,
+            patch("sys.stdout", new_callable=io.StringIO) as out,
+        ):
+            db_mod.dump_mariadb("db", "mysqldump", "u", "p", "appdb", "/tmp/x.sql")
+        self.assertEqual(ask.call_args.args[1], "mysql")
+        self.assertIn("0 table lock(s), 3 InnoDB row lock(s) for 55 ms", out.getvalue())
+
+    def test_the_counters_are_parsed_from_the_status_rows(self):
+        rows = [
+            "Innodb_row_lock_time\t12",
+            "Innodb_row_lock_waits\t3",
+            "Table_locks_waited\t0",
+        ]
+        with patch.object(db_mod, "execute_shell_command", return_value=rows):
+            found = db_mod.mariadb_lock_counters("db", "mariadb", "u", "p")
+        self.assertEqual(
+            found,
+            {
+                "Table_locks_waited": 0,
+                "Innodb_row_lock_waits": 3,
+                "Innodb_row_lock_time": 12,
+            },
+        )
+
+    def test_an_unreadable_server_costs_the_report_not_the_dump(self):
+        with (
+            patch.object(
+                db_mod, "execute_shell_command", side_effect=db_mod.BackupError("no")
+            ),
+            patch("sys.stderr", new_callable=io.StringIO),
+        ):
+            self.assertIsNone(db_mod.mariadb_lock_counters("db", "mariadb", "u", "p"))
+
+
 class TestNoShellReachesTheDump(unittest.TestCase):
     def test_a_hostile_database_name_never_reaches_a_command(self):
         """validate_database refuses it, so no argv is built at all."""
@@ -99,5 +178,110 @@ class TestNoShellReachesTheDump(unittest.TestCase):
             )
 
 
+class TestCompressedDumps(unittest.TestCase):
+    def test_the_codec_names_the_file_and_the_compressor(self):
+        seen = []
+
+        def _capture(command, out_file, *, env=None, compress=None, chunks=None):
+            seen.append((out_file.rsplit("/", 1)[-1], compress))
+
+        with (
+            tempfile.TemporaryDirectory() as td,
+            patch.object(db_mod, "execute_to_file", side_effect=_capture),
+        ):
+            db_mod.backup_database(
+                container="mariadb",
+                volume_dir=td,
+                db_type="mariadb",
+                dump_tool="mariadb-dump",
+                databases_df=_df([("mariadb", "appdb", "u", "p")]),
+                database_containers=["mariadb"],
+                options=db_mod.DumpOptions(compression="zstd"),
+            )
+        self.assertEqual(seen, [("appdb.backup.sql.zst", db_mod.COMPRESSORS["zstd"])])
+
+
+class TestRecordedDigests(unittest.TestCase):
+    def test_every_written_dump_is_recorded_with_its_digest(self):
+        recorded = {}
+
+        def _digest(command, out_file, *, env=None, compress=None, chunks=None):
+            return out_file.rsplit("/", 1)[-1]
+
+        with (
+            tempfile.TemporaryDirectory() as td,
+            patch.object(db_mod, "execute_to_file", side_effect=_digest),
+            patch.object(db_mod, "mariadb_lock_counters", return_value=None),
+        ):
+            db_mod.backup_database(
+                container="mariadb",
+                volume_dir=td,
+                db_type="mariadb",
+                dump_tool="mariadb-dump",
+                databases_df=_df(
+                    [("mariadb", "a", "u", "p"), ("mariadb", "b", "u", "p")]
+                ),
+                database_containers=["mariadb"],
+                record=recorded.__setitem__,
+            )
+        self.assertEqual(
+            recorded,
+            {
+                "a.backup.sql": db_mod.DumpRecord("a.backup.sql"),
+                "b.backup.sql": db_mod.DumpRecord("b.backup.sql"),
+            },
+        )
+
+
+class TestDirectoryDumps(unittest.TestCase):
+    def dump(self, instance: str) -> tuple[list, list]:
+        files, directories = [], []
+
+        def _file(command, out_file, *, env=None, compress=None, chunks=None):
+            files.append(out_file.rsplit("/", 1)[-1])
+
+        def _directory(command, out_dir, *, env=None):
+            directories.append((out_dir.rsplit("/", 1)[-1], list(command), env))
+
+        with (
+            tempfile.TemporaryDirectory() as td,
+            patch.object(db_mod, "execute_to_file", side_effect=_file),
+            patch.object(db_mod, "execute_to_directory", side_effect=_directory),
+        ):
+            db_mod.backup_database(
+                container="pg",
+                volume_dir=td,
+                db_type="postgres",
+                dump_tool="pg_dumpall",
+                databases_df=_df(
+                    [("pg", "appdb", "appuser", "s3cret"), ("pg", "*", "su", "pw")]
+                ),
+                database_containers=["pg"],
+                options=db_mod.DumpOptions(
+                    compression="gzip",
+                    postgres_directory=frozenset({instance}),
+                    postgres_jobs=8,
+                ),
+            )
+        return files, directories
+
+    def test_a_listed_instance_is_dumped_as_a_directory_with_jobs(self):
+        files, directories = self.dump("pg")
+        [(name, argv, env)] = directories
+        self.assertEqual(name, "appdb.backup.dir")
+        self.assertEqual(
+            argv[-7:],
+            ["sh", "-c", db_mod._DIRECTORY_DUMP, "sh", "8", "appuser", "appdb"],
+        )
+        self.assertEqual(env, {"PGPASSWORD": "s3cret"})
+        self.assertNotIn("s3cret", argv)
+        self.assertEqual(files, ["pg.cluster.backup.sql.gz"], "pg_dumpall stays SQL")
+
+    def test_another_instance_keeps_the_sql_stream(self):
+        files, directories = self.dump("other")
+        self.assertEqual(directories, [])
+        self.assertIn("appdb.backup.sql.gz", files)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
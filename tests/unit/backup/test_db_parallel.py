@@ -0,0 +1,98 @@
+"""Contract of the dumps of one container running side by side."""
+
+from __future__ import annotations
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+
+from baudolo.backup import db as db_mod
+from baudolo.backup.schedule import DumpLimits
+from baudolo.backup.shell import BackupError
+
+
+def _df(*databases: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        [("postgres", name, "u", "p") for name in databases],
+        columns=["instance", "database", "username", "password"],
+    )
+
+
+def _dump(td: str, df: pd.DataFrame, limits: DumpLimits | None) -> bool:
+    return db_mod.backup_database(
+        container="postgres",
+        volume_dir=td,
+        db_type="postgres",
+        dump_tool="pg_dumpall",
+        databases_df=df,
+        database_containers=["postgres"],
+        limits=limits,
+    )
+
+
+class TestParallelDumps(unittest.TestCase):
+    def test_the_container_limit_runs_that_many_at_once(self) -> None:
+        barrier = threading.Barrier(3, timeout=5)
+
+        def dump(command, out_file, *, env=None, compress=None, chunks=None) -> None:
+            barrier.wait()
+
+        with (
+            tempfile.TemporaryDirectory() as td,
+            patch.object(db_mod, "execute_to_file", side_effect=dump),
+        ):
+            self.assertTrue(_dump(td, _df("a", "b", "c"), DumpLimits(per_container=3)))
+
+    def test_without_limits_they_run_one_by_one(self) -> None:
+        threads = set()
+
+        def dump(command, out_file, *, env=None, compress=None, chunks=None) -> None:
+            threads.add(threading.current_thread())
+
+        with (
+            tempfile.TemporaryDirectory() as td,
+            patch.object(db_mod, "execute_to_file", side_effect=dump),
+        ):
+            _dump(td, _df("a", "b", "c"), None)
+        self.assertEqual(threads, {threading.main_thread()})
+
+    def test_a_failed_postgres_dump_still_fails_the_run(self) -> None:
+        def dump(command, out_file, *, env=None, compress=None, chunks=None) -> None:
+            if Path(out_file).name.startswith("b."):
+                raise BackupError("connection refused")
+
+        with (
+            tempfile.TemporaryDirectory() as td,
+            patch.object(db_mod, "execute_to_file", side_effect=dump),
+            self.assertRaisesRegex(BackupError, "database 'b'.*must succeed"),
+        ):
+            _dump(td, _df("a", "b", "c"), DumpLimits(per_container=3))
+
+    def test_a_bad_row_fails_before_any_dump_starts(self) -> None:
+        df = pd.DataFrame(
+            [("maria", "a", "u", "p"), ("maria", "*", "u", "p")],
+            columns=["instance", "database", "username", "password"],
+        )
+        with (
+            tempfile.TemporaryDirectory() as td,
+            patch.object(db_mod, "execute_to_file") as dump,
+            self.assertRaises(ValueError),
+        ):
+            db_mod.backup_database(
+                container="maria",
+                volume_dir=td,
+                db_type="mariadb",
+                dump_tool="mariadb-dump",
+                databases_df=df,
+                database_containers=["maria"],
+                limits=DumpLimits(per_container=2),
+            )
+        dump.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -38,7 +38,7 @@ class TestPostgresDumpCarriesThePassword(unittest.TestCase):
     def test_the_cluster_dump_forwards_pgpassword(self) -> None:
         seen: dict = {}
 
-        def fake(command, out_file, *, env=None):
+        def fake(command, out_file, *, env=None, compress=None, chunks=None):
             seen["command"] = command
             seen["env"] = env
 
@@ -0,0 +1,73 @@
+"""Contract of the per-run container metadata: one inspect per container."""
+
+from __future__ import annotations
+
+import json
+import unittest
+from unittest import mock
+
+from baudolo.backup import docker as docker_mod
+from baudolo.backup import dumps as dumps_mod
+from baudolo.backup import policy
+from baudolo.backup.shell import BackupError
+
+
+def inspected(name: str) -> str:
+    return json.dumps(
+        {"Name": f"/{name}", "Image": f"sha256:{name}", "Config": {"Image": "pg:17"}}
+    )
+
+
+def daemon(argv: list[str]) -> list[str]:
+    if argv[1] == "inspect":
+        return [inspected(name) for name in argv[4:]]
+    if argv[1] == "exec":
+        raise BackupError("no such tool")
+    return []
+
+
+class TestContainerMetadata(unittest.TestCase):
+    def setUp(self) -> None:
+        for patcher in (
+            mock.patch.dict(docker_mod._KNOWN, clear=True),
+            mock.patch.dict(docker_mod.DAEMON_CALLS, clear=True),
+            mock.patch.dict(dumps_mod._ENGINE_BY_IMAGE, clear=True),
+            mock.patch.object(docker_mod, "execute_shell_command", daemon),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_every_question_about_a_container_costs_one_inspect(self) -> None:
+        """What one volume's pass asks, repeated for five volumes."""
+        for _volume in range(5):
+            policy.volume_is_fully_ignored(["db"], ["alpine:3"])
+            policy.requires_stop(["db"], [])
+            docker_mod.filter_stoppable(["db"])
+            dumps_mod.container_engine("db")
+        self.assertEqual(docker_mod.daemon_calls("inspect"), 1)
+
+    def test_one_inspect_answers_every_field(self) -> None:
+        self.assertEqual(docker_mod.get_image_info("db"), "pg:17")
+        self.assertEqual(docker_mod.image_id("db"), "sha256:db")
+        self.assertFalse(docker_mod.is_swarm_task("db"))
+        self.assertEqual(docker_mod.daemon_calls(), 1)
+
+    def test_containers_are_counted_separately(self) -> None:
+        docker_mod.get_image_info("a")
+        docker_mod.get_image_info("b")
+        docker_mod.get_image_info("a")
+        self.assertEqual(docker_mod.daemon_calls("inspect"), 2)
+
+    def test_a_vanished_container_is_not_asked_about_again(self) -> None:
+        with mock.patch.object(
+            docker_mod, "execute_shell_command", side_effect=[BackupError("gone"), []]
+        ):
+            self.assertTrue(docker_mod.is_swarm_task("gone"))
+            self.assertTrue(docker_mod.is_swarm_task("gone"))
+            with self.assertRaises(BackupError):
+                docker_mod.image_id("gone")
+        self.assertEqual(docker_mod.daemon_calls(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest.mock import patch
 
@@ -5,17 +6,36 @@ from baudolo.backup import docker as docker_mod
 from baudolo.backup.shell import BackupError
 
 
+def _inspected(labels):
+    return [
+        json.dumps({"Name": "/c1", "Image": "sha256:a", "Config": {"Labels": labels}})
+    ]
+
+
 class TestIsSwarmTask(unittest.TestCase):
-    @patch.object(docker_mod, "execute_shell_command", return_value=["task-id-123"])
+    def setUp(self) -> None:
+        patcher = patch.dict(docker_mod._KNOWN, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch.object(
+        docker_mod,
+        "execute_shell_command",
+        return_value=_inspected({docker_mod.SWARM_TASK_LABEL: "task-id-123"}),
+    )
     def test_true_when_task_label_present(self, _mock) -> None:
         self.assertTrue(docker_mod.is_swarm_task("c1"))
 
-    @patch.object(docker_mod, "execute_shell_command", return_value=[""])
+    @patch.object(
+        docker_mod,
+        "execute_shell_command",
+        return_value=_inspected({docker_mod.SWARM_TASK_LABEL: ""}),
+    )
     def test_false_when_label_empty(self, _mock) -> None:
         self.assertFalse(docker_mod.is_swarm_task("c1"))
 
-    @patch.object(docker_mod, "execute_shell_command", return_value=[])
-    def test_false_when_no_output(self, _mock) -> None:
+    @patch.object(docker_mod, "execute_shell_command", return_value=_inspected(None))
+    def test_false_when_no_labels(self, _mock) -> None:
         self.assertFalse(docker_mod.is_swarm_task("c1"))
 
     @patch.object(
@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest.mock import patch
 
@@ -6,9 +7,11 @@ from baudolo.backup.shell import BackupError
 
 
 class TestImageId(unittest.TestCase):
-    def test_the_id_is_returned_without_surrounding_whitespace(self) -> None:
-        with patch.object(
-            docker_mod, "execute_shell_command", return_value=["sha256:abc \n"]
+    def test_the_id_is_the_image_the_container_runs(self) -> None:
+        inspected = json.dumps({"Name": "/c1", "Image": "sha256:abc", "Config": {}})
+        with (
+            patch.dict(docker_mod._KNOWN, clear=True),
+            patch.object(docker_mod, "execute_shell_command", return_value=[inspected]),
         ):
             self.assertEqual(docker_mod.image_id("c1"), "sha256:abc")
 
@@ -1,4 +1,7 @@
+import json
+import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import patch
 
 import pandas as pd
@@ -29,6 +32,7 @@ def _detect(probe, container="c1"):
     with (
         patch.object(dumps_mod, "has_tool", probe.has_tool),
         patch.object(dumps_mod, "image_id", probe.image_id),
+        patch.object(dumps_mod, "image_layers", return_value=None),
     ):
         return dumps_mod.container_engine(container)
 
@@ -67,6 +71,7 @@ class TestProbeCache(unittest.TestCase):
         with (
             patch.object(dumps_mod, "has_tool", probe.has_tool),
             patch.object(dumps_mod, "image_id", probe.image_id),
+            patch.object(dumps_mod, "image_layers", return_value=None),
         ):
             first = dumps_mod.container_engine("replica-1")
             second = dumps_mod.container_engine("replica-2")
@@ -79,6 +84,7 @@ class TestProbeCache(unittest.TestCase):
         with (
             patch.object(dumps_mod, "has_tool", probe.has_tool),
             patch.object(dumps_mod, "image_id", probe.image_id),
+            patch.object(dumps_mod, "image_layers", return_value=None),
         ):
             self.assertEqual(
                 dumps_mod.container_engine("pg"), ("postgres", "pg_dumpall")
@@ -87,6 +93,152 @@ class TestProbeCache(unittest.TestCase):
             self.assertIsNone(dumps_mod.container_engine("app"))
 
 
+class TestLayerDetection(unittest.TestCase):
+    def detect(self, shipped, path=(), bindir="usr/bin"):
+        layer = Path(tempfile.mkdtemp())
+        for tool in shipped:
+            binary = layer / bindir / tool
+            binary.parent.mkdir(parents=True, exist_ok=True)
+            binary.write_text("#!/bin/sh\n", encoding="utf-8")
+            binary.chmod(0o755)
+        probe = _Probe([])
+        dumps_mod._ENGINE_BY_IMAGE.clear()
+        with (
+            patch.object(dumps_mod, "has_tool", probe.has_tool),
+            patch.object(dumps_mod, "image_id", probe.image_id),
+            patch.object(dumps_mod, "image_layers", return_value=[str(layer)]),
+            patch.object(
+                dumps_mod, "image_path", return_value=None if path is None else path
+            ),
+        ):
+            return dumps_mod.container_engine("c1"), probe.calls
+
+    def test_a_tool_in_the_layers_is_found_without_an_exec(self):
+        engine, execs = self.detect(["pg_dumpall"])
+        self.assertEqual(engine, ("postgres", "pg_dumpall"))
+        self.assertEqual(execs, [])
+
+    def test_readable_layers_without_a_tool_on_the_image_path_mean_no_database(
+        self,
+    ):
+        engine, execs = self.detect([], path=["/usr/local/bin", "/usr/bin"])
+        self.assertIsNone(engine)
+        self.assertEqual(execs, [])
+
+    def test_a_tool_outside_the_default_path_is_found_along_the_image_path(self):
+        engine, execs = self.detect(
+            ["pg_dumpall"],
+            path=["/opt/bitnami/postgresql/bin", "/usr/bin"],
+            bindir="opt/bitnami/postgresql/bin",
+        )
+        self.assertEqual(engine, ("postgres", "pg_dumpall"))
+        self.assertEqual(execs, [])
+
+    def test_an_unknown_image_path_falls_back_to_the_exec_probe(self):
+        _engine, execs = self.detect([], path=None)
+        self.assertNotEqual(execs, [])
+
+    def test_the_tool_order_is_kept(self):
+        engine, _execs = self.detect(["mysqldump", "mariadb-dump"])
+        self.assertEqual(engine, ("mariadb", "mariadb-dump"))
+
+    def test_unreadable_layers_fall_back_to_the_exec_probe(self):
+        probe = _Probe(["mariadb-dump"])
+        dumps_mod._ENGINE_BY_IMAGE.clear()
+        with (
+            patch.object(dumps_mod, "has_tool", probe.has_tool),
+            patch.object(dumps_mod, "image_id", probe.image_id),
+            patch.object(
+                dumps_mod, "image_layers", return_value=["/nonexistent/layer"]
+            ),
+            patch.object(dumps_mod, "image_path", return_value=[]),
+        ):
+            self.assertEqual(
+                dumps_mod.container_engine("c1"), ("mariadb", "mariadb-dump")
+            )
+        self.assertNotEqual(probe.calls, [])
+
+
+class TestPersistentCache(unittest.TestCase):
+    def setUp(self):
+        self.path = str(Path(tempfile.mkdtemp()) / "machine" / "engines.json")
+        dumps_mod._ENGINE_BY_IMAGE.clear()
+        self.addCleanup(dumps_mod._ENGINE_BY_IMAGE.clear)
+        self.addCleanup(dumps_mod._PROBED_ABSENT.clear)
+
+    def test_an_image_found_by_an_earlier_run_is_not_probed_again(self):
+        probe = _Probe(["pg_dumpall"])
+        with (
+            patch.object(dumps_mod, "has_tool", probe.has_tool),
+            patch.object(dumps_mod, "image_id", probe.image_id),
+            patch.object(dumps_mod, "image_layers", return_value=None),
+        ):
+            dumps_mod.container_engine("c1")
+            dumps_mod.save_engine_cache(self.path, present=["sha256:aaa"])
+            dumps_mod._ENGINE_BY_IMAGE.clear()
+            dumps_mod.load_engine_cache(self.path)
+            engine = dumps_mod.container_engine("c2")
+        self.assertEqual(engine, ("postgres", "pg_dumpall"))
+        self.assertEqual(probe.calls, [("c1", "pg_dumpall")])
+
+    def test_an_image_its_layers_show_without_an_engine_is_remembered(self):
+        layer = tempfile.mkdtemp()
+        with (
+            patch.object(dumps_mod, "image_layers", return_value=[layer]),
+            patch.object(dumps_mod, "image_path", return_value=[]),
+        ):
+            dumps_mod._ENGINE_BY_IMAGE["sha256:app"] = dumps_mod.detect_engine(
+                "c1", "sha256:app"
+            )
+        dumps_mod.save_engine_cache(self.path, present=["sha256:app"])
+        dumps_mod._ENGINE_BY_IMAGE.clear()
+        dumps_mod.load_engine_cache(self.path)
+        self.assertEqual(dumps_mod._ENGINE_BY_IMAGE, {"sha256:app": None})
+
+    def test_a_failed_exec_probe_is_not_remembered(self):
+        """has_tool answers False for a restarting container just the same."""
+        probe = _Probe([])
+        with (
+            patch.object(dumps_mod, "has_tool", probe.has_tool),
+            patch.object(dumps_mod, "image_id", probe.image_id),
+            patch.object(dumps_mod, "image_layers", return_value=None),
+        ):
+            self.assertIsNone(dumps_mod.container_engine("c1"))
+        dumps_mod.save_engine_cache(self.path, present=["sha256:aaa"])
+        dumps_mod._ENGINE_BY_IMAGE.clear()
+        dumps_mod.load_engine_cache(self.path)
+        self.assertEqual(dumps_mod._ENGINE_BY_IMAGE, {})
+
+    def test_images_the_daemon_no_longer_holds_are_evicted(self):
+        dumps_mod._ENGINE_BY_IMAGE.update(
+            {"sha256:old": ("postgres", "pg_dumpall"), "sha256:new": None}
+        )
+        with patch.object(dumps_mod, "local_image_ids", return_value={"sha256:new"}):
+            dumps_mod.save_engine_cache(self.path)
+        with Path(self.path).open(encoding="utf-8") as handle:
+            self.assertEqual(json.load(handle)["images"], {"sha256:new": None})
+
+    def test_a_first_run_starts_empty(self):
+        dumps_mod.load_engine_cache(self.path)
+        self.assertEqual(dumps_mod._ENGINE_BY_IMAGE, {})
+
+    def test_a_damaged_cache_is_ignored(self):
+        Path(self.path).parent.mkdir(parents=True)
+        Path(self.path).write_text("{not json", encoding="utf-8")
+        with patch("sys.stderr"):
+            dumps_mod.load_engine_cache(self.path)
+        self.assertEqual(dumps_mod._ENGINE_BY_IMAGE, {})
+
+    def test_a_tool_this_version_does_not_know_is_probed_again(self):
+        Path(self.path).parent.mkdir(parents=True)
+        Path(self.path).write_text(
+            json.dumps({"schema": 1, "images": {"sha256:x": ["oracle", "expdp"]}}),
+            encoding="utf-8",
+        )
+        dumps_mod.load_engine_cache(self.path)
+        self.assertEqual(dumps_mod._ENGINE_BY_IMAGE, {})
+
+
 class TestBackupDispatch(unittest.TestCase):
     def test_the_probed_tool_reaches_the_dump(self):
         probe = _Probe(["mysqldump"])
@@ -100,7 +252,10 @@ class TestBackupDispatch(unittest.TestCase):
         with (
             patch.object(dumps_mod, "has_tool", probe.has_tool),
             patch.object(dumps_mod, "image_id", probe.image_id),
+            patch.object(dumps_mod, "image_layers", return_value=None),
             patch.object(dumps_mod, "backup_database", _fake_backup_database),
+            patch.object(dumps_mod, "container_metadata", return_value=None),
+            patch.dict(dumps_mod._DUMPED_IN, clear=True),
         ):
             outcome = dumps_mod.backup_mariadb_or_postgres(
                 container="c1",
@@ -121,6 +276,7 @@ class TestBackupDispatch(unittest.TestCase):
         with (
             patch.object(dumps_mod, "has_tool", probe.has_tool),
             patch.object(dumps_mod, "image_id", probe.image_id),
+            patch.object(dumps_mod, "image_layers", return_value=None),
         ):
             self.assertEqual(
                 dumps_mod.backup_mariadb_or_postgres(
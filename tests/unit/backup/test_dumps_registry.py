@@ -0,0 +1,111 @@
+"""Contract of the per-run dump registry: each database is dumped once."""
+
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from baudolo.backup import db as db_mod
+from baudolo.backup import docker as docker_mod
+from baudolo.backup import dumps as dumps_mod
+from baudolo.backup.docker import ContainerInfo
+
+
+def info(name: str, **mounts: str) -> ContainerInfo:
+    return ContainerInfo(name, "postgres:17", f"sha256:{name}", mounts=mounts)
+
+
+class TestDumpOnce(unittest.TestCase):
+    def setUp(self) -> None:
+        self.generation = Path(tempfile.mkdtemp())
+        self.dumps: list[tuple[str, str]] = []
+        for patcher in (
+            mock.patch.dict(dumps_mod._DUMPED_IN, clear=True),
+            mock.patch.dict(docker_mod._KNOWN, clear=True),
+            mock.patch.object(
+                dumps_mod, "container_engine", return_value=("postgres", "pg_dumpall")
+            ),
+            mock.patch.object(db_mod, "execute_to_file", self.record),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def record(
+        self, command, out_file, *, env=None, compress=None, chunks=None
+    ) -> None:
+        container = next(arg for arg in command if arg.startswith("central-"))
+        path = Path(out_file).relative_to(self.generation)
+        self.dumps.append((container, str(path)))
+
+    def back_up(self, volume: str, *containers: str) -> dumps_mod.VolumeOutcome:
+        return dumps_mod.backup_dumps_for_volume(
+            containers=list(containers),
+            vol_dir=str(self.generation / volume),
+            databases_df=pd.DataFrame(
+                [("central", "app", "u", "p"), ("central", "*", "postgres", "p")],
+                columns=["instance", "database", "username", "password"],
+            ),
+            database_containers=[],
+        )
+
+    def test_a_second_volume_of_the_instance_references_the_dump(self) -> None:
+        docker_mod.remember(
+            [info("central-postgres", pgdata="/var/lib/postgresql/data", sock="/run")]
+        )
+        sock = self.back_up("sock", "central-postgres")
+        pgdata = self.back_up("pgdata", "central-postgres")
+        self.assertEqual(
+            self.dumps,
+            [
+                ("central-postgres", "pgdata/sql/app.backup.sql"),
+                ("central-postgres", "pgdata/sql/central.cluster.backup.sql"),
+            ],
+        )
+        self.assertEqual(
+            sock.refs,
+            {"app.backup.sql": "pgdata", "central.cluster.backup.sql": "pgdata"},
+        )
+        self.assertTrue(sock.dumped)
+        self.assertTrue(pgdata.dumped)
+        self.assertIsNone(pgdata.refs)
+
+    def test_replicas_sharing_a_volume_are_dumped_once(self) -> None:
+        docker_mod.remember([info("central-postgres-1"), info("central-postgres-2")])
+        outcome = self.back_up("shared", "central-postgres-1", "central-postgres-2")
+        self.assertEqual(len(self.dumps), 2)
+        self.assertEqual(
+            {container for container, _ in self.dumps}, {"central-postgres-1"}
+        )
+        self.assertTrue(outcome.dumped)
+        self.assertIsNone(outcome.refs)
+
+    def test_without_a_data_volume_the_first_volume_keeps_it(self) -> None:
+        docker_mod.remember([info("central-postgres")])
+        first = self.back_up("a", "central-postgres")
+        second = self.back_up("b", "central-postgres")
+        self.assertEqual({path.split("/")[0] for _, path in self.dumps}, {"a"})
+        self.assertIsNone(first.refs)
+        self.assertEqual(set(second.refs.values()), {"a"})
+
+
+class TestDataVolume(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.dict(docker_mod._KNOWN, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_the_mount_under_an_engine_data_directory_owns_it(self) -> None:
+        docker_mod.remember([info("db", conf="/etc/mysql", data="/var/lib/mysql")])
+        self.assertEqual(dumps_mod.data_volume("db"), "data")
+
+    def test_a_lookalike_path_is_no_data_directory(self) -> None:
+        docker_mod.remember([info("db", data="/var/lib/mysql-files")])
+        self.assertIsNone(dumps_mod.data_volume("db"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Contract of the snapshot generation store: what a new generation starts as."""
+
+from __future__ import annotations
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from baudolo.backup.genstore import (
+    CARRIED_DIR,
+    adopt_carried,
+    create_snapshot_generation,
+    discard_carried,
+)
+from baudolo.backup.shell import BackupError
+from baudolo.generation import FILES_DIR, MANIFEST_FILE, SQL_DIR
+
+
+class Btrfs:
+    """Subvolumes as plain directories; a snapshot copies the tree."""
+
+    def __init__(self, subvolumes: set[str]) -> None:
+        self.subvolumes = subvolumes
+        self.calls: list[list[str]] = []
+
+    def __call__(self, command: list[str]) -> list[str]:
+        self.calls.append(list(command))
+        action, *paths = command[2:]
+        if action == "show" and paths[0] not in self.subvolumes:
+            raise BackupError("not a subvolume")
+        if action == "snapshot":
+            shutil.copytree(paths[0], paths[1], symlinks=True)
+        if action == "create":
+            Path(paths[0]).mkdir()
+        return []
+
+
+class TestBtrfs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.repo = Path(tempfile.mkdtemp())
+        self.last = self.repo / "20260101000000"
+        (self.last / "app" / FILES_DIR / "data").mkdir(parents=True)
+        (self.last / "app" / FILES_DIR / "data" / "table").write_bytes(b"rows")
+        (self.last / "app" / SQL_DIR).mkdir()
+        (self.last / "app" / SQL_DIR / "app.backup.sql").write_bytes(b"dump")
+        (self.last / "gone" / FILES_DIR).mkdir(parents=True)
+        (self.last / MANIFEST_FILE).write_text("{}")
+        (self.last / "stamp").write_text("x")
+        self.run = Btrfs({str(self.last)})
+
+    def create(self) -> Path:
+        return Path(
+            create_snapshot_generation(
+                str(self.repo), "20260102000000", "btrfs", run=self.run
+            )
+        )
+
+    def test_it_snapshots_the_last_finished_generation(self) -> None:
+        generation = self.create()
+        self.assertIn(
+            ["btrfs", "subvolume", "snapshot", str(self.last), str(generation)],
+            self.run.calls,
+        )
+
+    def test_only_the_file_trees_are_carried_over(self) -> None:
+        generation = self.create()
+        self.assertEqual([p.name for p in generation.iterdir()], [CARRIED_DIR])
+        self.assertEqual(
+            (generation / CARRIED_DIR / "app" / "data" / "table").read_bytes(),
+            b"rows",
+        )
+
+    def test_a_copied_volume_gets_its_tree_back_and_the_rest_is_dropped(
+        self,
+    ) -> None:
+        generation = self.create()
+        adopt_carried(str(generation / "app"))
+        discard_carried(str(generation))
+        self.assertEqual([p.name for p in generation.iterdir()], ["app"])
+        self.assertTrue((generation / "app" / FILES_DIR / "data" / "table").is_file())
+
+    def test_an_unfinished_generation_is_no_base(self) -> None:
+        (self.repo / "20260101120000").mkdir()
+        self.run.subvolumes.add(str(self.repo / "20260101120000"))
+        self.create()
+        self.assertEqual(self.run.calls[1][3], str(self.last))
+
+    def test_a_plain_directory_generation_starts_an_empty_subvolume(self) -> None:
+        self.run.subvolumes.clear()
+        generation = self.create()
+        self.assertEqual(self.run.calls[-1][:3], ["btrfs", "subvolume", "create"])
+        self.assertEqual(list(generation.iterdir()), [])
+
+    def test_an_existing_generation_is_not_written_into(self) -> None:
+        (self.repo / "20260102000000").mkdir()
+        with self.assertRaisesRegex(BackupError, "already exists"):
+            self.create()
+
+
+class Zfs:
+    def __init__(self, repo: Path, datasets: dict[str, str]) -> None:
+        self.repo = repo
+        self.datasets = datasets
+        self.calls: list[list[str]] = []
+
+    def __call__(self, command: list[str]) -> list[str]:
+        self.calls.append(list(command))
+        if command[1] == "list":
+            path = command[-1]
+            name = self.datasets.get(path)
+            return [f"{name}\t{path}"] if name else [f"tank/other\t{self.repo}x"]
+        if command[1] in ("create", "clone"):
+            (self.repo / command[-1].rsplit("/", 1)[1]).mkdir()
+        return []
+
+
+class TestZfs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.repo = Path(tempfile.mkdtemp())
+        self.last = self.repo / "20260101000000"
+        self.last.mkdir()
+        (self.last / MANIFEST_FILE).write_text("{}")
+
+    def test_it_clones_and_promotes_the_last_generation(self) -> None:
+        run = Zfs(
+            self.repo,
+            {str(self.repo): "tank/repo", str(self.last): "tank/repo/20260101000000"},
+        )
+        create_snapshot_generation(str(self.repo), "20260102000000", "zfs", run=run)
+        self.assertEqual(
+            [call[:2] for call in run.calls[2:]],
+            [["zfs", "snapshot"], ["zfs", "clone"], ["zfs", "promote"]],
+        )
+        self.assertEqual(run.calls[-1][-1], "tank/repo/20260102000000")
+
+    def test_the_repository_must_be_a_dataset(self) -> None:
+        with self.assertRaisesRegex(BackupError, "no zfs dataset"):
+            create_snapshot_generation(
+                str(self.repo), "20260102000000", "zfs", run=Zfs(self.repo, {})
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Contract of the repository's digest cache: read once, bounded, pruned."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from baudolo.backup import hashcache as mod
+
+
+class TestHashCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+        self.file = self.root / "dump.sql"
+        self.file.write_bytes(b"dump;\n")
+        self.cache = mod.HashCache(str(self.root / mod.HASH_CACHE_FILE), limit=2)
+        self.addCleanup(self.cache.close)
+        reads = mock.patch.object(mod, "_hash_file", wraps=mod._hash_file)
+        self.reads = reads.start()
+        self.addCleanup(reads.stop)
+
+    def test_the_digest_is_that_of_the_content(self) -> None:
+        self.assertEqual(
+            self.cache.digest(str(self.file)), hashlib.sha256(b"dump;\n").hexdigest()
+        )
+
+    def test_an_unchanged_file_is_read_once(self) -> None:
+        self.cache.digest(str(self.file))
+        self.cache.digest(str(self.file))
+        self.assertEqual(self.reads.call_count, 1)
+
+    def test_a_hard_link_in_a_later_generation_is_not_read_again(self) -> None:
+        self.cache.digest(str(self.file))
+        link = self.root / "later.sql"
+        os.link(self.file, link)
+        # The link moved ctime; what a later run finds is that new state.
+        self.cache.digest(str(link))
+        self.cache.digest(str(self.file))
+        self.assertEqual(self.reads.call_count, 2)
+
+    def test_a_rewrite_is_read_again(self) -> None:
+        self.cache.digest(str(self.file))
+        self.file.write_bytes(b"dump2\n")
+        self.assertEqual(
+            self.cache.digest(str(self.file)), hashlib.sha256(b"dump2\n").hexdigest()
+        )
+
+    def test_the_cache_outlives_the_run(self) -> None:
+        self.cache.digest(str(self.file))
+        self.cache.close()
+        again = mod.HashCache(str(self.root / mod.HASH_CACHE_FILE))
+        self.addCleanup(again.close)
+        again.digest(str(self.file))
+        self.assertEqual(self.reads.call_count, 1)
+
+    def test_prune_drops_the_files_that_are_gone(self) -> None:
+        self.cache.digest(str(self.file))
+        self.file.unlink()
+        self.assertEqual(self.cache.prune(), 1)
+
+    def test_prune_keeps_the_most_recently_used(self) -> None:
+        files = []
+        for name in "abc":
+            path = self.root / name
+            path.write_bytes(name.encode())
+            files.append(path)
+            self.cache.digest(str(path))
+        self.cache.digest(str(files[0]))
+        self.assertEqual(self.cache.prune(), 1)
+        self.reads.reset_mock()
+        for path in (files[0], files[2]):
+            self.cache.digest(str(path))
+        self.assertEqual(self.reads.call_count, 0)
+
+    def test_a_run_that_never_asked_leaves_no_cache_behind(self) -> None:
+        self.assertEqual(self.cache.prune(), 0)
+        self.assertFalse((self.root / mod.HASH_CACHE_FILE).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
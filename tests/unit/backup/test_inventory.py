@@ -0,0 +1,113 @@
+"""Contract of the once-per-run container inventory."""
+
+from __future__ import annotations
+
+import json
+import unittest
+from unittest import mock
+
+from baudolo.backup import docker as docker_mod
+from baudolo.backup import inventory as mod
+from baudolo.backup.shell import BackupError
+
+
+def inspected(name: str, *volumes: str, image="app:1", task="") -> str:
+    return json.dumps(
+        {
+            "Name": f"/{name}",
+            "Image": f"sha256:{name}",
+            "Config": {
+                "Image": image,
+                "Labels": {docker_mod.SWARM_TASK_LABEL: task} if task else None,
+            },
+            "Mounts": [
+                *(
+                    {"Type": "volume", "Name": v, "Destination": f"/mnt/{v}"}
+                    for v in volumes
+                ),
+                {"Type": "bind", "Source": "/etc/hosts", "Destination": "/etc/hosts"},
+            ],
+        }
+    )
+
+
+class Daemon:
+    """Answers docker ps and docker inspect, and counts how often it is asked."""
+
+    def __init__(self, containers: dict[str, str], vanished=()) -> None:
+        self.containers = containers
+        self.vanished = set(vanished)
+        self.calls: list[list[str]] = []
+
+    def __call__(self, argv: list[str]) -> list[str]:
+        self.calls.append(argv)
+        if argv[:2] == ["docker", "ps"]:
+            if "-a" in argv:
+                return []
+            return [*self.containers, *self.vanished]
+        names = argv[4:]
+        if self.vanished & set(names):
+            raise BackupError("No such object")
+        return [self.containers[name] for name in names]
+
+
+class TestTakeInventory(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.dict(docker_mod._KNOWN, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def take(self, daemon: Daemon) -> mod.Inventory:
+        with mock.patch.object(docker_mod, "execute_shell_command", daemon):
+            return mod.take_inventory()
+
+    def test_it_asks_the_daemon_twice_whatever_the_host_holds(self) -> None:
+        daemon = Daemon({f"c{i}": inspected(f"c{i}", f"v{i}") for i in range(50)})
+        self.take(daemon)
+        self.assertEqual(len(daemon.calls), 2)
+
+    def test_it_indexes_containers_by_the_volumes_they_mount(self) -> None:
+        found = self.take(
+            Daemon(
+                {
+                    "db": inspected("db", "pgdata", "shared"),
+                    "web": inspected("web", "shared"),
+                }
+            )
+        )
+        self.assertEqual(found.containers_using("pgdata"), ["db"])
+        self.assertEqual(found.containers_using("shared"), ["db", "web"])
+        self.assertEqual(found.containers_using("orphan"), [])
+
+    def test_bind_mounts_are_no_volumes(self) -> None:
+        found = self.take(Daemon({"db": inspected("db")}))
+        self.assertEqual(found.by_volume, {})
+
+    def test_later_questions_are_answered_from_memory(self) -> None:
+        daemon = Daemon(
+            {"db": inspected("db", "v", image="postgres:17", task="task-1")}
+        )
+        self.take(daemon)
+        with mock.patch.object(docker_mod, "execute_shell_command", daemon):
+            self.assertEqual(docker_mod.get_image_info("db"), "postgres:17")
+            self.assertEqual(docker_mod.image_id("db"), "sha256:db")
+            self.assertTrue(docker_mod.is_swarm_task("db"))
+        self.assertEqual(len(daemon.calls), 2)
+
+    def test_a_container_that_vanished_before_the_inspect_is_dropped(self) -> None:
+        found = self.take(Daemon({"db": inspected("db", "v")}, vanished=["gone"]))
+        self.assertEqual(list(found.containers), ["db"])
+
+    def test_an_inspect_failure_on_an_existing_container_still_fails(self) -> None:
+        class Flaky(Daemon):
+            def __call__(self, argv):
+                if argv[:3] == ["docker", "ps", "-a"]:
+                    return ["gone"]
+                return super().__call__(argv)
+
+        with self.assertRaises(BackupError):
+            self.take(Flaky({"db": inspected("db", "v")}, vanished=["gone"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
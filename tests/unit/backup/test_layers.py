@@ -0,0 +1,139 @@
+"""Contract of the exec-free tool lookup across overlay2 layers."""
+
+from __future__ import annotations
+
+import os
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from baudolo.backup import docker as docker_mod
+from baudolo.backup.layers import tools_in_layers
+
+
+def binary(layer: Path, relative: str, mode: int = 0o755) -> None:
+    path = layer / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("#!/bin/sh\n", encoding="utf-8")
+    path.chmod(mode)
+
+
+def whiteout(layer: Path, relative: str) -> None:
+    path = layer / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.mknod(path, stat.S_IFCHR | 0o600, os.makedev(0, 0))
+    except PermissionError as error:
+        raise unittest.SkipTest("creating a whiteout needs CAP_MKNOD") from error
+
+
+class TestToolsInLayers(unittest.TestCase):
+    def setUp(self) -> None:
+        root = Path(tempfile.mkdtemp())
+        self.upper = root / "upper"
+        self.lower = root / "lower"
+        self.upper.mkdir()
+        self.lower.mkdir()
+
+    def found(self, *tools: str) -> set[str] | None:
+        return tools_in_layers([str(self.upper), str(self.lower)], tools)
+
+    def test_a_tool_in_a_lower_layer_is_found(self) -> None:
+        binary(self.lower, "usr/lib/postgresql/17/bin/pg_dump")
+        binary(self.lower, "usr/bin/pg_dumpall")
+        self.assertEqual(self.found("pg_dumpall"), {"pg_dumpall"})
+
+    def test_every_default_path_directory_is_searched(self) -> None:
+        binary(self.upper, "usr/local/bin/mariadb-dump")
+        binary(self.lower, "bin/mysqldump")
+        self.assertEqual(
+            self.found("mariadb-dump", "mysqldump"), {"mariadb-dump", "mysqldump"}
+        )
+
+    def test_a_tool_outside_the_path_is_not_found(self) -> None:
+        binary(self.lower, "usr/lib/postgresql/17/bin/pg_dumpall")
+        self.assertEqual(self.found("pg_dumpall"), set())
+
+    def test_a_file_that_is_not_executable_is_no_tool(self) -> None:
+        binary(self.lower, "usr/bin/pg_dumpall", mode=0o644)
+        self.assertEqual(self.found("pg_dumpall"), set())
+
+    def test_a_symlinked_tool_counts(self) -> None:
+        binary(self.lower, "usr/bin/mariadb-dump")
+        (self.lower / "usr/bin/mysqldump").symlink_to("mariadb-dump")
+        self.assertEqual(self.found("mysqldump"), {"mysqldump"})
+
+    def test_an_absolute_directory_link_is_not_followed_into_the_host(self) -> None:
+        (self.lower / "usr").mkdir()
+        with tempfile.TemporaryDirectory() as host:
+            binary(Path(host), "pg_dumpall")
+            (self.lower / "usr" / "bin").symlink_to(host)
+            self.assertEqual(self.found("pg_dumpall"), set())
+
+    def test_a_whiteout_in_an_upper_layer_deletes_the_tool(self) -> None:
+        binary(self.lower, "usr/bin/pg_dumpall")
+        whiteout(self.upper, "usr/bin/pg_dumpall")
+        self.assertEqual(self.found("pg_dumpall"), set())
+
+    def test_an_unreadable_layer_answers_nothing(self) -> None:
+        self.assertIsNone(
+            tools_in_layers([str(self.upper), "/nonexistent/layer"], ["pg_dumpall"])
+        )
+
+    def test_no_layers_answer_nothing(self) -> None:
+        self.assertIsNone(tools_in_layers([], ["pg_dumpall"]))
+
+
+class TestImagePath(unittest.TestCase):
+    def path(self, reported: list[str]) -> list[str] | None:
+        with mock.patch.object(
+            docker_mod, "execute_shell_command", return_value=reported
+        ):
+            return docker_mod.image_path("sha256:aaa")
+
+    def test_the_path_the_image_sets_is_read(self) -> None:
+        reported = '["LANG=C", "PATH=/opt/bitnami/postgresql/bin:/usr/bin"]'
+        self.assertEqual(
+            self.path([reported]), ["/opt/bitnami/postgresql/bin", "/usr/bin"]
+        )
+
+    def test_an_image_without_a_path_gets_the_default(self) -> None:
+        self.assertEqual(self.path(['["LANG=C"]']), [])
+        self.assertEqual(self.path(["null"]), [])
+
+    def test_a_failed_inspect_is_unknown(self) -> None:
+        with mock.patch.object(
+            docker_mod,
+            "execute_shell_command",
+            side_effect=docker_mod.BackupError("gone"),
+        ):
+            self.assertIsNone(docker_mod.image_path("sha256:aaa"))
+
+
+class TestImageLayers(unittest.TestCase):
+    def layers(self, reported: list[str]) -> list[str] | None:
+        with mock.patch.object(
+            docker_mod, "execute_shell_command", return_value=reported
+        ):
+            return docker_mod.image_layers("sha256:aaa")
+
+    def test_overlay2_lists_the_upper_layer_first(self) -> None:
+        reported = (
+            '{"Name": "overlay2", "Data": {"UpperDir": "/l/u/diff",'
+            ' "LowerDir": "/l/b/diff:/l/a/diff", "MergedDir": "/l/u/merged"}}'
+        )
+        self.assertEqual(
+            self.layers([reported]), ["/l/u/diff", "/l/b/diff", "/l/a/diff"]
+        )
+
+    def test_another_storage_driver_is_unreadable(self) -> None:
+        self.assertIsNone(self.layers(['{"Name": "btrfs", "Data": {}}']))
+
+    def test_the_containerd_snapshotter_reports_no_layers(self) -> None:
+        self.assertIsNone(self.layers(["null"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
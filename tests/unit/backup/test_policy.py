@@ -64,5 +64,29 @@ class TestRequiresStop(unittest.TestCase):
             self.assertTrue(mod.requires_stop(["c1", "c2"], ["alpine:3.20"]))
 
 
+class TestPauses(unittest.TestCase):
+    def pauses(self, image: str, freeze: str, pause=(), flush=()) -> bool:
+        with mock.patch.object(mod, "get_image_info", return_value=image):
+            return mod.pauses("c1", freeze, list(pause), list(flush))
+
+    def test_containers_are_stopped_by_default(self) -> None:
+        with mock.patch.object(mod, "get_image_info") as image:
+            self.assertFalse(mod.pauses("c1", "stop", [], []))
+        image.assert_not_called()
+
+    def test_the_global_mode_pauses_every_container(self) -> None:
+        self.assertTrue(self.pauses("php:8-fpm", "pause"))
+
+    def test_a_listed_image_is_paused_alone(self) -> None:
+        self.assertTrue(self.pauses("tomcat:10", "stop", pause=["tomcat:10"]))
+        self.assertFalse(self.pauses("redis:7", "stop", pause=["tomcat:10"]))
+
+    def test_an_image_that_needs_a_flush_is_always_stopped(self) -> None:
+        self.assertFalse(self.pauses("redis:7", "pause", flush=["redis:7"]))
+        self.assertFalse(
+            self.pauses("redis:7", "stop", pause=["redis:7"], flush=["redis:7"])
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
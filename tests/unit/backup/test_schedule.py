@@ -0,0 +1,202 @@
+"""Contract of the worker pool that runs independent volumes side by side."""
+
+from __future__ import annotations
+
+import io
+import sys
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+
+from baudolo.backup.schedule import (
+    DumpLimits,
+    Lookahead,
+    independent_groups,
+    run_pool,
+)
+
+
+class TestIndependentGroups(unittest.TestCase):
+    def test_volumes_without_a_shared_container_are_separate(self) -> None:
+        groups = independent_groups({"a": ["c1"], "b": ["c2"]})
+        self.assertEqual(groups, [["a"], ["b"]])
+
+    def test_a_shared_container_joins_its_volumes(self) -> None:
+        groups = independent_groups({"a": ["db"], "b": ["web"], "c": ["db"]})
+        self.assertEqual(groups, [["a", "c"], ["b"]])
+
+    def test_sharing_is_transitive(self) -> None:
+        """a and c share nothing directly, but both share with b."""
+        groups = independent_groups({"a": ["x"], "b": ["x", "y"], "c": ["y"]})
+        self.assertEqual(groups, [["a", "b", "c"]])
+
+    def test_an_unmounted_volume_is_a_group_of_its_own(self) -> None:
+        self.assertEqual(independent_groups({"a": [], "b": []}), [["a"], ["b"]])
+
+
+class TestRunPool(unittest.TestCase):
+    def test_results_keep_the_order_of_the_items(self) -> None:
+        self.assertEqual(run_pool(3, [3, 1, 2], lambda n: n * 10), [30, 10, 20])
+
+    def test_items_run_concurrently(self) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+        self.assertEqual(
+            run_pool(2, ["a", "b"], lambda _: barrier.wait() >= 0), [True, True]
+        )
+
+    def test_each_items_output_is_printed_as_one_block(self) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+
+        def work(name: str) -> None:
+            print(f"{name} first")
+            barrier.wait()
+            print(f"{name} second")
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            run_pool(2, ["a", "b"], work)
+        lines = out.getvalue().splitlines()
+        first = lines.index("a first")
+        self.assertEqual(lines[first + 1], "a second")
+        first = lines.index("b first")
+        self.assertEqual(lines[first + 1], "b second")
+
+    def test_the_first_failure_is_raised(self) -> None:
+        def work(n: int) -> int:
+            if n == 2:
+                raise ValueError("boom")
+            return n
+
+        with self.assertRaisesRegex(ValueError, "boom"):
+            run_pool(2, [1, 2, 3], work)
+
+    def test_the_output_of_a_failing_item_is_kept(self) -> None:
+        def work(_: int) -> None:
+            print("what went wrong")
+            raise ValueError("boom")
+
+        out = io.StringIO()
+        with redirect_stdout(out), self.assertRaises(ValueError):
+            run_pool(2, [1, 2], work)
+        self.assertIn("what went wrong", out.getvalue())
+
+    def test_one_job_runs_inline(self) -> None:
+        self.assertEqual(
+            run_pool(1, ["a", "b"], lambda _: threading.current_thread()),
+            [threading.main_thread(), threading.main_thread()],
+        )
+
+    def test_a_pool_inside_a_worker_shares_the_output_router(self) -> None:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            run_pool(
+                2,
+                ["a", "b"],
+                lambda outer: run_pool(2, [1, 2], lambda inner: print(outer, inner)),
+            )
+            self.assertIs(sys.stdout, out)
+        self.assertCountEqual(out.getvalue().splitlines(), ["a 1", "a 2", "b 1", "b 2"])
+
+
+class TestLookahead(unittest.TestCase):
+    def test_without_depth_each_item_runs_when_taken(self) -> None:
+        started: list[str] = []
+        with Lookahead(["a", "b"], started.append) as ahead:
+            ahead.take("a")
+            self.assertEqual(started, ["a"])
+
+    def test_the_next_items_run_while_the_current_one_is_used(self) -> None:
+        upcoming = threading.Event()
+
+        def work(item: str) -> str:
+            if item == "b":
+                upcoming.set()
+            return item.upper()
+
+        with Lookahead(["a", "b", "c"], work, depth=1) as ahead:
+            self.assertEqual(ahead.take("a"), "A")
+            self.assertTrue(upcoming.wait(5))
+            self.assertEqual(ahead.take("b"), "B")
+
+    def test_it_stays_within_its_depth(self) -> None:
+        started: list[str] = []
+        gate = threading.Event()
+
+        def work(item: str) -> None:
+            started.append(item)
+            if item != "a":
+                gate.wait(5)
+
+        with Lookahead(["a", "b", "c", "d"], work, depth=2) as ahead:
+            ahead.take("a")
+            time.sleep(0.05)
+            self.assertEqual(sorted(started), ["a", "b", "c"])
+            gate.set()
+
+    def test_each_items_output_is_printed_when_taken(self) -> None:
+        out = io.StringIO()
+        with redirect_stdout(out), Lookahead(["a", "b"], print, depth=1) as ahead:
+            ahead.take("a")
+            ahead.take("b")
+        self.assertEqual(out.getvalue().splitlines(), ["a", "b"])
+
+    def test_a_failure_is_raised_to_the_taker(self) -> None:
+        def work(item: str) -> None:
+            raise ValueError(item)
+
+        with (
+            redirect_stdout(io.StringIO()),
+            Lookahead(["a"], work, depth=1) as ahead,
+            self.assertRaisesRegex(ValueError, "a"),
+        ):
+            ahead.take("a")
+
+
+class Peak:
+    """Counts how many callers are inside at once."""
+
+    def __init__(self) -> None:
+        self.now = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, limits: DumpLimits, container: str) -> None:
+        with limits.slot(container):
+            with self.lock:
+                self.now += 1
+                self.peak = max(self.peak, self.now)
+            time.sleep(0.02)
+            with self.lock:
+                self.now -= 1
+
+
+class TestDumpLimits(unittest.TestCase):
+    def test_one_dump_per_container_by_default(self) -> None:
+        limits, peak = DumpLimits(), Peak()
+        run_pool(4, ["db"] * 4, lambda c: peak(limits, c))
+        self.assertEqual(peak.peak, 1)
+
+    def test_the_container_limit_admits_that_many(self) -> None:
+        limits, peak = DumpLimits(per_container=2), Peak()
+        run_pool(6, ["db"] * 6, lambda c: peak(limits, c))
+        self.assertEqual(peak.peak, 2)
+
+    def test_the_total_caps_dumps_across_containers(self) -> None:
+        limits, peak = DumpLimits(total=2, per_container=4), Peak()
+        run_pool(8, ["a", "b", "c", "d"] * 2, lambda c: peak(limits, c))
+        self.assertEqual(peak.peak, 2)
+
+    def test_containers_do_not_share_their_slots(self) -> None:
+        limits = DumpLimits()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def dump(container: str) -> None:
+            with limits.slot(container):
+                barrier.wait()
+
+        run_pool(2, ["a", "b"], dump)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+"""Contract of the streaming command runner."""
+
+from __future__ import annotations
+
+import errno
+import gzip
+import hashlib
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from baudolo.backup import shell as mod
+
+
+def python(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+class TestStreamShellCommand(unittest.TestCase):
+    def test_it_returns_only_the_tail(self) -> None:
+        lines = mod.stream_shell_command(
+            python("for i in range(10000): print(i)"), tail=3
+        )
+        self.assertEqual(lines, ["9997", "9998", "9999"])
+
+    def test_every_line_is_handed_over_in_order(self) -> None:
+        seen: list[str] = []
+        mod.stream_shell_command(
+            python("import sys; print('out'); sys.stderr.write('err\\n')"),
+            on_line=seen.append,
+        )
+        self.assertEqual(seen, ["out", "err"])
+
+    def test_a_carriage_return_ends_a_progress_line(self) -> None:
+        seen: list[str] = []
+        mod.stream_shell_command(
+            python("import sys; sys.stdout.write('10%\\r55%\\r100%\\r\\ndone')"),
+            on_line=seen.append,
+        )
+        self.assertEqual(seen, ["10%", "55%", "100%", "done"])
+
+    def test_an_endless_line_is_cut(self) -> None:
+        lines = mod.stream_shell_command(
+            python(f"print('x' * {mod.MAX_LINE * 4})"), tail=1
+        )
+        self.assertEqual(len(lines[0]), mod.MAX_LINE)
+
+    def test_a_failure_reports_the_tail_and_the_exit_code(self) -> None:
+        with self.assertRaises(mod.BackupError) as caught:
+            mod.stream_shell_command(
+                python("import sys; print('boom'); sys.exit(24)"), tail=5
+            )
+        self.assertIn("boom", str(caught.exception))
+        self.assertIn("Exit code: 24", str(caught.exception))
+
+
+class TestExecuteToFile(unittest.TestCase):
+    def test_the_output_is_compressed_on_its_way_to_the_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = f"{tmp}/app.backup.sql.gz"
+            mod.execute_to_file(
+                python("print('SELECT 1;' * 1000)"), out, compress=["gzip", "-c"]
+            )
+            self.assertEqual(
+                gzip.decompress(Path(out).read_bytes()), b"SELECT 1;" * 1000 + b"\n"
+            )
+
+    def test_the_stream_is_hashed_and_counted_before_compression(self) -> None:
+        sql = b"SELECT 1;\n" * 1000
+        with tempfile.TemporaryDirectory() as tmp:
+            for compress in (None, ["gzip", "-c"]):
+                with self.subTest(compress=compress):
+                    digest = mod.execute_to_file(
+                        python("print('SELECT 1;\\n' * 1000, end='')"),
+                        f"{tmp}/app.backup.sql",
+                        compress=compress,
+                    )
+                    self.assertEqual(
+                        digest,
+                        (
+                            mod.DIGEST_ALGORITHM,
+                            hashlib.blake2b(sql).hexdigest(),
+                            len(sql),
+                            1000,
+                        ),
+                    )
+
+    def test_a_failing_dump_leaves_no_compressed_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = f"{tmp}/app.backup.sql.gz"
+            with self.assertRaises(mod.BackupError):
+                mod.execute_to_file(
+                    python("print('partial'); raise SystemExit(1)"),
+                    out,
+                    compress=["gzip", "-c"],
+                )
+            self.assertEqual(list(Path(tmp).iterdir()), [])
+
+    def test_a_failing_compressor_fails_the_dump(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = f"{tmp}/app.backup.sql.gz"
+            with self.assertRaises(mod.BackupError):
+                mod.execute_to_file(
+                    python("print('SELECT 1;')"),
+                    out,
+                    compress=python("raise SystemExit(2)"),
+                )
+            self.assertFalse(Path(out).exists())
+
+    def test_a_full_disk_fails_the_dump_and_leaves_nothing_behind(self) -> None:
+        started = []
+        popen = mod.subprocess.Popen
+
+        def spawn(*args, **kwargs):
+            started.append(popen(*args, **kwargs))
+            return started[-1]
+
+        for compress in (None, ["gzip", "-c"]):
+            with (
+                self.subTest(compress=compress),
+                tempfile.TemporaryDirectory() as tmp,
+                mock.patch.object(mod.subprocess, "Popen", spawn),
+                mock.patch.object(
+                    mod, "_copy", side_effect=OSError(errno.ENOSPC, "No space")
+                ),
+                self.assertRaisesRegex(mod.BackupError, "No space"),
+            ):
+                try:
+                    mod.execute_to_file(
+                        python("import time; time.sleep(60)"),
+                        f"{tmp}/app.backup.sql",
+                        compress=compress,
+                    )
+                finally:
+                    self.assertEqual(list(Path(tmp).iterdir()), [])
+            self.assertTrue(all(p.returncode is not None for p in started))
+            started.clear()
+
+    def test_a_failing_chunk_store_fails_the_dump(self) -> None:
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.object(
+                mod.ChunkWriter, "close", side_effect=OSError(errno.EIO, "I/O")
+            ),
+            self.assertRaises(mod.BackupError),
+        ):
+            try:
+                mod.execute_to_file(
+                    python("print('SELECT 1;')"),
+                    f"{tmp}/app.backup.sql.chunks",
+                    chunks=f"{tmp}/pool",
+                )
+            finally:
+                self.assertFalse(Path(f"{tmp}/app.backup.sql.chunks.tmp").exists())
+
+
+class TestExecuteToDirectory(unittest.TestCase):
+    def test_the_tar_stream_is_unpacked_into_the_directory(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "source"
+            source.mkdir()
+            (source / "toc.dat").write_bytes(b"PGDMP")
+            out = f"{tmp}/app.backup.dir"
+            mod.execute_to_directory(["tar", "-C", str(source), "-cf", "-", "."], out)
+            self.assertEqual((Path(out) / "toc.dat").read_bytes(), b"PGDMP")
+            self.assertFalse(Path(f"{out}.tmp").exists())
+
+    def test_a_failing_dump_leaves_no_directory(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = f"{tmp}/app.backup.dir"
+            with self.assertRaises(mod.BackupError):
+                mod.execute_to_directory(python("raise SystemExit(1)"), out)
+            self.assertEqual(list(Path(tmp).iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,265 @@
+"""Contract of reusing the previous generation's dumps instead of a new copy."""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from baudolo.backup import db as db_mod
+from baudolo.backup import dumps as dumps_mod
+from baudolo.backup import hashcache
+from baudolo.backup.hashcache import HashCache
+from baudolo.backup.shell import BackupError, Digest
+from baudolo.generation import MANIFEST_FILE
+
+DIGEST = Digest("blake2b", "ab12", 6, 1)
+KEY = "pgdata/sql/app.backup.sql"
+# What execute_to_file reports for the b"dump;\n" the tests write.
+WRITTEN = Digest("blake2b", hashlib.blake2b(b"dump;\n").hexdigest(), 6, 1)
+
+
+def entry(fingerprint: str) -> dict:
+    return {
+        "algorithm": "blake2b",
+        "digest": "ab12",
+        "bytes": 6,
+        "lines": 1,
+        "fingerprint": fingerprint,
+    }
+
+
+class TestReuseOrDump(unittest.TestCase):
+    def setUp(self) -> None:
+        root = Path(tempfile.mkdtemp())
+        self.earlier = root / "20260101000000"
+        (self.earlier / "pgdata" / "sql").mkdir(parents=True)
+        (self.earlier / KEY).write_bytes(b"dump;\n")
+        self.out = root / "now" / "app.backup.sql"
+        self.out.parent.mkdir()
+        self.dump = mock.Mock(return_value=DIGEST)
+
+    def run_with(self, fingerprint: str | None, recorded: str = "postgres:1|0|0|"):
+        previous = db_mod.Previous(str(self.earlier), {KEY: entry(recorded)})
+        with (
+            mock.patch("sys.stdout", new_callable=io.StringIO),
+            mock.patch("sys.stderr", new_callable=io.StringIO),
+        ):
+            return db_mod.reuse_or_dump(
+                self.dump, str(self.out), KEY, lambda: fingerprint, previous
+            )
+
+    def test_an_unchanged_database_is_linked_not_dumped(self) -> None:
+        record = self.run_with("postgres:1|0|0|")
+        self.dump.assert_not_called()
+        self.assertEqual(
+            record, db_mod.DumpRecord(DIGEST, "postgres:1|0|0|", "20260101000000")
+        )
+        self.assertEqual(self.out.stat().st_ino, (self.earlier / KEY).stat().st_ino)
+
+    def test_a_changed_database_is_dumped_with_its_new_fingerprint(self) -> None:
+        changed = DIGEST._replace(hexdigest="cd34")
+        self.dump.return_value = changed
+        record = self.run_with("postgres:2|0|0|")
+        self.dump.assert_called_once()
+        self.assertEqual(record, db_mod.DumpRecord(changed, "postgres:2|0|0|"))
+
+    def test_an_unreadable_fingerprint_is_dumped(self) -> None:
+        self.run_with(None)
+        self.dump.assert_called_once()
+
+    def test_a_link_that_fails_falls_back_to_a_dump(self) -> None:
+        (self.earlier / KEY).unlink()
+        record = self.run_with("postgres:1|0|0|")
+        self.dump.assert_called_once()
+        self.assertIsNone(record.reused)
+
+
+class TestLinkIfIdentical(unittest.TestCase):
+    def setUp(self) -> None:
+        root = Path(tempfile.mkdtemp())
+        self.earlier = root / "20260101000000"
+        (self.earlier / "pgdata" / "sql").mkdir(parents=True)
+        (self.earlier / KEY).write_bytes(b"dump;\n")
+        self.out = root / "now" / "app.backup.sql"
+        self.out.parent.mkdir()
+        self.out.write_bytes(b"dump;\n")
+
+    def link(self, dumps: dict, cache=None, digest=DIGEST) -> db_mod.DumpRecord:
+        previous = db_mod.Previous(str(self.earlier), dumps)
+        return db_mod.link_if_identical(
+            db_mod.DumpRecord(digest), str(self.out), KEY, previous, cache
+        )
+
+    def linked(self) -> bool:
+        return self.out.stat().st_ino == (self.earlier / KEY).stat().st_ino
+
+    def test_an_identical_digest_becomes_a_link(self) -> None:
+        self.assertEqual(self.link({KEY: entry("x")}).reused, "20260101000000")
+        self.assertTrue(self.linked())
+        self.assertEqual(list(self.out.parent.iterdir()), [self.out])
+
+    def test_a_different_digest_keeps_the_copy(self) -> None:
+        self.assertIsNone(self.link({KEY: {**entry("x"), "digest": "cd34"}}).reused)
+        self.assertFalse(self.linked())
+
+    def test_without_a_recorded_digest_the_bytes_are_compared(self) -> None:
+        self.assertEqual(self.link({}).reused, "20260101000000")
+        self.assertTrue(self.linked())
+
+    def test_different_bytes_keep_the_copy(self) -> None:
+        self.out.write_bytes(b"dump2\n")
+        self.assertIsNone(self.link({}).reused)
+        self.assertFalse(self.linked())
+
+    def test_a_hash_cache_compares_the_digests_instead(self) -> None:
+        cache = HashCache(str(self.out.parent / "cache.sqlite"))
+        self.addCleanup(cache.close)
+        with mock.patch.object(db_mod.filecmp, "cmp") as compare:
+            self.assertEqual(self.link({}, cache, WRITTEN).reused, "20260101000000")
+        compare.assert_not_called()
+        self.assertTrue(self.linked())
+
+    def test_the_fresh_dump_is_not_read_again(self) -> None:
+        cache = HashCache(str(self.out.parent / "cache.sqlite"))
+        self.addCleanup(cache.close)
+        with mock.patch.object(
+            hashcache, "_hash_file", wraps=hashcache._hash_file
+        ) as read:
+            self.link({}, cache, WRITTEN)
+        self.assertEqual(
+            [call[0][0] for call in read.call_args_list], [self.earlier / KEY]
+        )
+
+    def test_the_cache_still_knows_the_dump_once_it_is_linked(self) -> None:
+        cache = HashCache(str(self.out.parent / "cache.sqlite"))
+        self.addCleanup(cache.close)
+        self.link({}, cache, WRITTEN)
+        with mock.patch.object(hashcache, "_hash_file") as read:
+            cache.digest(str(self.out), "blake2b")
+        read.assert_not_called()
+
+
+class TestPreviousDumps(unittest.TestCase):
+    def test_the_newest_finished_generation_other_than_this_one(self) -> None:
+        versions = Path(tempfile.mkdtemp())
+        for name, manifest in (
+            ("20260101000000", {"dumps": {KEY: entry("a")}}),
+            ("20260102000000", None),
+            ("20260103000000", {"dumps": {}}),
+        ):
+            (versions / name).mkdir()
+            if manifest is not None:
+                (versions / name / MANIFEST_FILE).write_text(json.dumps(manifest))
+        (versions / "20260104000000").mkdir()
+
+        found = dumps_mod.previous_dumps(
+            str(versions), str(versions / "20260103000000")
+        )
+        self.assertEqual(found.generation, str(versions / "20260101000000"))
+        self.assertEqual(found.dumps, {KEY: entry("a")})
+
+    def test_a_first_run_has_none(self) -> None:
+        versions = tempfile.mkdtemp()
+        self.assertIsNone(dumps_mod.previous_dumps(versions, f"{versions}/now"))
+
+
+class TestFingerprints(unittest.TestCase):
+    def test_postgres_reads_the_database_counters(self) -> None:
+        with mock.patch.object(
+            db_mod, "execute_shell_command", return_value=["10|4|1|"]
+        ) as ask:
+            found = db_mod.postgres_fingerprint("pg", "app", "s3cret", "app")
+        self.assertEqual(found, "postgres:10|4|1|")
+        argv = ask.call_args.args[0]
+        self.assertIn("pg_stat_database", argv[-1])
+        self.assertNotIn("s3cret", argv)
+        self.assertEqual(ask.call_args.kwargs["env"], {"PGPASSWORD": "s3cret"})
+
+    def test_a_cluster_dump_reads_the_wal_position(self) -> None:
+        with mock.patch.object(
+            db_mod, "execute_shell_command", return_value=["0/3000148"]
+        ) as ask:
+            found = db_mod.postgres_fingerprint("pg", "postgres", "pw", None)
+        self.assertEqual(found, "postgres:0/3000148")
+        self.assertIn("pg_current_wal_lsn()", ask.call_args.args[0][-1])
+
+    def test_mariadb_checksums_every_table(self) -> None:
+        answers = [["orders", "we`ird"], ["app.orders\t1", "app.we`ird\t2"]]
+        with mock.patch.object(
+            db_mod, "execute_shell_command", side_effect=answers
+        ) as ask:
+            first = db_mod.mariadb_fingerprint("db", "mariadb", "u", "p", "app")
+        self.assertEqual(
+            ask.call_args.args[0][-1], "CHECKSUM TABLE `orders`, `we``ird`"
+        )
+        answers[1][0] = "app.orders\t3"
+        with mock.patch.object(db_mod, "execute_shell_command", side_effect=answers):
+            second = db_mod.mariadb_fingerprint("db", "mariadb", "u", "p", "app")
+        self.assertNotEqual(first, second)
+
+    def test_a_server_that_cannot_be_asked_gives_none(self) -> None:
+        with (
+            mock.patch.object(
+                db_mod, "execute_shell_command", side_effect=BackupError("denied")
+            ),
+            mock.patch("sys.stderr", new_callable=io.StringIO),
+        ):
+            self.assertIsNone(db_mod.postgres_fingerprint("pg", "u", "p", "app"))
+
+
+class TestBackupDatabase(unittest.TestCase):
+    def test_only_the_changed_database_is_dumped(self) -> None:
+        root = Path(tempfile.mkdtemp())
+        earlier = root / "20260101000000"
+        (earlier / "pgdata" / "sql").mkdir(parents=True)
+        for name in ("app", "wiki"):
+            (earlier / "pgdata" / "sql" / f"{name}.backup.sql").write_bytes(b"x\n")
+        previous = db_mod.Previous(
+            str(earlier),
+            {
+                "pgdata/sql/app.backup.sql": entry("postgres:app"),
+                "pgdata/sql/wiki.backup.sql": entry("postgres:old"),
+            },
+        )
+        dumped, recorded = [], {}
+
+        def _dump(command, out_file, *, env=None, compress=None, chunks=None):
+            dumped.append(Path(out_file).name)
+            return DIGEST
+
+        with (
+            mock.patch.object(db_mod, "execute_to_file", side_effect=_dump),
+            mock.patch.object(
+                db_mod,
+                "postgres_fingerprint",
+                side_effect=lambda c, u, p, name: f"postgres:{name}",
+            ),
+            mock.patch("sys.stdout", new_callable=io.StringIO),
+        ):
+            db_mod.backup_database(
+                container="pg",
+                volume_dir=str(root / "now" / "pgdata"),
+                db_type="postgres",
+                dump_tool="pg_dumpall",
+                databases_df=pd.DataFrame(
+                    [("pg", "app", "u", "p"), ("pg", "wiki", "u", "p")],
+                    columns=["instance", "database", "username", "password"],
+                ),
+                database_containers=["pg"],
+                record=recorded.__setitem__,
+                options=db_mod.DumpOptions(skip_unchanged=True, previous=previous),
+            )
+        self.assertEqual(dumped, ["wiki.backup.sql"])
+        self.assertEqual(recorded["app.backup.sql"].reused, "20260101000000")
+        self.assertEqual(recorded["wiki.backup.sql"].fingerprint, "postgres:wiki")
+
+
+if __name__ == "__main__":
+    unittest.main()
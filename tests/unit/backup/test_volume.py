@@ -2,12 +2,16 @@
 
 from __future__ import annotations
 
+import os
+import shutil
 import tempfile
+import time
 import unittest
 from pathlib import Path
 from unittest import mock
 
 from baudolo.backup import volume as mod
+from baudolo.generation import GENERATION_FORMAT
 
 
 class TestBackupVolume(unittest.TestCase):
@@ -21,7 +25,7 @@ class TestBackupVolume(unittest.TestCase):
                 "source": "/var/lib/docker/volumes/demo/_data/",
             }
             defaults.update(kwargs)
-            with mock.patch.object(mod, "execute_shell_command") as run:
+            with mock.patch.object(mod, "stream_shell_command") as run:
                 mod.backup_volume(
                     defaults.pop("versions_dir"),
                     defaults.pop("volume_name"),
@@ -54,12 +58,73 @@ class TestBackupVolume(unittest.TestCase):
     def test_it_creates_the_destination(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             dest = Path(tmp) / "gen" / "demo"
-            with mock.patch.object(mod, "execute_shell_command"):
+            with mock.patch.object(mod, "stream_shell_command"):
                 mod.backup_volume(
                     tmp, "demo", str(dest), authoritative=False, source="/src/"
                 )
             self.assertTrue((dest / "files").is_dir())
 
+    def test_vanished_files_are_only_a_warning(self) -> None:
+        def rsync(command, *, on_line):
+            on_line('file has vanished: "/src/tmp/sess_1"')
+            on_line("rsync warning: some files vanished before they could be...")
+            raise mod.BackupError("Exit code: 24")
+
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.object(mod, "stream_shell_command", rsync),
+        ):
+            stats = mod.backup_volume(
+                tmp, "demo", f"{tmp}/d", authoritative=False, source="/src/"
+            )
+        self.assertIsNone(stats)
+
+    def test_any_other_failure_fails_the_pass(self) -> None:
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.object(
+                mod,
+                "stream_shell_command",
+                side_effect=mod.BackupError("Exit code: 23"),
+            ),
+            self.assertRaises(mod.BackupError),
+        ):
+            mod.backup_volume(
+                tmp, "demo", f"{tmp}/d", authoritative=False, source="/s/"
+            )
+
+    def test_the_native_engine_copies_without_rsync(self) -> None:
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.object(mod, "stream_shell_command") as run,
+            mock.patch.object(mod, "copy_tree", return_value=(2, 10)) as native,
+        ):
+            stats = mod.backup_volume(
+                tmp,
+                "demo",
+                f"{tmp}/gen/demo",
+                authoritative=True,
+                source="/s/",
+                engine="native",
+            )
+        run.assert_not_called()
+        self.assertTrue(native.call_args.kwargs["checksum"])
+        self.assertEqual(stats, mod.CopyStats(2, 10))
+
+    def test_into_a_snapshot_generation_only_changed_blocks_are_written(
+        self,
+    ) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            Path(tmp, "20260101000000", "demo", "files").mkdir(parents=True)
+            command = self.copy(
+                versions_dir=tmp,
+                volume_dir=str(Path(tmp) / "20260102000000" / "demo"),
+                inplace=True,
+            )
+        self.assertIn("--inplace", command)
+        self.assertIn("--no-whole-file", command)
+        self.assertFalse(any(arg.startswith("--link-dest") for arg in command))
+
     def test_source_is_required(self) -> None:
         with self.assertRaises(TypeError):
             mod.backup_volume("/v", "demo", "/d", authoritative=False)
@@ -69,6 +134,191 @@ class TestBackupVolume(unittest.TestCase):
             mod.backup_volume("/v", "demo", "/d", source="/src/")
 
 
+class TestStats(unittest.TestCase):
+    REPORT = (
+        "Number of files: 12 (reg: 10, dir: 2)",
+        "Number of regular files transferred: 3",
+        "Total file size: 9,000 bytes",
+        "Total transferred file size: 1,234 bytes",
+    )
+
+    def test_it_reads_what_the_pass_transferred(self) -> None:
+        self.assertEqual(mod.parse_stats(self.REPORT), mod.CopyStats(3, 1234))
+
+    def test_an_older_rsync_wording_is_understood(self) -> None:
+        report = ["Number of files transferred: 0", "Total transferred file size: 0"]
+        self.assertEqual(mod.parse_stats(report), mod.CopyStats(0, 0))
+
+    def test_output_without_stats_yields_none(self) -> None:
+        self.assertIsNone(mod.parse_stats(["sending incremental file list"]))
+
+    def test_the_pass_returns_its_stats(self) -> None:
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.object(mod, "stream_shell_command", return_value=self.REPORT),
+        ):
+            stats = mod.backup_volume(
+                tmp, "demo", f"{tmp}/gen/demo", authoritative=False, source="/s/"
+            )
+        self.assertEqual(stats, mod.CopyStats(3, 1234))
+
+
+class TestChangeTracker(unittest.TestCase):
+    def setUp(self) -> None:
+        self.source = Path(tempfile.mkdtemp())
+        (self.source / "db").mkdir()
+        (self.source / "db" / "table").write_bytes(b"aaaa")
+        (self.source / "conf").write_bytes(b"x")
+        self.tracker = mod.ChangeTracker()
+        self.tracker.record(f"{self.source}/")
+
+    def changed(self) -> list[str] | None:
+        return self.tracker.changed(f"{self.source}/")
+
+    def test_an_untouched_tree_has_nothing_to_re_copy(self) -> None:
+        self.assertEqual(self.changed(), [])
+
+    def test_a_rewrite_is_found_even_behind_a_restored_mtime(self) -> None:
+        """Same size, same mtime: what rsync's quick check would miss."""
+        table = self.source / "db" / "table"
+        before = table.stat()
+        table.write_bytes(b"bbbb")
+        os.utime(table, ns=(before.st_atime_ns, before.st_mtime_ns))
+        self.assertEqual(self.changed(), ["db/table"])
+
+    def test_a_new_file_is_found(self) -> None:
+        (self.source / "db" / "wal").write_bytes(b"")
+        self.assertEqual(self.changed(), ["db/wal"])
+
+    def test_a_deleted_file_is_left_to_the_pass_itself(self) -> None:
+        (self.source / "conf").unlink()
+        self.assertEqual(self.changed(), [])
+
+    def test_without_a_record_nothing_is_known(self) -> None:
+        self.assertIsNone(mod.ChangeTracker().changed(f"{self.source}/"))
+
+    def passes(self, tracker: mod.ChangeTracker) -> list[list[str]]:
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.object(mod, "stream_shell_command") as run,
+        ):
+            mod.backup_volume(
+                tmp,
+                "demo",
+                f"{tmp}/gen/demo",
+                authoritative=True,
+                source=f"{self.source}/",
+                tracker=tracker,
+            )
+        return [call[0][0] for call in run.call_args_list]
+
+    def test_the_authoritative_pass_forces_only_the_changes(self) -> None:
+        (self.source / "conf").write_bytes(b"y")
+        forced, final = self.passes(self.tracker)
+        self.assertIn("--ignore-times", forced)
+        self.assertNotIn("--checksum", final)
+
+    def test_nothing_changed_means_one_quick_check_pass(self) -> None:
+        (final,) = self.passes(self.tracker)
+        self.assertNotIn("--checksum", final)
+
+    def test_an_unrecorded_volume_falls_back_to_checksums(self) -> None:
+        (final,) = self.passes(mod.ChangeTracker())
+        self.assertIn("--checksum", final)
+
+    def test_a_live_pass_records_before_it_copies(self) -> None:
+        tracker = mod.ChangeTracker()
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.object(mod, "stream_shell_command"),
+        ):
+            mod.backup_volume(
+                tmp,
+                "demo",
+                f"{tmp}/gen/demo",
+                authoritative=False,
+                source=f"{self.source}/",
+                tracker=tracker,
+            )
+        (self.source / "conf").write_bytes(b"y")
+        self.assertEqual(tracker.changed(f"{self.source}/"), ["conf"])
+
+    def test_a_vanished_file_in_the_forced_pass_is_only_a_warning(self) -> None:
+        (self.source / "conf").write_bytes(b"y")
+
+        def rsync(command, *, on_line):
+            if "--ignore-times" in command:
+                on_line('file has vanished: "/src/conf"')
+                raise mod.BackupError("Exit code: 24")
+            return []
+
+        with mock.patch.object(mod, "stream_shell_command", rsync):
+            (self.source / "conf").unlink()
+            with tempfile.TemporaryDirectory() as tmp:
+                mod.backup_volume(
+                    tmp,
+                    "demo",
+                    f"{tmp}/gen/demo",
+                    authoritative=True,
+                    source=f"{self.source}/",
+                    tracker=self.tracker,
+                )
+
+    def test_a_deleted_forced_file_is_no_error(self) -> None:
+        (self.source / "conf").write_bytes(b"y")
+        forced, _ = self.passes(self.tracker)
+        self.assertIn("--ignore-missing-args", forced)
+
+    def test_a_name_that_is_no_utf_8_is_tracked(self) -> None:
+        name = os.fsdecode(b"caf\xe9")
+        (self.source / name).write_bytes(b"")
+        self.assertEqual(self.changed(), [name])
+
+
+class TestRewriteBehindRestoredMtime(unittest.TestCase):
+    """A file the live pass linked from the last generation without reading it."""
+
+    def setUp(self) -> None:
+        self.versions = Path(tempfile.mkdtemp())
+        self.source = Path(tempfile.mkdtemp())
+        (self.source / "table").write_bytes(b"aaaa")
+
+    def generation(self, started: float) -> None:
+        name = time.strftime(GENERATION_FORMAT, time.localtime(started))
+        shutil.copytree(self.source, self.versions / name / "demo" / "files")
+
+    def forced(self) -> list[str]:
+        table = self.source / "table"
+        before = table.stat()
+        table.write_bytes(b"bbbb")
+        os.utime(table, ns=(before.st_atime_ns, before.st_mtime_ns))
+        tracker = mod.ChangeTracker()
+        with (
+            mock.patch.object(mod, "stream_shell_command"),
+            mock.patch.object(mod, "_force") as force,
+        ):
+            for authoritative in (False, True):
+                mod.backup_volume(
+                    str(self.versions),
+                    "demo",
+                    str(self.versions / "20991231235959" / "demo"),
+                    authoritative=authoritative,
+                    source=f"{self.source}/",
+                    tracker=tracker,
+                )
+        return force.call_args[0][0] if force.called else []
+
+    def test_the_authoritative_pass_forces_it(self) -> None:
+        self.generation(time.time() - 2 * 86400)
+        self.assertEqual(self.forced(), ["table"])
+
+    def test_a_file_untouched_since_the_last_generation_is_not_forced(
+        self,
+    ) -> None:
+        self.generation(time.time() + 2 * 86400)
+        self.assertEqual(self.forced(), [])
+
+
 class TestLastBackupDir(unittest.TestCase):
     def test_it_ignores_the_generation_being_written(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -1,7 +1,10 @@
+import json
 import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+from baudolo.generation import MANIFEST_FILE
 from baudolo.restore.db import cluster as cluster_mod
 from baudolo.restore.paths import BackupPaths
 
@@ -120,6 +123,39 @@ class TestClusterReplay(unittest.TestCase):
             "/B/hash/repo/v1/vol/sql/bigbluebutton.cluster.backup.sql",
         )
 
+    def test_a_referenced_dump_is_found_in_the_volume_holding_it(self) -> None:
+        with tempfile.TemporaryDirectory() as backups:
+            generation = Path(backups) / "hash" / "repo" / "v1"
+            generation.mkdir(parents=True)
+            (generation / MANIFEST_FILE).write_text(
+                json.dumps(
+                    {
+                        "volumes": {
+                            "sock": {"dump_refs": {"bbb.cluster.backup.sql": "pg"}}
+                        }
+                    }
+                ),
+                encoding="utf-8",
+            )
+            paths = BackupPaths("sock", "hash", "v1", "repo", backups_dir=backups)
+            self.assertEqual(
+                paths.cluster_file("bbb"),
+                str(generation / "pg" / "sql" / "bbb.cluster.backup.sql"),
+            )
+
+    def test_the_codec_suffix_comes_from_the_manifest(self) -> None:
+        with tempfile.TemporaryDirectory() as backups:
+            generation = Path(backups) / "hash" / "repo" / "v1"
+            generation.mkdir(parents=True)
+            (generation / MANIFEST_FILE).write_text(
+                json.dumps({"layout": {"compression_suffix": ".zst"}}),
+                encoding="utf-8",
+            )
+            paths = BackupPaths("pg", "hash", "v1", "repo", backups_dir=backups)
+            self.assertEqual(
+                paths.sql_file("app"), str(generation / "pg/sql/app.backup.sql.zst")
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
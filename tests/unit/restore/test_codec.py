@@ -0,0 +1,169 @@
+"""Contract of reading a dump back through the codec it was written with."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from baudolo.generation import MANIFEST_FILE
+from baudolo.restore.db import mariadb as mdb_mod
+from baudolo.restore.db import postgres as pg_mod
+from baudolo.restore.db.codec import ChecksumMismatchError, decompressor, open_dump
+from baudolo.restore.paths import BackupPaths
+
+SQL = b"".join(b"INSERT INTO t VALUES (%d);\n" % i for i in range(20000))
+
+
+def written(name: str, data: bytes = SQL) -> str:
+    path = Path(tempfile.mkdtemp()) / name
+    if name.endswith(".gz"):
+        path.write_bytes(gzip.compress(data))
+    elif name.endswith(".zst"):
+        if shutil.which("zstd") is None:
+            raise unittest.SkipTest("zstd is not installed")
+        path.write_bytes(
+            subprocess.run(
+                ["zstd", "-q", "-c"], input=data, capture_output=True, check=True
+            ).stdout
+        )
+    else:
+        path.write_bytes(data)
+    return str(path)
+
+
+class TestOpenDump(unittest.TestCase):
+    def test_every_codec_reads_back_the_same_sql(self) -> None:
+        for name in ("a.backup.sql", "a.backup.sql.gz", "a.backup.sql.zst"):
+            with self.subTest(name=name), open_dump(written(name)) as handle:
+                self.assertEqual(handle.read(), SQL)
+
+    def test_plain_sql_needs_no_decompressor(self) -> None:
+        self.assertIsNone(decompressor("/g/v/sql/app.backup.sql"))
+
+    def test_a_reader_may_stop_early(self) -> None:
+        with open_dump(written("a.backup.sql.gz")) as handle:
+            self.assertEqual(handle.readline(), b"INSERT INTO t VALUES (0);\n")
+
+    def test_a_corrupt_file_fails_once_read_to_the_end(self) -> None:
+        path = written("a.backup.sql.gz")
+        Path(path).write_bytes(Path(path).read_bytes()[:-64])
+        with (
+            self.assertRaises(subprocess.CalledProcessError),
+            open_dump(path) as handle,
+        ):
+            handle.read()
+
+
+def checksum(data: bytes = SQL) -> dict:
+    return {
+        "algorithm": "blake2b",
+        "digest": hashlib.blake2b(data).hexdigest(),
+        "bytes": len(data),
+        "lines": data.count(b"\n"),
+    }
+
+
+class TestChecksum(unittest.TestCase):
+    def test_a_matching_stream_reads_through(self) -> None:
+        for name in ("a.backup.sql", "a.backup.sql.gz"):
+            with self.subTest(name=name), open_dump(written(name), checksum()) as src:
+                self.assertEqual(b"".join(src), SQL)
+
+    def test_a_changed_byte_fails_at_the_end_of_the_stream(self) -> None:
+        path = written("a.backup.sql", SQL.replace(b"(7)", b"(8)"))
+        with open_dump(path, checksum()) as src:
+            src.readline()
+            with self.assertRaises(ChecksumMismatchError):
+                src.read()
+
+    def test_a_reader_stopping_early_checks_nothing(self) -> None:
+        with open_dump(written("a.backup.sql"), checksum(b"other")) as src:
+            self.assertEqual(src.readline(), b"INSERT INTO t VALUES (0);\n")
+
+    def test_the_manifest_entry_is_found_by_the_dump_path(self) -> None:
+        with tempfile.TemporaryDirectory() as backups:
+            generation = Path(backups) / "hash" / "repo" / "v1"
+            generation.mkdir(parents=True)
+            (generation / MANIFEST_FILE).write_text(
+                json.dumps({"dumps": {"pg/sql/app.backup.sql": checksum()}}),
+                encoding="utf-8",
+            )
+            paths = BackupPaths("pg", "hash", "v1", "repo", backups_dir=backups)
+            self.assertEqual(paths.checksum(paths.sql_file("app")), checksum())
+            self.assertIsNone(paths.checksum(paths.sql_file("other")))
+
+
+class TestMismatchDropsNothing(unittest.TestCase):
+    """--empty drops before the replay, so a corrupt dump is refused first."""
+
+    def test_postgres_refuses_before_the_preclean(self) -> None:
+        path = written("a.backup.sql", SQL[:-1])
+        with (
+            patch.object(pg_mod, "docker_exec") as engine,
+            self.assertRaises(ChecksumMismatchError),
+        ):
+            pg_mod.restore_postgres_sql(
+                container="db",
+                db_name="app",
+                user="app",
+                password="pw",
+                sql_path=path,
+                empty=True,
+                check_version=False,
+                checksum=checksum(),
+            )
+        engine.assert_not_called()
+
+    def test_mariadb_refuses_before_dropping_tables(self) -> None:
+        path = written("a.backup.sql.gz", SQL[:-1])
+        with (
+            patch.object(mdb_mod, "_pick_client", return_value="mariadb"),
+            patch.object(mdb_mod, "docker_exec") as engine,
+            self.assertRaises(ChecksumMismatchError),
+        ):
+            mdb_mod.restore_mariadb_sql(
+                container="db",
+                db_name="app",
+                user="app",
+                password="pw",
+                sql_path=path,
+                empty=True,
+                check_version=False,
+                checksum=checksum(),
+            )
+        engine.assert_not_called()
+
+    def test_a_verified_mariadb_dump_is_replayed_from_the_spool(self) -> None:
+        replayed = []
+
+        def _capture(container, argv, **kwargs):
+            if "stdin" in kwargs:
+                replayed.append(kwargs["stdin"].read())
+            return MagicMock(stdout=b"")
+
+        with (
+            patch.object(mdb_mod, "_pick_client", return_value="mariadb"),
+            patch.object(mdb_mod, "docker_exec", side_effect=_capture),
+        ):
+            mdb_mod.restore_mariadb_sql(
+                container="db",
+                db_name="app",
+                user="app",
+                password="pw",
+                sql_path=written("a.backup.sql.gz"),
+                empty=False,
+                check_version=False,
+                checksum=checksum(),
+            )
+        self.assertEqual(replayed, [SQL])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""Contract of restoring a pg_dump directory-format dump."""
+
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from baudolo.generation import MANIFEST_FILE
+from baudolo.restore.db import postgres as pg_mod
+from baudolo.restore.db import version as ver
+from baudolo.restore.paths import BackupPaths
+
+
+def integer(value: int) -> bytes:
+    return bytes([value < 0]) + abs(value).to_bytes(4, "little")
+
+
+def string(value: str | None) -> bytes:
+    if value is None:
+        return integer(-1)
+    return integer(len(value.encode())) + value.encode()
+
+
+def toc(server: str | None = "17.2 (Debian 17.2-1.pgdg120+1)", archive=(1, 16, 0)):
+    """The head of a toc.dat as pg_dump -Fd writes it: 4-byte ints, gzip."""
+    head = b"PGDMP" + bytes(archive) + bytes([4, 8, 5])
+    head += bytes([1]) if archive >= (1, 15) else integer(-1)
+    head += b"".join(integer(field) for field in (5, 4, 3, 17, 9, 125, 0))
+    return head + string("app") + string(server) + string("17.2") + b"\0" * 32
+
+
+def dump_dir(head: bytes) -> str:
+    path = Path(tempfile.mkdtemp()) / "app.backup.dir"
+    path.mkdir()
+    (path / ver.TOC_FILE).write_bytes(head)
+    return str(path)
+
+
+class TestArchiveVersion(unittest.TestCase):
+    def test_the_server_version_is_read_from_the_toc(self) -> None:
+        found = ver.dump_version(dump_dir(toc()), "postgres")
+        self.assertEqual(found, "17.2 (Debian 17.2-1.pgdg120+1)")
+        self.assertEqual(ver.major_of(found), 17)
+
+    def test_an_archive_before_1_15_stores_the_compression_as_an_integer(self):
+        head = toc("14.11", archive=(1, 14, 0))
+        self.assertEqual(ver.archive_version(dump_dir(head)), "14.11")
+
+    def test_an_archive_too_old_to_record_the_server_is_refused(self) -> None:
+        with self.assertRaises(ver.VersionMismatchError):
+            ver.archive_version(dump_dir(toc(archive=(1, 9, 0))))
+
+    def test_a_missing_server_version_is_refused(self) -> None:
+        with self.assertRaises(ver.VersionMismatchError):
+            ver.archive_version(dump_dir(toc(server=None)))
+
+    def test_a_directory_that_is_no_archive_is_refused(self) -> None:
+        with self.assertRaises(ver.VersionMismatchError):
+            ver.archive_version(dump_dir(b"CREATE TABLE t (id int);\n"))
+
+    def test_a_truncated_toc_is_refused(self) -> None:
+        with self.assertRaises(ver.VersionMismatchError):
+            ver.archive_version(dump_dir(toc()[:20]))
+
+
+class TestDirectoryRestore(unittest.TestCase):
+    def restore(self, *, empty: bool) -> list[tuple[list[str], object]]:
+        calls = []
+
+        def _capture(container, argv, **kwargs):
+            stdin = kwargs.get("stdin")
+            calls.append((argv, stdin if isinstance(stdin, bytes) else stdin.read()))
+            return MagicMock()
+
+        with patch.object(pg_mod, "docker_exec", side_effect=_capture):
+            pg_mod.restore_postgres_sql(
+                container="db",
+                db_name="app",
+                user="app",
+                password="pw",
+                sql_path=dump_dir(toc()),
+                empty=empty,
+                check_version=False,
+                jobs=8,
+            )
+        return calls
+
+    def test_pg_restore_runs_the_requested_jobs_and_gets_the_archive(self) -> None:
+        [(argv, stdin)] = self.restore(empty=False)
+        self.assertEqual(argv[:3], ["sh", "-c", pg_mod._DIRECTORY_RESTORE])
+        self.assertEqual(argv[3:], ["sh", "8", "app", "app"])
+        self.assertIn(b"toc.dat", stdin, "the directory is streamed in as tar")
+
+    def test_the_preclean_still_runs_first(self) -> None:
+        calls = self.restore(empty=True)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0][0][0], "psql")
+        self.assertEqual(calls[1][0][0], "sh")
+
+    def test_the_version_gate_reads_the_toc(self) -> None:
+        with (
+            patch.object(ver, "docker_exec") as serving,
+            patch.object(pg_mod, "docker_exec") as replay,
+            self.assertRaises(ver.VersionMismatchError),
+        ):
+            serving.return_value = MagicMock(stdout=b"15.6")
+            pg_mod.restore_postgres_sql(
+                container="db",
+                db_name="app",
+                user="app",
+                password="pw",
+                sql_path=dump_dir(toc()),
+                empty=True,
+            )
+        replay.assert_not_called()
+
+
+class TestDirectoryPath(unittest.TestCase):
+    def test_a_directory_dump_is_preferred_over_the_codec_suffix(self) -> None:
+        with tempfile.TemporaryDirectory() as backups:
+            generation = Path(backups) / "hash" / "repo" / "v1"
+            (generation / "pg" / "sql" / "app.backup.dir").mkdir(parents=True)
+            (generation / MANIFEST_FILE).write_text(
+                json.dumps({"layout": {"compression_suffix": ".zst"}}),
+                encoding="utf-8",
+            )
+            paths = BackupPaths("pg", "hash", "v1", "repo", backups_dir=backups)
+            self.assertEqual(
+                paths.sql_file("app"), str(generation / "pg/sql/app.backup.dir")
+            )
+
+    def test_without_one_the_sql_dump_is_named(self) -> None:
+        paths = BackupPaths("pg", "hash", "v1", "repo", backups_dir="/B")
+        self.assertEqual(paths.sql_file("app"), "/B/hash/repo/v1/pg/sql/app.backup.sql")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import gzip
 import tempfile
 import unittest
 from pathlib import Path
@@ -88,6 +89,11 @@ class TestDumpVersion(unittest.TestCase):
         with self.assertRaises(ver.VersionMismatchError):
             ver.dump_version(path, "postgres")
 
+    def test_a_compressed_dump_is_read_through_its_codec(self) -> None:
+        path = Path(tempfile.mkdtemp()) / "app.backup.sql.gz"
+        path.write_bytes(gzip.compress(cluster_header(roles=200).encode()))
+        self.assertEqual(ver.dump_version(str(path), "postgres"), "17.11")
+
     def test_a_dump_without_a_version_header_is_refused(self) -> None:
         path = dump_file("CREATE TABLE t (id int);\n")
         with self.assertRaises(ver.VersionMismatchError):
@@ -0,0 +1,229 @@
+"""Contract of the chunk store: what a dump is cut into, and read back from."""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from baudolo import chunks
+from baudolo.backup.shell import execute_to_file
+from baudolo.chunks import ChunkError, ChunkWriter, collect_garbage, open_recipe
+from baudolo.generation import CHUNK_DIR, DUMP_SUFFIX, MANIFEST_FILE, SQL_DIR
+from baudolo.restore.db.codec import ChecksumMismatchError, open_dump
+from baudolo.restore.paths import BackupPaths
+
+
+def rows(first: int, last: int) -> bytes:
+    return b"".join(b"INSERT INTO t VALUES (%d);\n" % n for n in range(first, last))
+
+
+class ChunkTest(unittest.TestCase):
+    """Runs against a repository of one generation, with chunks a few KiB big."""
+
+    def setUp(self) -> None:
+        self.repo = Path(tempfile.mkdtemp())
+        self.pool = self.repo / CHUNK_DIR
+        self.sql = self.repo / "20260101000000" / "vol" / SQL_DIR
+        self.sql.mkdir(parents=True)
+        for name, value in (
+            ("TARGET_CHUNK", 4096),
+            ("MIN_CHUNK", 1024),
+            ("MAX_CHUNK", 16384),
+        ):
+            patcher = mock.patch.object(chunks, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def store(
+        self, data: bytes, name: str = "db.backup.sql.chunks", *, step: int = 1000
+    ) -> str:
+        recipe = self.sql / name
+        with recipe.open("wb") as handle:
+            writer = ChunkWriter(str(self.pool), handle)
+            for offset in range(0, len(data), step):
+                writer.write(data[offset : offset + step])
+            writer.close()
+        return str(recipe)
+
+    def listed(self, recipe: str) -> list[str]:
+        return [line.split()[0] for line in Path(recipe).read_text().splitlines()]
+
+    def read(self, recipe: str) -> bytes:
+        with open_recipe(recipe) as stream:
+            return stream.read()
+
+
+class TestChunkWriter(ChunkTest):
+    def test_the_stream_reads_back_unchanged(self) -> None:
+        data = rows(0, 5000)
+        recipe = self.store(data)
+        self.assertEqual(self.read(recipe), data)
+        self.assertGreater(len(self.listed(recipe)), 5)
+
+    def test_chunks_stay_within_the_bounds(self) -> None:
+        sizes = [
+            int(line.split()[1])
+            for line in Path(self.store(rows(0, 5000))).read_text().splitlines()
+        ]
+        self.assertTrue(all(1024 <= size <= 16384 for size in sizes[:-1]))
+
+    def test_an_early_insert_leaves_the_later_chunks_alone(self) -> None:
+        before = self.listed(self.store(rows(0, 5000), "a.chunks"))
+        after = self.listed(self.store(rows(0, 10) + rows(-3, 0) + rows(10, 5000)))
+        self.assertLessEqual(len(set(after) - set(before)), 2)
+        self.assertEqual(after[-5:], before[-5:])
+
+    def test_the_cuts_do_not_depend_on_how_the_stream_was_read(self) -> None:
+        data = rows(0, 5000)
+        first = self.listed(self.store(data, "a.chunks", step=1000))
+        for step in (1, 333, 4096, 70000):
+            with self.subTest(step=step):
+                self.assertEqual(self.listed(self.store(data, step=step)), first)
+
+    def test_an_insert_inside_one_long_line_leaves_the_later_chunks_alone(
+        self,
+    ) -> None:
+        """An extended INSERT: thousands of rows, not one line break."""
+
+        def values(numbers) -> bytes:
+            return b",".join(b"(%d,'row %d')" % (n, n) for n in numbers)
+
+        before = self.listed(
+            self.store(b"INSERT INTO t VALUES " + values(range(5000)), "a.chunks")
+        )
+        after = self.listed(
+            self.store(
+                b"INSERT INTO t VALUES "
+                + values([*range(10), -1, -2, -3, *range(10, 5000)])
+            )
+        )
+        self.assertLessEqual(len(set(after) - set(before)), 2)
+        self.assertEqual(after[-5:], before[-5:])
+
+    def test_a_chunk_is_stored_once(self) -> None:
+        self.store(rows(0, 5000), "a.chunks")
+        stored = len(list(self.pool.glob("*/*")))
+        self.store(rows(0, 5000), "b.chunks")
+        self.assertEqual(len(list(self.pool.glob("*/*"))), stored)
+
+    def test_a_stream_without_a_boundary_is_cut_at_the_maximum(self) -> None:
+        recipe = self.store(b"x" * 40000)
+        sizes = [int(line.split()[1]) for line in Path(recipe).read_text().splitlines()]
+        self.assertEqual(sizes, [16384, 16384, 7232])
+
+    def test_an_empty_stream_has_an_empty_recipe(self) -> None:
+        self.assertEqual(self.read(self.store(b"")), b"")
+
+
+class TestReadBack(ChunkTest):
+    def test_a_missing_chunk_is_an_error(self) -> None:
+        recipe = self.store(rows(0, 100))
+        for path in self.pool.glob("*/*"):
+            path.unlink()
+        with self.assertRaises(ChunkError):
+            self.read(recipe)
+
+    def test_a_chunk_holding_other_data_is_an_error(self) -> None:
+        recipe = self.store(rows(0, 100))
+        (path,) = self.pool.glob("*/*")
+        path.write_bytes(chunks.zlib.compress(rows(0, 99)))
+        with self.assertRaisesRegex(ChunkError, "corrupt"):
+            self.read(recipe)
+
+    def test_a_dump_written_to_the_pool_is_verified_on_restore(self) -> None:
+        recipe = str(self.sql / f"db{DUMP_SUFFIX}.chunks")
+        digest = execute_to_file(
+            ["printf", "CREATE TABLE t (id int);\\n"], recipe, chunks=str(self.pool)
+        )
+        checksum = {
+            "algorithm": digest.algorithm,
+            "digest": digest.hexdigest,
+            "bytes": digest.bytes,
+            "lines": digest.lines,
+        }
+        with open_dump(recipe, checksum) as stream:
+            self.assertEqual(stream.read(), b"CREATE TABLE t (id int);\n")
+        with (
+            self.assertRaises(ChecksumMismatchError),
+            open_dump(recipe, {**checksum, "bytes": 1}) as stream,
+        ):
+            stream.read()
+
+    def test_a_restore_finds_the_recipe_the_manifest_names(self) -> None:
+        generation = self.sql.parents[1]
+        (generation / MANIFEST_FILE).write_text(
+            json.dumps({"layout": {"dump_store": "chunks", "recipe_suffix": ".chunks"}})
+        )
+        paths = BackupPaths(
+            "vol",
+            self.repo.parent.name,
+            generation.name,
+            self.repo.name,
+            backups_dir=str(self.repo.parents[1]),
+        )
+        self.assertEqual(paths.sql_file("db"), str(self.sql / "db.backup.sql.chunks"))
+
+
+class TestCollectGarbage(ChunkTest):
+    def age(self, seconds: float) -> None:
+        past = time.time() - seconds
+        for path in self.pool.glob("*/*"):
+            os.utime(path, (past, past))
+
+    def test_chunks_of_a_deleted_generation_are_removed(self) -> None:
+        kept = self.store(rows(0, 2000), "a.chunks")
+        gone = self.store(rows(5000, 7000), "b.chunks")
+        self.age(chunks.GC_GRACE + 60)
+        size = sum(path.stat().st_size for path in self.pool.glob("*/*"))
+        orphaned = set(self.listed(gone)) - set(self.listed(kept))
+        Path(gone).unlink()
+        removed, freed = collect_garbage(str(self.repo))
+        self.assertEqual(removed, len(orphaned))
+        self.assertEqual(self.read(kept), rows(0, 2000))
+        self.assertEqual(
+            freed + sum(path.stat().st_size for path in self.pool.glob("*/*")), size
+        )
+
+    def test_a_recently_used_chunk_survives_without_a_recipe(self) -> None:
+        Path(self.store(rows(0, 2000))).unlink()
+        self.assertEqual(collect_garbage(str(self.repo)), (0, 0))
+
+    def test_reusing_a_chunk_renews_its_grace(self) -> None:
+        self.store(rows(0, 2000), "a.chunks")
+        self.age(chunks.GC_GRACE + 60)
+        Path(self.store(rows(0, 2000), "b.chunks")).unlink()
+        (self.sql / "a.chunks").unlink()
+        self.assertEqual(collect_garbage(str(self.repo))[0], 0)
+
+    def test_no_chunk_is_stored_while_the_collection_runs(self) -> None:
+        Path(self.store(rows(0, 2000))).unlink()
+        self.age(chunks.GC_GRACE + 60)
+        held = []
+
+        def remove(path: Path, cutoff: float) -> int:
+            with (self.pool / chunks.LOCK_FILE).open("a") as handle:
+                try:
+                    chunks.fcntl.flock(
+                        handle, chunks.fcntl.LOCK_SH | chunks.fcntl.LOCK_NB
+                    )
+                except BlockingIOError:
+                    held.append(path)
+            return remove_stale(path, cutoff)
+
+        remove_stale = chunks._remove_stale
+        with mock.patch.object(chunks, "_remove_stale", remove):
+            removed, _ = collect_garbage(str(self.repo))
+        self.assertEqual(len(held), removed)
+        self.assertGreater(removed, 0)
+
+    def test_a_repository_without_a_pool_has_nothing_to_collect(self) -> None:
+        self.assertEqual(collect_garbage(str(self.sql)), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
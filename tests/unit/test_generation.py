@@ -7,14 +7,20 @@ import tempfile
 import unittest
 from pathlib import Path
 
+from baudolo.backup.db import DumpRecord
 from baudolo.backup.dumps import VolumeOutcome
 from baudolo.backup.layout import write_manifest
+from baudolo.backup.shell import Digest
+from baudolo.backup.volume import Precopy
 from baudolo.generation import (
+    CHUNK_DIR,
     CLUSTER_SUFFIX,
+    DIRECTORY_SUFFIX,
     DUMP_SUFFIX,
     FILES_DIR,
     MANIFEST_FILE,
     MANIFEST_SCHEMA,
+    RECIPE_SUFFIX,
     SQL_DIR,
     manifest_document,
 )
@@ -30,9 +36,25 @@ class TestManifestDocument(unittest.TestCase):
                 "sql_dir": SQL_DIR,
                 "dump_suffix": DUMP_SUFFIX,
                 "cluster_suffix": CLUSTER_SUFFIX,
+                "directory_suffix": DIRECTORY_SUFFIX,
+                "compression": "none",
+                "compression_suffix": "",
+                "dump_store": "files",
+                "recipe_suffix": RECIPE_SUFFIX,
+                "chunk_dir": CHUNK_DIR,
             },
         )
 
+    def test_it_names_the_codec_the_dumps_were_compressed_with(self) -> None:
+        layout = manifest_document({}, "zstd")["layout"]
+        self.assertEqual(
+            (layout["compression"], layout["compression_suffix"]), ("zstd", ".zst")
+        )
+
+    def test_it_names_the_store_the_dumps_are_kept_in(self) -> None:
+        layout = manifest_document({}, store="chunks")["layout"]
+        self.assertEqual(layout["dump_store"], "chunks")
+
     def test_it_carries_a_schema_so_a_reader_can_refuse_a_newer_one(self) -> None:
         self.assertEqual(manifest_document({})["schema"], MANIFEST_SCHEMA)
 
@@ -41,6 +63,61 @@ class TestManifestDocument(unittest.TestCase):
         document = manifest_document({"b": state, "a": state})
         self.assertEqual(list(document["volumes"]), ["a", "b"])
 
+    def test_a_pre_copied_volume_records_how_it_converged(self) -> None:
+        state = VolumeOutcome(database=False, dumped=False, precopy=Precopy(3, 2, 512))
+        self.assertEqual(
+            manifest_document({"a": state})["volumes"]["a"]["precopy"],
+            {"rounds": 3, "files": 2, "bytes": 512},
+        )
+
+    def test_a_volume_referencing_a_dump_names_its_holder(self) -> None:
+        state = VolumeOutcome(
+            database=True, dumped=True, refs={"app.backup.sql": "pgdata"}
+        )
+        self.assertEqual(
+            manifest_document({"sock": state})["volumes"]["sock"]["dump_refs"],
+            {"app.backup.sql": "pgdata"},
+        )
+
+    def test_a_directory_dump_records_its_format(self) -> None:
+        state = VolumeOutcome(
+            database=True, dumped=True, formats={"app.backup.dir": "directory"}
+        )
+        self.assertEqual(
+            manifest_document({"pg": state})["volumes"]["pg"]["dump_formats"],
+            {"app.backup.dir": "directory"},
+        )
+
+    def test_each_digest_is_filed_under_the_volume_holding_the_dump(self) -> None:
+        record = DumpRecord(Digest("blake2b", "ab12", 2048, 40))
+        state = VolumeOutcome(
+            database=True,
+            dumped=True,
+            refs={"app.backup.sql": "pgdata"},
+            dumps={"app.backup.sql": record, "wiki.backup.sql": record},
+        )
+        self.assertEqual(
+            list(manifest_document({"sock": state})["dumps"]),
+            ["pgdata/sql/app.backup.sql", "sock/sql/wiki.backup.sql"],
+        )
+        self.assertEqual(
+            manifest_document({"sock": state})["dumps"]["sock/sql/wiki.backup.sql"],
+            {"algorithm": "blake2b", "digest": "ab12", "bytes": 2048, "lines": 40},
+        )
+
+    def test_a_linked_dump_names_its_fingerprint_and_origin(self) -> None:
+        record = DumpRecord(
+            Digest("blake2b", "ab12", 2048, 40), "postgres:1|2|0|", "20260101120000"
+        )
+        state = VolumeOutcome(
+            database=True, dumped=True, dumps={"app.backup.sql": record}
+        )
+        entry = manifest_document({"pg": state})["dumps"]["pg/sql/app.backup.sql"]
+        self.assertEqual(
+            (entry["fingerprint"], entry["linked_from"]),
+            ("postgres:1|2|0|", "20260101120000"),
+        )
+
 
 class TestWriteManifest(unittest.TestCase):
     def test_it_writes_readable_json_next_to_the_volumes(self) -> None: